@@ -0,0 +1,175 @@
+import re
+import time
+from typing import Dict, Any, List, Optional, Callable
+
+
+LLM_TIER = "llm"
+
+
+class RouteContext:
+    """Everything a tier handler needs to answer one message. The lesson is loaded on first use."""
+
+    def __init__(self, message: str, lesson_id: Optional[str], intents: set,
+                 lesson_loader: Optional[Callable[[str], Dict[str, Any]]] = None, **extra):
+        self.message = message
+        self.lesson_id = lesson_id
+        self.intents = intents
+        self.extra = extra
+        self._lesson_loader = lesson_loader
+        self._lesson = None
+        self._lesson_loaded = False
+
+    @property
+    def lesson(self) -> Optional[Dict[str, Any]]:
+        if not self._lesson_loaded:
+            self._lesson_loaded = True
+            if self.lesson_id and self._lesson_loader:
+                try:
+                    self._lesson = self._lesson_loader(self.lesson_id)
+                except Exception as e:
+                    print(f"Error loading lesson {self.lesson_id} for routing: {str(e)}")
+        return self._lesson
+
+    @property
+    def lesson_loaded(self) -> bool:
+        return self._lesson_loaded
+
+
+class RouteResult:
+    def __init__(self, tier: str, answer: Optional[str], context: RouteContext):
+        self.tier = tier
+        self.answer = answer
+        self.context = context
+
+    @property
+    def answered(self) -> bool:
+        return self.answer is not None
+
+
+class Tier:
+    def __init__(self, name: str, handler: Callable[[RouteContext], Optional[str]], intents: Optional[set]):
+        self.name = name
+        self.handler = handler
+        self.intents = intents  # None means the tier is tried for every message
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.total_time = 0.0
+
+
+class AnswerRouter:
+    """
+    Sends each chat message to the cheapest handler that can answer it.
+    Tiers are tried in registration order; the LLM is the implicit last resort.
+    """
+
+    def __init__(self):
+        self.tiers: List[Tier] = []
+        self._intent_patterns: Dict[str, str] = {}
+        self._intent_regex = None
+        self.total = 0
+        self.llm_calls = 0
+        self.llm_time = 0.0
+
+    def add_intent(self, name: str, pattern: str):
+        """
+        Register an intent; all intents are compiled into a single alternation scanned left to
+        right, so a pattern must consume only its own keywords (use lookaheads for the context
+        it needs). Text a match spans is hidden from every other intent.
+        """
+        self._intent_patterns[name] = pattern
+        self._intent_regex = None
+
+    def add_tier(self, name: str, handler: Callable[[RouteContext], Optional[str]], intents=None):
+        self.tiers.append(Tier(name, handler, set(intents) if intents else None))
+
+    def _compiled(self):
+        if self._intent_regex is None:
+            alternation = "|".join(f"(?P<{name}>{pattern})" for name, pattern in self._intent_patterns.items())
+            self._intent_regex = re.compile(alternation or r"(?!)", re.IGNORECASE | re.DOTALL)
+        return self._intent_regex
+
+    def detect_intents(self, message: str) -> set:
+        intents = set()
+        for match in self._compiled().finditer(message):
+            intents.add(match.lastgroup)
+        return intents
+
+    def resolve(self, message: str, lesson_id: Optional[str] = None,
+                lesson_loader: Optional[Callable[[str], Dict[str, Any]]] = None, **extra) -> RouteResult:
+        """Try every local tier in order. An unanswered result means the caller should ask the LLM."""
+        self.total += 1
+        context = RouteContext(message, lesson_id, self.detect_intents(message), lesson_loader, **extra)
+
+        for tier in self.tiers:
+            if tier.intents is not None and not (tier.intents & context.intents):
+                continue
+            started = time.perf_counter()
+            try:
+                answer = tier.handler(context)
+            except Exception as e:
+                print(f"Error in answer tier '{tier.name}': {str(e)}")
+                tier.errors += 1
+                answer = None
+            tier.total_time += time.perf_counter() - started
+            if answer:
+                tier.hits += 1
+                return RouteResult(tier.name, answer, context)
+            tier.misses += 1
+
+        return RouteResult(LLM_TIER, None, context)
+
+    def record_llm(self, elapsed: float):
+        self.llm_calls += 1
+        self.llm_time += elapsed
+
+    def stats(self) -> Dict[str, Any]:
+        tiers = {}
+        for tier in self.tiers:
+            attempts = tier.hits + tier.misses
+            tiers[tier.name] = {
+                "hits": tier.hits,
+                "misses": tier.misses,
+                "errors": tier.errors,
+                "hit_rate": tier.hits / self.total if self.total else 0.0,
+                "avg_time": tier.total_time / attempts if attempts else 0.0,
+            }
+        tiers[LLM_TIER] = {
+            "hits": self.llm_calls,
+            "hit_rate": self.llm_calls / self.total if self.total else 0.0,
+            "avg_time": self.llm_time / self.llm_calls if self.llm_calls else 0.0,
+        }
+        local = self.total - self.llm_calls
+        return {
+            "total": self.total,
+            "answered_locally": local,
+            "local_rate": local / self.total if self.total else 0.0,
+            "tiers": tiers,
+        }
+
+
+def _tokens(text: str) -> set:
+    return set(re.findall(r"[a-z0-9]+", text.lower()))
+
+
+def match_qa_pair(message: str, qa_pairs: List[Dict[str, Any]], threshold: float = 0.6) -> Optional[Dict[str, Any]]:
+    """
+    Find the QA pair whose question best overlaps the message. Only the full question counts
+    as an exact match: a short message such as "what" is merely part of many questions.
+    """
+    words = _tokens(message)
+    if not words:
+        return None
+    normalized = re.findall(r"[a-z0-9]+", message.lower())
+    best, best_score = None, 0.0
+    for qa_pair in qa_pairs:
+        question = qa_pair.get('question', '')
+        if re.findall(r"[a-z0-9]+", question.lower()) == normalized:
+            return qa_pair
+        question_words = _tokens(question)
+        if not question_words:
+            continue
+        score = len(words & question_words) / len(words | question_words)
+        if score > best_score:
+            best, best_score = qa_pair, score
+    return best if best_score >= threshold else None
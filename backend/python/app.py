@@ -11,23 +11,70 @@ load_dotenv()
 # Import the PDF integration
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 import pdf_processor
+import executors
+from config import Config
+from lesson_protocol import LessonSession, PROTOCOL_VERSION, HAS_ORJSON, view_for, dumps
 
 async def handle_client(websocket):
+    session = LessonSession()
     try:
         async for message in websocket:
             try:
                 data = json.loads(message)
-                response = await process_message(data)
-                await websocket.send(json.dumps(response))
+                if not isinstance(data, dict):
+                    await websocket.send(dumps({'error': 'Expected a JSON object'}))
+                    continue
+                session.negotiate(data.get('protocol'))
+                if data.get('type') == 'hello':
+                    await websocket.send(dumps({
+                        'type': 'hello',
+                        'protocol': session.protocol,
+                        'maxProtocol': PROTOCOL_VERSION
+                    }))
+                    continue
+                response = await process_message(data, session)
+                # Lesson frames the reply refers to go out first
+                for frame in session.drain():
+                    await websocket.send(frame)
+                await websocket.send(dumps(response))
             except json.JSONDecodeError:
                 error_response = {
                     'error': 'Invalid JSON received'
                 }
-                await websocket.send(json.dumps(error_response))
+                await websocket.send(dumps(error_response))
+            except websockets.exceptions.ConnectionClosed:
+                raise
+            except Exception as e:
+                # One bad message shouldn't end the connection
+                print(f"❌ Error handling message: {str(e)}")
+                await websocket.send(dumps({'error': 'Could not process the message'}))
     except websockets.exceptions.ConnectionClosed:
         pass
 
-async def process_message(data):
+def section_entry(session, view, heading, section_id, prefix=None):
+    """A reply section: a reference into the lesson for protocol 2 clients, the content itself otherwise"""
+    if session is not None and session.uses_references:
+        entry = {'heading': heading, 'ref': section_id}
+        if prefix:
+            entry['prefix'] = prefix
+        return entry
+    content = view.sections[section_id]
+    return {'heading': heading, 'content': f"{prefix}{content}" if prefix else content}
+
+def lesson_reply(session, view, message):
+    """Wrap a structured message, syncing the lesson to protocol 2 clients first"""
+    reply = {
+        'message': message,
+        'sender': 'bot',
+        'lesson_title': view.title
+    }
+    if session is not None and session.uses_references:
+        session.sync(view)
+        reply['lessonId'] = view.lesson_id
+        reply['version'] = view.version
+    return reply
+
+async def process_message(data, session=None):
     try:
         lesson_id = data.get('lessonId')
         user_message = data.get('message')
@@ -41,52 +88,24 @@ async def process_message(data):
         print(f"Processing message for lesson {lesson_id}: {user_message}")
         
         try:
-            lesson_data = await asyncio.to_thread(pdf_processor.getLessonContent, lesson_id)
+            lesson_data = await executors.io.run(pdf_processor.getLessonContent, lesson_id)
+            
+            view = view_for(lesson_id, lesson_data)
             
             # Handle summary requests
             if any(keyword in user_message.lower() for keyword in ['summary', 'summarize', 'overview']):
-                title = lesson_data.get('title', 'Unknown Lesson')
-                summary = lesson_data.get('summary', '')
-                key_points = lesson_data.get('key_points', [])
-                
-                # Format the summary text to remove any hash symbols and ensure proper line breaks
-                if summary:
-                    summary = summary.replace('#', '').strip()
-                
-                structured_response = {
-                    'message': {
-                        'type': 'structured_summary',
-                        'title': title,
-                        'sections': [
-                            {
-                                'heading': 'Summary',
-                                'content': summary
-                            }
-                        ]
-                    },
-                    'sender': 'bot',
-                    'lesson_title': title
-                }
+                # Sections are cleaned once per lesson version (no hash symbols, tidy line breaks)
+                sections = [section_entry(session, view, 'Summary', 'summary')]
                 
                 # Add key points if available
-                if key_points:
-                    # Clean up key points to remove hash symbols
-                    cleaned_key_points = [point.replace('#', '').strip() for point in key_points]
-                    structured_response['message']['sections'].append({
-                        'heading': 'Key Points',
-                        'content': cleaned_key_points
-                    })
-                
-                # Add related topics if available
-                if lesson_data.get('related_topics'):
-                    # Clean up related topics to remove hash symbols
-                    cleaned_topics = [topic.replace('#', '').strip() for topic in lesson_data['related_topics']]
-                    structured_response['message']['sections'].append({
-                        'heading': 'Related Topics',
-                        'content': cleaned_topics
-                    })
+                if view.sections['key_points']:
+                    sections.append(section_entry(session, view, 'Key Points', 'key_points'))
                 
-                return structured_response
+                return lesson_reply(session, view, {
+                    'type': 'structured_summary',
+                    'title': view.title,
+                    'sections': sections
+                })
             
             # Handle QA pairs with structured responses
             if lesson_data.get('qaPairs') and len(lesson_data['qaPairs']) > 0:
@@ -113,56 +132,26 @@ async def process_message(data):
                         }
             
             # Default structured response for general questions
-            title = lesson_data.get('title', 'Unknown Lesson')
-            content = lesson_data.get('content', '')
-            summary = lesson_data.get('summary', '')
-            
-            # Clean up content to remove hash symbols and ensure proper line breaks
-            if content:
-                content = content.replace('#', '').strip()
-                # Split content by line breaks and clean each line
-                if '\n' in content:
-                    content_lines = content.split('\n')
-                    content = '\n'.join([line.strip() for line in content_lines if line.strip()])
-            
-            # Clean up summary to remove hash symbols
-            if summary:
-                summary = summary.replace('#', '').strip()
-            
-            # Create a more structured response for general questions
             response_sections = []
             
             # Add a direct response section
-            response_sections.append({
-                'heading': 'Response',
-                'content': f"Based on your question: {user_message}\n\n{content}"
-            })
+            response_sections.append(section_entry(
+                session, view, 'Response', 'content', prefix=f"Based on your question: {user_message}\n\n"
+            ))
             
             # Add a summary section if available
-            if summary:
-                response_sections.append({
-                    'heading': 'Summary',
-                    'content': summary
-                })
+            if view.sections['summary']:
+                response_sections.append(section_entry(session, view, 'Summary', 'summary'))
             
             # Add key points if available
-            if lesson_data.get('key_points'):
-                # Clean up key points to remove hash symbols
-                cleaned_key_points = [point.replace('#', '').strip() for point in lesson_data['key_points']]
-                response_sections.append({
-                    'heading': 'Key Points',
-                    'content': cleaned_key_points
-                })
+            if view.sections['key_points']:
+                response_sections.append(section_entry(session, view, 'Key Points', 'key_points'))
             
-            return {
-                'message': {
-                    'type': 'general_response',
-                    'title': title,
-                    'sections': response_sections
-                },
-                'sender': 'bot',
-                'lesson_title': title
-            }
+            return lesson_reply(session, view, {
+                'type': 'general_response',
+                'title': view.title,
+                'sections': response_sections
+            })
             
         except Exception as e:
             print(f"Error getting lesson content: {str(e)}")
@@ -188,8 +177,13 @@ async def process_message(data):
 
 async def main():
     # Use 0.0.0.0 to bind to all interfaces, allowing external connections
-    server = await websockets.serve(handle_client, "0.0.0.0", 8765)
+    # permessage-deflate is negotiated with clients that support it
+    server = await websockets.serve(
+        handle_client, "0.0.0.0", 8765,
+        compression="deflate" if Config.WS_COMPRESSION else None
+    )
     print("WebSocket server started on ws://0.0.0.0:8765")
+    print(f"Compression: {'permessage-deflate' if Config.WS_COMPRESSION else 'off'}, JSON encoder: {'orjson' if HAS_ORJSON else 'json'}")
     await server.wait_closed()
 
 if __name__ == "__main__":
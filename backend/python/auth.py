@@ -0,0 +1,59 @@
+import hmac
+import json
+import time
+import base64
+import hashlib
+from typing import Dict, Any, Optional
+from fastapi import HTTPException, Request
+from config import Config
+
+
+def _b64decode(segment: str) -> bytes:
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+
+def verify_token(token: str) -> Optional[Dict[str, Any]]:
+    """
+    Claims of a login token issued by the Node backend (HS256 JWT signed with the shared
+    JWT_SECRET), or None if it is malformed, forged or expired
+    """
+    if not Config.JWT_SECRET or not token:
+        return None
+    try:
+        header_segment, payload_segment, signature_segment = token.split(".")
+        header = json.loads(_b64decode(header_segment))
+        if header.get("alg") != "HS256":
+            return None
+        expected = hmac.new(
+            Config.JWT_SECRET.encode(), f"{header_segment}.{payload_segment}".encode(), hashlib.sha256
+        ).digest()
+        if not hmac.compare_digest(expected, _b64decode(signature_segment)):
+            return None
+        claims = json.loads(_b64decode(payload_segment))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(claims, dict):
+        return None
+    if "exp" in claims and not (isinstance(claims["exp"], (int, float)) and claims["exp"] > time.time()):
+        return None
+    return claims
+
+
+def token_user_id(token: Optional[str]) -> Optional[int]:
+    """The user id a valid login token was issued to, or None"""
+    claims = verify_token(token) if isinstance(token, str) else None
+    if not claims or claims.get("userId") is None:
+        return None
+    try:
+        return int(claims["userId"])
+    except (TypeError, ValueError):
+        return None
+
+
+def require_user_id(request: Request) -> int:
+    """The user id of the request's `Authorization: Bearer` token; 401 without a valid one"""
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    user_id = token_user_id(token.strip()) if scheme.lower() == "bearer" else None
+    if user_id is None:
+        raise HTTPException(status_code=401, detail="Missing or invalid token")
+    return user_id
@@ -0,0 +1,220 @@
+import time
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+from config import Config
+import startup
+
+mysql_connector = startup.lazy_import("mysql.connector")
+
+# Columns copied verbatim from the hot table into the archive
+HISTORY_COLUMNS = ["id", "session_id", "user_id", "lesson_id", "message", "timestamp"]
+
+# Session columns added to tables created before conversations were scoped
+SESSION_COLUMNS = {
+    "session_id": "VARCHAR(64) NULL",
+    "user_id": "INT NULL",
+    "lesson_id": "VARCHAR(64) NULL",
+}
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+def _index_exists(cursor, table: str, index_name: str) -> bool:
+    cursor.execute(f"SHOW INDEX FROM {table} WHERE Key_name = %s", (index_name,))
+    return bool(cursor.fetchall())
+
+
+def _add_missing_columns(cursor, table: str):
+    cursor.execute(f"SHOW COLUMNS FROM {table}")
+    existing = {row[0] for row in cursor.fetchall()}
+    for column, definition in SESSION_COLUMNS.items():
+        if column not in existing:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+            print(f"Added {column} column to {table}")
+
+
+def session_key(session_id: Optional[str], user_id=None, lesson_id=None, client_id: Optional[str] = None) -> str:
+    """
+    Pick the conversation a message belongs to: one per user and lesson, or per connection and
+    lesson for anonymous clients. An explicit session id names a conversation within that owner's
+    own sessions, so knowing someone else's session id never reaches their history. `user_id`
+    must come from a verified login token, never from what the client claims.
+    """
+    owner = f"u{user_id}" if user_id else f"c{client_id}"
+    if session_id:
+        session_id = str(session_id)
+        # Ids handed back by the server already carry the owner
+        if session_id.startswith(f"{owner}:"):
+            return session_id[:64]
+        return f"{owner}:s{session_id}"[:64]
+    return f"{owner}:l{lesson_id or 0}"[:64]
+
+
+def ensure_schema(connection):
+    """Create the hot and archive tables and their indexes, once per process"""
+    global _schema_ready
+    if _schema_ready:
+        return
+
+    with _schema_lock:
+        if _schema_ready:
+            return
+        cursor = connection.cursor()
+        try:
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS chat_history (
+                    id INT AUTO_INCREMENT PRIMARY KEY,
+                    session_id VARCHAR(64) NULL,
+                    user_id INT NULL,
+                    lesson_id VARCHAR(64) NULL,
+                    message TEXT NOT NULL,
+                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            _add_missing_columns(cursor, "chat_history")
+            # Each session's history is a single range of this index
+            if not _index_exists(cursor, "chat_history", "idx_chat_history_session"):
+                cursor.execute("CREATE INDEX idx_chat_history_session ON chat_history (session_id, id)")
+                print("Added session index to chat_history")
+            # Retention scans go by age, so the hot table needs an index on timestamp
+            if not _index_exists(cursor, "chat_history", "idx_chat_history_timestamp"):
+                cursor.execute("CREATE INDEX idx_chat_history_timestamp ON chat_history (timestamp)")
+                print("Added timestamp index to chat_history")
+
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS chat_history_archive (
+                    id INT PRIMARY KEY,
+                    session_id VARCHAR(64) NULL,
+                    user_id INT NULL,
+                    lesson_id VARCHAR(64) NULL,
+                    message TEXT NOT NULL,
+                    timestamp TIMESTAMP NULL,
+                    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    KEY idx_chat_history_archive_timestamp (timestamp),
+                    KEY idx_chat_history_archive_session (session_id, id)
+                )
+            """)
+            _add_missing_columns(cursor, "chat_history_archive")
+            connection.commit()
+            _schema_ready = True
+        except mysql_connector.Error as e:
+            print(f"Error preparing chat_history tables: {e}")
+        finally:
+            cursor.close()
+
+
+def save_message(connection, message: str, session_id: Optional[str] = None,
+                 user_id=None, lesson_id=None) -> int:
+    """Insert one message and return its id"""
+    cursor = connection.cursor()
+    try:
+        cursor.execute(
+            """
+            INSERT INTO chat_history (session_id, user_id, lesson_id, message)
+            VALUES (%s, %s, %s, %s)
+            """,
+            (session_id, user_id, str(lesson_id) if lesson_id is not None else None, message)
+        )
+        connection.commit()
+        return cursor.lastrowid
+    finally:
+        cursor.close()
+
+
+def fetch_page(connection, before_id: Optional[int] = None, limit: int = 10,
+               session_id: Optional[str] = None,
+               user_id: Optional[int] = None) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    """
+    Read one page of history, newest first, using keyset pagination on the primary key
+    (or on (session_id, id) when scoped to a session), optionally only one user's messages.
+    Returns the messages in chronological order plus the cursor for the next (older) page.
+    """
+    conditions = []
+    params = []
+    if session_id is not None:
+        conditions.append("session_id = %s")
+        params.append(session_id)
+    if user_id is not None:
+        conditions.append("user_id = %s")
+        params.append(user_id)
+    if before_id is not None:
+        conditions.append("id < %s")
+        params.append(before_id)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    cursor = connection.cursor(dictionary=True)
+    try:
+        cursor.execute(
+            f"""
+            SELECT id, session_id, message, timestamp
+            FROM chat_history
+            {where}
+            ORDER BY id DESC
+            LIMIT %s
+            """,
+            (*params, limit)
+        )
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+
+    next_before = rows[-1]['id'] if len(rows) == limit else None
+    rows.reverse()  # Reverse to get chronological order
+    return rows, next_before
+
+
+def compact(connection, retention_days: float = None, batch_size: int = None) -> int:
+    """
+    Move rows older than the retention window into chat_history_archive.
+    Works in small batches, each its own transaction, so the hot table is never locked for long.
+    Returns the number of rows archived.
+    """
+    retention_days = Config.CHAT_HISTORY_RETENTION_DAYS if retention_days is None else retention_days
+    batch_size = batch_size or Config.CHAT_HISTORY_ARCHIVE_BATCH
+    if retention_days <= 0:
+        return 0
+
+    columns = ", ".join(HISTORY_COLUMNS)
+    archived = 0
+    cursor = connection.cursor()
+    try:
+        while True:
+            cursor.execute(
+                """
+                SELECT id FROM chat_history
+                WHERE timestamp < NOW() - INTERVAL %s DAY
+                ORDER BY timestamp
+                LIMIT %s
+                """,
+                (retention_days, batch_size)
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+            if not ids:
+                break
+
+            # Copy and delete commit together (autocommit is off)
+            placeholders = ", ".join(["%s"] * len(ids))
+            cursor.execute(
+                f"""
+                INSERT IGNORE INTO chat_history_archive ({columns})
+                SELECT {columns} FROM chat_history WHERE id IN ({placeholders})
+                """,
+                tuple(ids)
+            )
+            cursor.execute(f"DELETE FROM chat_history WHERE id IN ({placeholders})", tuple(ids))
+            connection.commit()
+            archived += len(ids)
+
+            if len(ids) < batch_size:
+                break
+            time.sleep(Config.CHAT_HISTORY_ARCHIVE_PAUSE)  # Let live traffic in between batches
+    except mysql_connector.Error as e:
+        print(f"Error compacting chat history: {e}")
+        connection.rollback()
+    finally:
+        cursor.close()
+
+    if archived:
+        print(f"Archived {archived} chat messages older than {retention_days:g} days")
+    return archived
@@ -22,11 +22,103 @@ class Config:
     
     # API Keys
     XAI_API_KEY = os.getenv("XAI_API_KEY")
-    if not XAI_API_KEY:
-        print("❌ Error: XAI_API_KEY not found in environment variables")
-    else:
-        print(f"✅ XAI_API_KEY found: {XAI_API_KEY[:8]}...")
+    JWT_SECRET = os.getenv("JWT_SECRET")  # Shared with the Node backend, which issues login tokens
     
+    # WebSocket connection management
+    WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", 32))  # Outbound messages buffered per client
+    WS_OVERFLOW_POLICY = os.getenv("WS_OVERFLOW_POLICY", "drop")  # "drop" or "close" when a client's queue is full
+    WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", 10))  # Seconds before a stuck send closes the socket
+    WS_PING_INTERVAL = float(os.getenv("WS_PING_INTERVAL", 20))  # Protocol-level ping interval
+    WS_PING_TIMEOUT = float(os.getenv("WS_PING_TIMEOUT", 20))  # Close if no pong arrives within this time
+    WS_IDLE_TIMEOUT = float(os.getenv("WS_IDLE_TIMEOUT", 1800))  # Close sockets with no client activity
+    WS_COMPRESSION = os.getenv("WS_COMPRESSION", "true").lower() == "true"  # permessage-deflate (app.py)
+
+    # LLM admission control and rate limiting
+    LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 8))  # Grok calls in flight at once
+    LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", 32))  # Requests allowed to wait for a slot
+    LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", 15))  # Max seconds spent waiting for a slot
+    # Priority classes sharing those slots: dispatch weights and per-class concurrency caps
+    LLM_INTERACTIVE_WEIGHT = float(os.getenv("LLM_INTERACTIVE_WEIGHT", 8))  # Live chat
+    LLM_BACKGROUND_WEIGHT = float(os.getenv("LLM_BACKGROUND_WEIGHT", 1))  # Batch jobs (QA generation, summaries, warmup)
+    LLM_BACKGROUND_MAX_CONCURRENCY = int(os.getenv("LLM_BACKGROUND_MAX_CONCURRENCY", max(1, LLM_MAX_CONCURRENCY // 4)))
+    LLM_BACKGROUND_QUEUE_TIMEOUT = float(os.getenv("LLM_BACKGROUND_QUEUE_TIMEOUT", 300))
+    RATE_LIMIT_CONNECTION_RATE = float(os.getenv("RATE_LIMIT_CONNECTION_RATE", 0.5))  # Messages per second
+    RATE_LIMIT_CONNECTION_BURST = float(os.getenv("RATE_LIMIT_CONNECTION_BURST", 5))
+    RATE_LIMIT_USER_RATE = float(os.getenv("RATE_LIMIT_USER_RATE", 0.33))
+    RATE_LIMIT_USER_BURST = float(os.getenv("RATE_LIMIT_USER_BURST", 10))
+
+    # Lesson content cache
+    LESSON_CACHE_TTL = float(os.getenv("LESSON_CACHE_TTL", 600))  # Seconds a processed lesson stays cached
+    LESSON_CACHE_SIZE = int(os.getenv("LESSON_CACHE_SIZE", 64))  # Max lessons held in memory
+
+    # User lookup
+    USER_INDEX_TTL = float(os.getenv("USER_INDEX_TTL", 300))  # Seconds before the username trie is rebuilt
+    USER_PREFIX_MIN_LENGTH = int(os.getenv("USER_PREFIX_MIN_LENGTH", 3))  # Shorter names only match exactly
+    USER_FUZZY_MAX_DISTANCE = int(os.getenv("USER_FUZZY_MAX_DISTANCE", 2))  # Max typos tolerated in a username
+    PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", 512))  # Materialized student profiles held in memory
+    PROFILE_CACHE_TTL = float(os.getenv("PROFILE_CACHE_TTL", 60))  # How long a name or email keeps resolving to a cached user
+
+    # Chat history retention
+    CHAT_HISTORY_RETENTION_DAYS = float(os.getenv("CHAT_HISTORY_RETENTION_DAYS", 30))  # 0 keeps everything hot
+    CHAT_HISTORY_ARCHIVE_BATCH = int(os.getenv("CHAT_HISTORY_ARCHIVE_BATCH", 1000))  # Rows moved per transaction
+    CHAT_HISTORY_ARCHIVE_PAUSE = float(os.getenv("CHAT_HISTORY_ARCHIVE_PAUSE", 0.1))  # Seconds between batches
+    CHAT_HISTORY_COMPACTION_INTERVAL = float(os.getenv("CHAT_HISTORY_COMPACTION_INTERVAL", 3600))
+    CHAT_HISTORY_PAGE_SIZE = int(os.getenv("CHAT_HISTORY_PAGE_SIZE", 10))
+
+    # PDF uploads and extraction
+    PDF_UPLOAD_MAX_BYTES = int(os.getenv("PDF_UPLOAD_MAX_BYTES", 50 * 1024 * 1024))
+    PDF_EXTRACTION_CONCURRENCY = int(os.getenv("PDF_EXTRACTION_CONCURRENCY", 2))  # Extractions run at once
+    PDF_JOB_RESULTS = int(os.getenv("PDF_JOB_RESULTS", 256))  # Finished extraction jobs remembered
+
+    # Persistent store for extracted lesson data (SQLite, keyed by PDF content hash)
+    LESSON_STORE_PATH = os.getenv(
+        "LESSON_STORE_PATH", str(Path(__file__).parent / "data" / "lesson_store.sqlite3")
+    )
+
+    # Startup warmup
+    WARMUP_CONCURRENCY = int(os.getenv("WARMUP_CONCURRENCY", 4))  # Warmup steps running at once
+    WARMUP_TIMEOUT = float(os.getenv("WARMUP_TIMEOUT", 120))  # Report ready after this long regardless
+    WARMUP_MAX_LESSONS = int(os.getenv("WARMUP_MAX_LESSONS", 20))
+    WARMUP_HISTORY_ROWS = int(os.getenv("WARMUP_HISTORY_ROWS", 200))
+
+    # Lesson prefetch when a /grok client connects
+    PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "true").lower() == "true"
+    PREFETCH_CONCURRENCY = int(os.getenv("PREFETCH_CONCURRENCY", 2))  # Lesson loads running at once
+    PREFETCH_ADJACENT = int(os.getenv("PREFETCH_ADJACENT", 1))  # Lessons on each side of the current one
+    PREFETCH_MAX_DELAY = float(os.getenv("PREFETCH_MAX_DELAY", 30))  # Give up if traffic stays busy this long
+
+    # Cold start target: seconds from process start until the server is listening
+    STARTUP_TARGET_SECONDS = float(os.getenv("STARTUP_TARGET_SECONDS", 1.0))
+
+    # Executor pools for blocking work done on behalf of async handlers
+    IO_EXECUTOR_WORKERS = int(os.getenv("IO_EXECUTOR_WORKERS", 16))  # Database and file system
+    LLM_EXECUTOR_WORKERS = int(os.getenv("LLM_EXECUTOR_WORKERS", 2 * LLM_MAX_CONCURRENCY))  # Grok HTTP calls
+    PDF_PROCESS_WORKERS = int(os.getenv("PDF_PROCESS_WORKERS", min(4, os.cpu_count() or 1)))  # 0 parses in-thread
+
+    # Course-wide topic index (related lessons) and full-text search index
+    LESSON_INDEX_ON_STARTUP = os.getenv("LESSON_INDEX_ON_STARTUP", "true").lower() == "true"  # Topic and search indexes, batch built during warmup
+    LESSON_INDEX_MAX_LESSONS = int(os.getenv("LESSON_INDEX_MAX_LESSONS", 1000))
+
+    # Grok upstream resilience
+    GROK_API_URL = os.getenv("GROK_API_URL", "https://api.x.ai/v1/chat/completions")
+    GROK_MODEL = os.getenv("GROK_MODEL", "grok-beta")
+    GROK_CONNECT_TIMEOUT = float(os.getenv("GROK_CONNECT_TIMEOUT", 3.05))  # Seconds per attempt
+    GROK_READ_TIMEOUT = float(os.getenv("GROK_READ_TIMEOUT", 30))  # Seconds per attempt
+    GROK_DEADLINE = float(os.getenv("GROK_DEADLINE", 45))  # Overall budget across retries
+    GROK_MAX_RETRIES = int(os.getenv("GROK_MAX_RETRIES", 2))
+    GROK_BACKOFF_BASE = float(os.getenv("GROK_BACKOFF_BASE", 0.5))
+    GROK_BACKOFF_MAX = float(os.getenv("GROK_BACKOFF_MAX", 4.0))
+    GROK_HEDGE_ENABLED = os.getenv("GROK_HEDGE_ENABLED", "false").lower() == "true"
+    GROK_HEDGE_MIN_DELAY = float(os.getenv("GROK_HEDGE_MIN_DELAY", 2.0))  # Never hedge sooner than this
+    GROK_HEDGE_MAX_RATIO = float(os.getenv("GROK_HEDGE_MAX_RATIO", 0.1))  # Hedges per call, at most
+    GROK_HEDGE_WORKERS = int(os.getenv("GROK_HEDGE_WORKERS", 16))
+    GROK_BREAKER_THRESHOLD = int(os.getenv("GROK_BREAKER_THRESHOLD", 5))  # Consecutive failed calls
+    GROK_BREAKER_RESET = float(os.getenv("GROK_BREAKER_RESET", 30))  # Seconds before a probe
+
+    # HTTP caching and compression for JSON endpoints
+    HTTP_CACHE_CONTROL = os.getenv("HTTP_CACHE_CONTROL", "no-cache")  # Store, but revalidate with If-None-Match
+    HTTP_COMPRESSION_MIN_SIZE = int(os.getenv("HTTP_COMPRESSION_MIN_SIZE", 1024))  # Smaller bodies are sent as is
+
     # Frontend URL for development
     FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:5173")
     
@@ -53,6 +145,8 @@ class Config:
         if not cls.XAI_API_KEY:
             print("❌ Error: XAI_API_KEY is required but not set")
             is_valid = False
+        else:
+            print(f"✅ XAI_API_KEY found: {cls.XAI_API_KEY[:8]}...")
             
         if not cls.DB_HOST or not cls.DB_USER or not cls.DB_PASSWORD or not cls.DB_NAME:
             print("❌ Error: Database configuration is incomplete")
@@ -0,0 +1,164 @@
+import time
+import asyncio
+import functools
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Any, Callable
+from config import Config
+
+
+class BoundedExecutor:
+    """
+    A fixed-size pool for one kind of blocking work, created on first use.
+    Tracks queued and running jobs so /metrics shows when a pool is the bottleneck.
+    """
+
+    def __init__(self, name: str, workers: int, processes: bool = False):
+        self.name = name
+        self.workers = max(1, workers)
+        self.processes = processes
+        self._executor = None
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.max_queued = 0
+        self.completed = 0
+        self.failed = 0
+        self._waits = deque(maxlen=500)
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    if self.processes:
+                        # spawn: forking a process that already runs threads is unsafe
+                        self._executor = ProcessPoolExecutor(
+                            max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                        )
+                    else:
+                        self._executor = ThreadPoolExecutor(
+                            max_workers=self.workers, thread_name_prefix=self.name
+                        )
+        return self._executor
+
+    def _track_submit(self):
+        with self._lock:
+            self.queued += 1
+            self.max_queued = max(self.max_queued, self.queued)
+
+    def _track_start(self, submitted: float):
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+        self._waits.append(time.perf_counter() - submitted)
+
+    def _track_done(self, failed: bool):
+        with self._lock:
+            self.running -= 1
+            if failed:
+                self.failed += 1
+            else:
+                self.completed += 1
+
+    def _call(self, submitted: float, fn: Callable, *args, **kwargs):
+        self._track_start(submitted)
+        failed = True
+        try:
+            result = fn(*args, **kwargs)
+            failed = False
+            return result
+        finally:
+            self._track_done(failed)
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """Await `fn(*args, **kwargs)` on this pool without blocking the event loop"""
+        loop = asyncio.get_running_loop()
+        if self.processes:
+            return await asyncio.wrap_future(self.submit(fn, *args, **kwargs), loop=loop)
+        self._track_submit()
+        return await loop.run_in_executor(
+            self.executor, functools.partial(self._call, time.perf_counter(), fn, *args, **kwargs)
+        )
+
+    def submit(self, fn: Callable, *args, **kwargs):
+        """Schedule `fn` and return a concurrent.futures.Future"""
+        self._track_submit()
+        if not self.processes:
+            return self.executor.submit(self._call, time.perf_counter(), fn, *args, **kwargs)
+
+        # Work runs in another process: count it as queued until it finishes, stats() splits it up
+        future = self.executor.submit(fn, *args, **kwargs)
+
+        def done(f):
+            with self._lock:
+                self.queued -= 1
+                if f.cancelled() or f.exception() is not None:
+                    self.failed += 1
+                else:
+                    self.completed += 1
+        future.add_done_callback(done)
+        return future
+
+    def call(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run `fn` on this pool and block the calling (worker) thread until it's done"""
+        return self.submit(fn, *args, **kwargs).result()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        waits = sorted(self._waits)
+        queued, running = self.queued, self.running
+        if self.processes:
+            queued, running = max(0, self.queued - self.workers), min(self.queued, self.workers)
+        return {
+            "kind": "process" if self.processes else "thread",
+            "workers": self.workers,
+            "started": self._executor is not None,
+            "queued": queued,
+            "running": running,
+            "max_queued": self.max_queued,
+            "completed": self.completed,
+            "failed": self.failed,
+            "queue_wait_p95": round(waits[int(0.95 * (len(waits) - 1))], 4) if waits else None,
+        }
+
+
+# Database queries and file system access
+io = BoundedExecutor("io", Config.IO_EXECUTOR_WORKERS)
+# Blocking HTTP calls to the LLM upstream; sized above LLM_MAX_CONCURRENCY so admitted calls never queue here
+llm = BoundedExecutor("llm", Config.LLM_EXECUTOR_WORKERS)
+# CPU-bound PDF parsing, off the GIL
+pdf = BoundedExecutor("pdf", Config.PDF_PROCESS_WORKERS, processes=True)
+
+
+def parse_pdf(fn: Callable, *args) -> Any:
+    """
+    Run a module-level PDF parsing or text analysis function in the process pool.
+    Runs inline when the pool is disabled (PDF_PROCESS_WORKERS=0) or has crashed.
+    """
+    global pdf
+    if Config.PDF_PROCESS_WORKERS <= 0:
+        return fn(*args)
+    try:
+        return pdf.call(fn, *args)
+    except BrokenProcessPool as e:
+        print(f"⚠️ PDF process pool crashed, parsing inline: {str(e)}")
+        pdf.shutdown()
+        pdf = BoundedExecutor("pdf", Config.PDF_PROCESS_WORKERS, processes=True)
+        return fn(*args)
+
+
+def shutdown():
+    for pool in (io, llm, pdf):
+        pool.shutdown()
+
+
+def get_stats() -> Dict[str, Any]:
+    return {pool.name: pool.stats() for pool in (io, llm, pdf)}
@@ -0,0 +1,278 @@
+import time
+import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, Any, Optional
+from config import Config
+import startup
+
+requests = startup.lazy_import("requests")
+
+
+class UpstreamError(Exception):
+    """A failed call to the LLM upstream. `retryable` marks errors worth trying again."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None,
+                 retryable: bool = False, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(UpstreamError):
+    """Raised without calling the upstream while the circuit breaker is open"""
+
+    def __init__(self, retry_after: float):
+        super().__init__("LLM upstream is unavailable", retryable=True, retry_after=retry_after)
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failed calls and fails fast for `reset_timeout`
+    seconds; then lets a single probe through (half-open) and closes again if it succeeds.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "open":
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    return False
+                self.state = "half_open"
+                self._probe_in_flight = False
+            if self.state == "half_open":
+                if self._probe_in_flight:
+                    return False
+                self._probe_in_flight = True
+            return True
+
+    def abandon(self):
+        """A call ended without a verdict (an unexpected error): let the next call probe instead"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def retry_after(self) -> float:
+        return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.times_opened += 1
+                    print(f"❌ LLM circuit breaker opened after {self.failures} failures")
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+
+class GrokClient:
+    """
+    Chat completions against x.ai with per-attempt timeouts, an overall deadline,
+    jittered retries, optional hedged requests and a circuit breaker.
+    """
+
+    def __init__(self):
+        self.url = Config.GROK_API_URL
+        self.connect_timeout = Config.GROK_CONNECT_TIMEOUT
+        self.read_timeout = Config.GROK_READ_TIMEOUT
+        self.deadline = Config.GROK_DEADLINE
+        self.max_retries = Config.GROK_MAX_RETRIES
+        self.backoff_base = Config.GROK_BACKOFF_BASE
+        self.backoff_max = Config.GROK_BACKOFF_MAX
+        self.hedge_enabled = Config.GROK_HEDGE_ENABLED
+        self.hedge_min_delay = Config.GROK_HEDGE_MIN_DELAY
+        self.hedge_max_ratio = Config.GROK_HEDGE_MAX_RATIO
+        self.breaker = CircuitBreaker(Config.GROK_BREAKER_THRESHOLD, Config.GROK_BREAKER_RESET)
+        self._latencies = deque(maxlen=200)
+        self._local = threading.local()
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        # Calls run on several llm and hedge threads at once
+        self._counters_lock = threading.Lock()
+        self.counters = {
+            "calls": 0, "attempts": 0, "retries": 0, "successes": 0, "failures": 0,
+            "hedges": 0, "hedge_wins": 0, "short_circuited": 0,
+        }
+
+    def _count(self, name: str):
+        with self._counters_lock:
+            self.counters[name] += 1
+
+    def _session(self):
+        # requests sessions aren't thread-safe; one per thread still reuses connections
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def _hedge_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=Config.GROK_HEDGE_WORKERS, thread_name_prefix="grok-hedge"
+                    )
+        return self._executor
+
+    def hedge_delay(self) -> float:
+        """Send a hedge once a request has taken longer than the recent p95"""
+        if len(self._latencies) < 20:
+            return max(self.hedge_min_delay, self.read_timeout / 2)
+        ordered = sorted(self._latencies)
+        return max(self.hedge_min_delay, ordered[int(0.95 * (len(ordered) - 1))])
+
+    def _post(self, payload: Dict[str, Any], api_key: str, read_timeout: float) -> str:
+        self._count("attempts")
+        started = time.perf_counter()
+        headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        }
+        try:
+            response = self._session().post(
+                self.url, headers=headers, json=payload,
+                timeout=(self.connect_timeout, read_timeout)
+            )
+        except requests.exceptions.Timeout:
+            raise UpstreamError("Request to the LLM timed out", retryable=True)
+        except requests.exceptions.RequestException as e:
+            raise UpstreamError(f"Could not reach the LLM: {str(e)}", retryable=True)
+
+        if response.status_code == 200:
+            try:
+                response_data = response.json()
+                choices = response_data.get("choices") if isinstance(response_data, dict) else None
+                content = choices[0]["message"]["content"] if choices else None
+            except (ValueError, KeyError, IndexError, TypeError):
+                raise UpstreamError("API Error: malformed response", status_code=200, retryable=True)
+            if content is None:
+                raise UpstreamError("API Error: empty response", status_code=200, retryable=True)
+            self._latencies.append(time.perf_counter() - started)
+            return content
+
+        error_msg = f"API Error: {response.status_code}"
+        if response.text:
+            try:
+                error_data = response.json()
+                if "error" in error_data:
+                    error = error_data["error"]
+                    error_msg = f"API Error: {error.get('message', 'Unknown error') if isinstance(error, dict) else error}"
+            except ValueError:
+                error_msg = f"API Error: {response.text[:100]}"
+
+        retry_after = None
+        if response.headers.get("Retry-After", "").isdigit():
+            retry_after = float(response.headers["Retry-After"])
+        retryable = response.status_code in (408, 429) or response.status_code >= 500
+        raise UpstreamError(error_msg, response.status_code, retryable, retry_after)
+
+    def _attempt(self, payload: Dict[str, Any], api_key: str, remaining: float) -> str:
+        read_timeout = max(0.1, min(self.read_timeout, remaining))
+        hedge_budget = self.counters["hedges"] < self.hedge_max_ratio * max(1, self.counters["calls"])
+        if not self.hedge_enabled or not hedge_budget or remaining <= self.hedge_min_delay:
+            return self._post(payload, api_key, read_timeout)
+
+        executor = self._hedge_executor()
+        primary = executor.submit(self._post, payload, api_key, read_timeout)
+        done, _ = wait([primary], timeout=min(self.hedge_delay(), remaining))
+        if done:
+            return primary.result()
+
+        # The primary is slow: race a second request against it and take whichever answers first
+        self._count("hedges")
+        hedge = executor.submit(self._post, payload, api_key, max(0.1, read_timeout - self.hedge_delay()))
+        pending = {primary, hedge}
+        last_error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result = future.result()
+                except UpstreamError as e:
+                    last_error = e
+                    continue
+                if future is hedge:
+                    self._count("hedge_wins")
+                return result
+        raise last_error
+
+    def complete(self, payload: Dict[str, Any], api_key: str) -> str:
+        """Return the completion text or raise UpstreamError / CircuitOpenError"""
+        if not self.breaker.allow():
+            self._count("short_circuited")
+            raise CircuitOpenError(self.breaker.retry_after())
+
+        self._count("calls")
+        try:
+            return self._complete(payload, api_key)
+        except UpstreamError:
+            # Success or failure is already recorded
+            raise
+        except BaseException:
+            # No verdict on the upstream (e.g. a bug while handling the reply): don't hold the probe
+            self.breaker.abandon()
+            raise
+
+    def _complete(self, payload: Dict[str, Any], api_key: str) -> str:
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            try:
+                result = self._attempt(payload, api_key, deadline - time.monotonic())
+                self.breaker.record_success()
+                self._count("successes")
+                return result
+            except UpstreamError as e:
+                last_error = e
+
+            if not last_error.retryable or attempt >= self.max_retries:
+                break
+            # Full jitter keeps retrying clients from synchronizing
+            delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+            if last_error.retry_after:
+                delay = max(delay, last_error.retry_after)
+            if time.monotonic() + delay >= deadline:
+                break
+            print(f"⚠️ {last_error}, retrying in {delay:.2f}s")
+            time.sleep(delay)
+            attempt += 1
+            self._count("retries")
+
+        self._count("failures")
+        if last_error.retryable:
+            self.breaker.record_failure()
+        else:
+            # The upstream answered; the request itself was bad
+            self.breaker.record_success()
+        raise last_error
+
+    def stats(self) -> Dict[str, Any]:
+        ordered = sorted(self._latencies)
+        with self._counters_lock:
+            counters = dict(self.counters)
+        return {
+            **counters,
+            "circuit": self.breaker.state,
+            "circuit_opened": self.breaker.times_opened,
+            "latency_p50": ordered[len(ordered) // 2] if ordered else None,
+            "latency_p95": ordered[int(0.95 * (len(ordered) - 1))] if ordered else None,
+            "hedge_delay": self.hedge_delay() if self.hedge_enabled else None,
+        }
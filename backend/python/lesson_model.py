@@ -0,0 +1,143 @@
+import sys
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional
+
+# Bump when to_dict's layout changes
+SERIALIZATION_VERSION = 1
+
+# Legacy dict keys still used by callers, mapped to Lesson attributes
+_ALIASES = {
+    "qaPairs": "qa_pairs",
+    "raw_content": "full_text",
+}
+
+
+@dataclass(slots=True)
+class Lesson:
+    """
+    One processed lesson. The PDF text is held once in `full_text`; the formatted
+    `content` view is derived from it on demand instead of being stored as a second copy.
+    Supports `lesson.get('content')` / `lesson['title']` so it can stand in for the old dicts.
+    """
+    id: str
+    title: str
+    full_text: str = ""
+    pdf_path: Optional[str] = None
+    has_pdf: bool = True
+    sections: Dict[str, Any] = field(default_factory=dict)
+    toc: List[Any] = field(default_factory=list)
+    word_count: int = 0
+    page_count: int = 0
+    # Where each page starts in full_text, for page-level search results
+    page_offsets: List[int] = field(default_factory=list)
+    summary: str = ""
+    key_points: List[str] = field(default_factory=list)
+    related_topics: List[str] = field(default_factory=list)
+    qa_pairs: List[Dict[str, Any]] = field(default_factory=list)
+    error: Optional[str] = None
+    # Set only for lessons whose content is not derived from full_text (e.g. error messages)
+    message: Optional[str] = field(default=None, repr=False)
+
+    @property
+    def content(self) -> str:
+        """The formatted lesson text sent to the LLM and to clients"""
+        if self.message is not None:
+            return self.message
+
+        formatted_content = f"TITLE: {self.title}\n\n"
+        sections = self.sections
+        if "objective" in sections:
+            formatted_content += f"OBJECTIVE:\n{sections['objective']}\n\n"
+
+        if "key_concepts" in sections:
+            formatted_content += "KEY CONCEPTS:\n"
+            if isinstance(sections['key_concepts'], list):
+                for i, concept in enumerate(sections['key_concepts']):
+                    formatted_content += f"{i+1}. {concept}\n"
+            else:
+                formatted_content += f"{sections['key_concepts']}\n"
+            formatted_content += "\n"
+
+        if "application" in sections:
+            formatted_content += f"APPLICATION:\n{sections['application']}\n\n"
+
+        if "discussion" in sections:
+            formatted_content += f"DISCUSSION:\n{sections['discussion']}\n\n"
+
+        # If no sections were found, just include the full text
+        if not sections:
+            formatted_content += f"CONTENT:\n{self.full_text}\n"
+        return formatted_content
+
+    # Dict-style access for code written against the old lesson dicts
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            value = getattr(self, _ALIASES.get(key, key))
+        except AttributeError:
+            return default
+        return default if value is None else value
+
+    def __getitem__(self, key: str) -> Any:
+        try:
+            return getattr(self, _ALIASES.get(key, key))
+        except AttributeError:
+            raise KeyError(key)
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    def to_dict(self, include_content: bool = False) -> Dict[str, Any]:
+        """Stable JSON-ready form; `content` is only rendered when asked for"""
+        data = {
+            "schema": SERIALIZATION_VERSION,
+            "id": self.id,
+            "title": self.title,
+            "pdf_path": self.pdf_path,
+            "has_pdf": self.has_pdf,
+            "full_text": self.full_text,
+            "sections": self.sections,
+            "toc": self.toc,
+            "word_count": self.word_count,
+            "page_count": self.page_count,
+            "page_offsets": self.page_offsets,
+            "summary": self.summary,
+            "key_points": self.key_points,
+            "related_topics": self.related_topics,
+            "qa_pairs": self.qa_pairs,
+            "error": self.error,
+        }
+        if self.message is not None:
+            data["message"] = self.message
+        if include_content:
+            data["content"] = self.content
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Lesson":
+        return cls(
+            id=str(data["id"]),
+            title=data.get("title") or f"Lesson {data['id']}",
+            full_text=data.get("full_text", ""),
+            pdf_path=data.get("pdf_path"),
+            has_pdf=data.get("has_pdf", True),
+            sections=data.get("sections") or {},
+            toc=data.get("toc") or [],
+            word_count=data.get("word_count", 0),
+            page_count=data.get("page_count", 0),
+            page_offsets=data.get("page_offsets") or [],
+            summary=data.get("summary", ""),
+            key_points=data.get("key_points") or [],
+            related_topics=data.get("related_topics") or [],
+            qa_pairs=data.get("qa_pairs") or [],
+            error=data.get("error"),
+            message=data.get("message"),
+        )
+
+    def approx_size(self) -> int:
+        """Rough bytes held by this lesson, for cache accounting"""
+        size = sys.getsizeof(self) + sys.getsizeof(self.full_text) + sys.getsizeof(self.title)
+        size += sum(sys.getsizeof(value) for value in self.sections.values())
+        size += sys.getsizeof(self.summary) + sum(sys.getsizeof(point) for point in self.key_points)
+        if self.message is not None:
+            size += sys.getsizeof(self.message)
+        return size
@@ -0,0 +1,154 @@
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+# Clients opt in to lesson references by sending "protocol": 2; everyone else gets full payloads
+PROTOCOL_VERSION = 2
+
+# Section ids clients can reference once a lesson has been sent
+SECTION_IDS = ("content", "summary", "key_points")
+
+
+def dumps(payload: Any) -> str:
+    """Serialize a frame, with orjson when it is installed"""
+    if HAS_ORJSON:
+        return orjson.dumps(payload).decode()
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+
+
+def clean_text(text: str) -> str:
+    """Strip hash symbols and blank lines, as chat replies have always done"""
+    text = (text or "").replace('#', '').strip()
+    if '\n' in text:
+        text = '\n'.join(line.strip() for line in text.split('\n') if line.strip())
+    return text
+
+
+def clean_items(items: List[str]) -> List[str]:
+    return [item.replace('#', '').strip() for item in items or []]
+
+
+class LessonView:
+    """The cleaned, client-facing sections of one lesson version, plus its encoded lesson frame"""
+
+    def __init__(self, lesson_id: str, lesson):
+        self.lesson_id = lesson_id
+        self.lesson = lesson
+        self.title = lesson.get('title', 'Unknown Lesson')
+        self.sections = {
+            "content": clean_text(lesson.get('content', '')),
+            "summary": (lesson.get('summary') or '').replace('#', '').strip(),
+            "key_points": clean_items(lesson.get('key_points')),
+        }
+        self.section_hashes = {
+            name: hashlib.sha1(dumps(value).encode()).hexdigest()[:16]
+            for name, value in self.sections.items()
+        }
+        self.version = hashlib.sha1(
+            (self.title + "".join(self.section_hashes.values())).encode()
+        ).hexdigest()[:16]
+        self._frame = None
+
+    def frame(self) -> str:
+        """Full lesson frame, encoded once and shared by every connection"""
+        if self._frame is None:
+            self._frame = dumps({
+                "type": "lesson",
+                "lessonId": self.lesson_id,
+                "version": self.version,
+                "title": self.title,
+                "sections": self.sections,
+            })
+        return self._frame
+
+    def delta_frame(self, base: "LessonView") -> str:
+        """Only the sections that differ from a version the client already has"""
+        changed = {
+            name: value for name, value in self.sections.items()
+            if base.section_hashes.get(name) != self.section_hashes[name]
+        }
+        return dumps({
+            "type": "lesson_delta",
+            "lessonId": self.lesson_id,
+            "base": base.version,
+            "version": self.version,
+            "title": self.title,
+            "sections": changed,
+        })
+
+
+_views: "OrderedDict[str, LessonView]" = OrderedDict()
+_views_lock = threading.Lock()
+_MAX_VIEWS = 256
+
+
+def view_for(lesson_id: str, lesson) -> LessonView:
+    """Cleaned view of a lesson, rebuilt only when the lesson cache hands out a new object"""
+    with _views_lock:
+        view = _views.get(lesson_id)
+        if view is not None and view.lesson is lesson:
+            _views.move_to_end(lesson_id)
+            return view
+    view = LessonView(lesson_id, lesson)
+    with _views_lock:
+        _views[lesson_id] = view
+        _views.move_to_end(lesson_id)
+        while len(_views) > _MAX_VIEWS:
+            _views.popitem(last=False)
+    return view
+
+
+class LessonSession:
+    """
+    Per-connection protocol state: which lesson versions this client already holds.
+    Frames queued in `outbox` must be sent before the reply that references them.
+    """
+
+    def __init__(self):
+        self.protocol = 1
+        self.sent: Dict[str, LessonView] = {}
+        self.outbox: List[str] = []
+        self.stats = {"lesson_frames": 0, "delta_frames": 0, "references": 0}
+
+    @property
+    def uses_references(self) -> bool:
+        return self.protocol >= PROTOCOL_VERSION
+
+    def negotiate(self, requested: Any):
+        """Use the client's protocol version, capped at ours; anything unparseable gets ours"""
+        if requested is None or requested == "":
+            return
+        try:
+            version = int(requested) if not isinstance(requested, (bool, float)) else None
+        except (TypeError, ValueError):
+            version = None
+        if version is None or version < 1:
+            print(f"⚠️ Ignoring invalid protocol version {requested!r}")
+            version = PROTOCOL_VERSION
+        self.protocol = min(version, PROTOCOL_VERSION)
+
+    def sync(self, view: LessonView):
+        """Queue whatever this client is missing of the lesson: nothing, a delta or the full lesson"""
+        held = self.sent.get(view.lesson_id)
+        if held is not None and held.version == view.version:
+            self.stats["references"] += 1
+            return
+        if held is not None:
+            self.outbox.append(view.delta_frame(held))
+            self.stats["delta_frames"] += 1
+        else:
+            self.outbox.append(view.frame())
+            self.stats["lesson_frames"] += 1
+        self.sent[view.lesson_id] = view
+
+    def drain(self) -> List[str]:
+        frames, self.outbox = self.outbox, []
+        return frames
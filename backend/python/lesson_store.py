@@ -0,0 +1,200 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Dict, Any, List, Optional, Callable
+from config import Config
+
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialized_paths = set()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS artifacts (
+    content_hash TEXT NOT NULL,
+    extractor_version INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (content_hash, extractor_version, name)
+);
+CREATE TABLE IF NOT EXISTS page_texts (
+    fingerprint TEXT NOT NULL,
+    extractor_version INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (fingerprint, extractor_version)
+);
+CREATE TABLE IF NOT EXISTS file_hashes (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    content_hash TEXT NOT NULL
+);
+"""
+
+stats = {"hits": 0, "misses": 0, "writes": 0, "hash_computations": 0, "pages_reused": 0, "pages_stored": 0}
+
+# Stay under SQLite's bound-parameter limit in IN (...) lookups
+_PAGE_BATCH = 500
+
+
+def _connect() -> sqlite3.Connection:
+    """One SQLite connection per thread, created on first use"""
+    path = Config.LESSON_STORE_PATH
+    connection = getattr(_local, "connection", None)
+    if connection is not None and getattr(_local, "path", None) == path:
+        return connection
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    connection = sqlite3.connect(path, timeout=10)
+    with _init_lock:
+        if path not in _initialized_paths:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(SCHEMA)
+            connection.commit()
+            _initialized_paths.add(path)
+    connection.execute("PRAGMA synchronous=NORMAL")
+    _local.connection, _local.path = connection, path
+    return connection
+
+
+def hash_file(path: str, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def content_hash_for(path: str) -> str:
+    """SHA-256 of a file, remembered per (path, size, mtime) so unchanged files are hashed once"""
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    connection = _connect()
+    row = connection.execute(
+        "SELECT size, mtime_ns, content_hash FROM file_hashes WHERE path = ?", (path,)
+    ).fetchone()
+    if row and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+        return row[2]
+
+    content_hash = hash_file(path)
+    stats["hash_computations"] += 1
+    connection.execute(
+        "INSERT OR REPLACE INTO file_hashes (path, size, mtime_ns, content_hash) VALUES (?, ?, ?, ?)",
+        (path, stat.st_size, stat.st_mtime_ns, content_hash)
+    )
+    connection.commit()
+    return content_hash
+
+
+def get(content_hash: str, name: str, version: int) -> Optional[Any]:
+    """Load a stored artifact, or None if this extractor version hasn't produced it yet"""
+    row = _connect().execute(
+        "SELECT payload FROM artifacts WHERE content_hash = ? AND extractor_version = ? AND name = ?",
+        (content_hash, version, name)
+    ).fetchone()
+    if row is None:
+        stats["misses"] += 1
+        return None
+    stats["hits"] += 1
+    return json.loads(row[0])
+
+
+def put(content_hash: str, name: str, version: int, payload: Any):
+    connection = _connect()
+    connection.execute(
+        "INSERT OR REPLACE INTO artifacts (content_hash, extractor_version, name, payload, created_at) VALUES (?, ?, ?, ?, ?)",
+        (content_hash, version, name, json.dumps(payload), time.time())
+    )
+    connection.commit()
+    stats["writes"] += 1
+
+
+def get_or_create(pdf_path: str, name: str, version: int, build: Callable[[], Any]) -> Any:
+    """Return the stored artifact for this file's content, building and storing it on a miss"""
+    try:
+        content_hash = content_hash_for(pdf_path)
+        cached = get(content_hash, name, version)
+        if cached is not None:
+            return cached
+    except (sqlite3.Error, OSError) as e:
+        print(f"⚠️ Lesson store unavailable, extracting without it: {str(e)}")
+        return build()
+
+    payload = build()
+    try:
+        put(content_hash, name, version, payload)
+    except sqlite3.Error as e:
+        print(f"⚠️ Could not persist {name} for {os.path.basename(pdf_path)}: {str(e)}")
+    return payload
+
+
+def get_pages(fingerprints: List[str], version: int) -> Dict[str, str]:
+    """Text already extracted for any of these page fingerprints, from any earlier PDF"""
+    found = {}
+    unique = list(dict.fromkeys(fingerprints))
+    try:
+        connection = _connect()
+        for start in range(0, len(unique), _PAGE_BATCH):
+            batch = unique[start:start + _PAGE_BATCH]
+            placeholders = ", ".join("?" * len(batch))
+            found.update(connection.execute(
+                f"SELECT fingerprint, text FROM page_texts WHERE extractor_version = ? AND fingerprint IN ({placeholders})",
+                [version, *batch]
+            ).fetchall())
+    except (sqlite3.Error, OSError) as e:
+        print(f"⚠️ Lesson store unavailable, extracting every page: {str(e)}")
+        return {}
+    return found
+
+
+def put_pages(pages: Dict[str, str], version: int) -> int:
+    """Store extracted page text by fingerprint; the number of pages stored"""
+    if not pages:
+        return 0
+    try:
+        connection = _connect()
+        now = time.time()
+        connection.executemany(
+            "INSERT OR REPLACE INTO page_texts (fingerprint, extractor_version, text, created_at) VALUES (?, ?, ?, ?)",
+            [(fingerprint, version, text, now) for fingerprint, text in pages.items()]
+        )
+        connection.commit()
+        return len(pages)
+    except (sqlite3.Error, OSError) as e:
+        print(f"⚠️ Could not persist extracted pages: {str(e)}")
+        return 0
+
+
+def record_pages(reused: int, stored: int):
+    """
+    Count page reuse reported by an extraction. Extraction runs in the pdf process pool, where
+    these counters would never reach /metrics, so the parent adds up what each document reports.
+    """
+    stats["pages_reused"] += reused
+    stats["pages_stored"] += stored
+
+
+def prune_page_versions(version: int) -> int:
+    """Delete page text extracted by older extractor versions"""
+    connection = _connect()
+    cursor = connection.execute("DELETE FROM page_texts WHERE extractor_version < ?", (version,))
+    connection.commit()
+    return cursor.rowcount
+
+
+def prune_versions(name: str, version: int) -> int:
+    """Delete one kind of artifact written by older extractor versions"""
+    connection = _connect()
+    cursor = connection.execute(
+        "DELETE FROM artifacts WHERE name = ? AND extractor_version < ?", (name, version)
+    )
+    connection.commit()
+    return cursor.rowcount
+
+
+def get_stats() -> Dict[str, Any]:
+    return dict(stats)
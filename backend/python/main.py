@@ -1,32 +1,47 @@
+import startup  # First, so the startup clock covers every other import
 import os
 import json
-import fitz  # PyMuPDF
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Request
-import requests
-import pymysql
-from fastapi.middleware.cors import CORSMiddleware
-from dotenv import load_dotenv
-from openai import OpenAI
-import string
+import time
+import uuid
+import asyncio
 import re
 import glob
-from fastapi.responses import JSONResponse
-from config import Config
-from pathlib import Path
-import pdf_processor  # Import the pdf_processor module
-import mysql.connector
-from mysql.connector import Error
-
-# Ensure we're loading from the correct .env file
-env_path = Path(__file__).parent / '.env'
-if env_path.exists():
-    load_dotenv(env_path)
-    print(f"✅ Loaded environment variables from {env_path}")
-else:
-    print(f"❌ Error: .env file not found at {env_path}")
+
+with startup.step("fastapi", kind="import"):
+    from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Request
+    from fastapi.middleware.cors import CORSMiddleware
+    from fastapi.responses import JSONResponse
+
+with startup.step("config", kind="import"):
+    from config import Config  # Loads the .env file next to it
+
+with startup.step("local modules", kind="import"):
+    import pdf_processor  # Import the pdf_processor module
+    from rate_limiter import AdmissionController, AdmissionRejected, PriorityClass, RateLimiter
+    from answer_router import AnswerRouter, match_qa_pair
+    import user_search
+    import user_profiles
+    import chat_history
+    import auth
+    import pdf_uploads
+    import lesson_store
+    from warmup import Warmup
+    from prefetch import LessonPrefetcher
+    from grok_client import GrokClient, UpstreamError, CircuitOpenError
+    import executors
+    import text_analysis
+    import topic_index
+    import search_index
+    import http_caching
+    import pdf_serving
+
+# Heavy dependencies load on first use, not on every cold start
+mysql_connector = startup.lazy_import("mysql.connector")
+process_pdf = startup.lazy_import("process_pdf")  # Pulls in the extraction stack; first used by warmup
 
 # Initialize FastAPI app
-app = FastAPI()
+with startup.step("app setup"):
+    app = FastAPI()
 
 # Add CORS middleware
 app.add_middleware(
@@ -37,68 +52,96 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# gzip (or brotli, when installed) for large JSON responses
+app.add_middleware(http_caching.CompressionMiddleware, minimum_size=Config.HTTP_COMPRESSION_MIN_SIZE)
+
+# Outermost, so the first request is timed before any other middleware runs
+app.add_middleware(startup.FirstRequestMiddleware)
+
+def scan_downloads():
+    """Paths, sizes and modification times of the PDFs in the downloads directory"""
+    downloads_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'downloads')
+    return [
+        (pdf_path, os.path.getsize(pdf_path), os.path.getmtime(pdf_path))
+        for pdf_path in glob.glob(os.path.join(downloads_dir, '*.pdf'))
+    ]
+
+# The last /pdfs payload and the directory state it was built from
+_pdf_listing = (None, None)
+
 # Add a route to check PDF files in the downloads directory
 @app.get("/pdfs")
-async def list_pdfs():
+async def list_pdfs(request: Request):
     """List all PDF files in the downloads directory"""
-    downloads_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'downloads')
-    pdf_files = glob.glob(os.path.join(downloads_dir, '*.pdf'))
+    global _pdf_listing
+    pdf_files = await executors.io.run(scan_downloads)
+
+    # The listing only changes when a PDF is added, removed or rewritten, so the stat data
+    # is the validator: unchanged polls skip the preview extraction as well as the transfer
+    etag = http_caching.make_etag(repr(pdf_files).encode())
+    if http_caching.etag_matches(request, etag):
+        return http_caching.not_modified(etag)
+    if _pdf_listing[0] == etag:
+        return http_caching.cached_json(request, _pdf_listing[1], etag=etag)
+    
+    # Extract the first few characters of each PDF in the parsing pool
+    previews = await asyncio.gather(
+        *(executors.pdf.run(process_pdf.preview_text, pdf_path) for pdf_path, _, _ in pdf_files),
+        return_exceptions=True
+    )
     
     # Return info about each PDF
     result = []
-    for i, pdf_path in enumerate(pdf_files):
-        file_name = os.path.basename(pdf_path)
-        file_size = os.path.getsize(pdf_path)
-        mod_time = os.path.getmtime(pdf_path)
-        
-        # Try to extract first few characters of content
-        try:
-            with fitz.open(pdf_path) as doc:
-                if doc.page_count > 0:
-                    text = doc[0].get_text(sort=True)
-                    preview = text[:100] + "..." if len(text) > 100 else text
-                else:
-                    preview = "Empty document"
-        except Exception as e:
-            preview = f"Error: {str(e)}"
-            
+    for i, ((pdf_path, file_size, mod_time), preview) in enumerate(zip(pdf_files, previews)):
         result.append({
             "index": i,
-            "file_name": file_name,
+            "file_name": os.path.basename(pdf_path),
             "file_path": pdf_path,
             "file_size": file_size,
             "mod_time": mod_time,
-            "preview": preview
+            "preview": f"Error: {str(preview)}" if isinstance(preview, Exception) else preview
         })
     
-    return {"pdf_count": len(pdf_files), "pdfs": result}
+    payload = {"pdf_count": len(pdf_files), "pdfs": result}
+    if any(isinstance(preview, Exception) for preview in previews):
+        # A failed preview may succeed next time: validate this body by its own hash, so a
+        # client holding it never matches the directory ETag and the previews are retried
+        return http_caching.cached_json(request, payload)
+    _pdf_listing = (etag, payload)
+    return http_caching.cached_json(request, payload, etag=etag)
+
+def get_chat_history(session_id=None, limit=None):
+    """Get the most recent chat history for a conversation session"""
+    history, _ = get_chat_history_page(limit=limit, session_id=session_id)
+    print(f"Retrieved {len(history)} messages from chat history")
+    return history
 
-def get_chat_history():
-    """Get the most recent chat history without user ID"""
+def get_chat_history_page(before_id=None, limit=None, session_id=None, user_id=None):
+    """Get one page of chat history older than before_id, plus the cursor for the next page"""
     connection = get_db_connection()
     if connection is None:
-        return []
+        return [], None
     
     try:
-        cursor = connection.cursor(dictionary=True)
-        cursor.execute(
-            """
-            SELECT message, timestamp 
-            FROM chat_history 
-            ORDER BY timestamp DESC
-            LIMIT 10
-            """
+        return chat_history.fetch_page(
+            connection, before_id, limit or Config.CHAT_HISTORY_PAGE_SIZE, session_id, user_id
         )
-        history = cursor.fetchall()
-        history.reverse()  # Reverse to get chronological order
-        print(f"Retrieved {len(history)} messages from chat history")
-        return history
-    except Error as e:
+    except mysql_connector.Error as e:
         print(f"Error retrieving chat history: {e}")
-        return []
+        return [], None
+    finally:
+        if connection.is_connected():
+            connection.close()
+
+def compact_chat_history():
+    """Archive chat history past the retention window"""
+    connection = get_db_connection()
+    if connection is None:
+        return 0
+    try:
+        return chat_history.compact(connection)
     finally:
         if connection.is_connected():
-            cursor.close()
             connection.close()
 
 def format_chat_history(chat_history):
@@ -119,212 +162,173 @@ def format_chat_history(chat_history):
 
 def get_user_info(query):
     """Get user information based on a natural language query"""
+    email, names = user_search.extract_lookup(query)
+    if not email and not names:
+        return "I couldn't understand which user you're asking about. Please specify a username or email."
+
     connection = get_db_connection()
     if connection is None:
         return "Sorry, I couldn't connect to the database."
     
     try:
-        cursor = connection.cursor(dictionary=True)
-        
-        # Extract potential email from query
-        email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-        email_match = re.search(email_pattern, query)
-        
-        # Extract potential username from query
-        username_pattern = r'\b(?:what is |what\'s |find |get |show |about )?(\w+)(?:\'s)?\s*(?:email|information|info|details)?'
-        username_match = re.search(username_pattern, query.lower())
-        
-        if email_match:
-            # Search by email
-            email = email_match.group(0)
-            cursor.execute(
-                """
-                SELECT u.id, u.username, u.email, u.role, u.active
-                FROM users u
-                WHERE u.email = %s
-                """,
-                (email,)
-            )
-        elif username_match:
-            # Search by username
-            username = username_match.group(1)
-            cursor.execute(
-                """
-                SELECT u.id, u.username, u.email, u.role, u.active
-                FROM users u
-                WHERE u.username LIKE %s
-                """,
-                (f"%{username}%",)
-            )
-        else:
-            return "I couldn't understand which user you're asking about. Please specify a username or email."
-        
-        user = cursor.fetchone()
+        # Repeated lookups are served from the materialized profile cache while it still
+        # matches the database; the Node backend and rest_api write profiles behind our back
+        lookup = user_profiles.cache.lookup_key(email, names)
+        cached = user_profiles.cache.get(lookup)
+        if cached:
+            if user_search.fetch_profile_version(connection, cached.user['id']) == cached.version:
+                return cached.text
+            user_profiles.cache.invalidate(cached.user['id'])
+
+        # One joined query returns the user and every profile section
+        user, sections_rows = user_search.find_user_with_profile(connection, email, names)
         if not user:
             return "I couldn't find any user matching your query."
-
-        # Get the basic user info
-        user_id = user['id']
-        status = "active" if user['active'] else "inactive"
-        
-        # Initialize response
-        response = f"📋 Student Information for {user['username']}\n\n"
-        response += f"📧 Email: {user['email']}\n"
-        response += f"🎭 Role: {user['role']}\n"
-        response += f"📊 Status: {status}\n\n"
-
-        # Now fetch all sections for the user
-        cursor.execute(
-            """
-            SELECT section_name, section_data
-            FROM personal_information
-            WHERE user_id = %s
-            """,
-            (user_id,)
-        )
-        
-        sections_rows = cursor.fetchall()
-        sections_data = {}
-        
-        # Process each section
-        for row in sections_rows:
-            if row['section_data'] and row['section_name']:
-                try:
-                    if isinstance(row['section_data'], str):
-                        section_data = json.loads(row['section_data'])
-                    else:
-                        section_data = row['section_data']
-                    sections_data[row['section_name']] = section_data
-                except json.JSONDecodeError:
-                    continue
-
-        # Format profile section
-        if 'profile' in sections_data:
-            response += "👤 Profile\n"
-            profile = sections_data['profile']
-            if profile.get('phone'):
-                response += f"📱 Phone: {profile['phone']}\n"
-            if profile.get('institution'):
-                response += f"🏫 Institution: {profile['institution']}\n"
-            if profile.get('fullName'):
-                response += f"👤 Full Name: {profile['fullName']}\n"
-            if profile.get('age'):
-                response += f"🎂 Age: {profile['age']}\n"
-            if profile.get('fieldOfStudy'):
-                response += f"📚 Field of Study: {profile['fieldOfStudy']}\n"
-            if profile.get('yearOfStudy'):
-                response += f"📅 Year of Study: {profile['yearOfStudy']}\n"
-            if profile.get('linkedIn'):
-                response += f"💼 LinkedIn: {profile['linkedIn']}\n"
-            response += "\n"
-
-        # Format technical section
-        if 'technical' in sections_data:
-            response += "💻 Technical Skills\n"
-            tech = sections_data['technical']
-            if tech.get('technicalProficiency'):
-                response += f"• Technical Proficiency: {tech['technicalProficiency']}\n"
-            if 'cloudExperience' in tech:
-                response += f"• Cloud Experience: {'Yes' if tech['cloudExperience'] else 'No'}\n"
-            if 'vmExperience' in tech:
-                response += f"• VM Experience: {'Yes' if tech['vmExperience'] else 'No'}\n"
-            if tech.get('otherTechnicalSkills'):
-                response += f"• Other Skills: {tech['otherTechnicalSkills']}\n"
-            response += "\n"
-
-        # Format programming section
-        if 'programming' in sections_data:
-            response += "🚀 Programming\n"
-            prog = sections_data['programming']
-            if prog.get('languages'):
-                langs = prog['languages']
-                if isinstance(langs, dict):
-                    lang_list = []
-                    for lang, level in langs.items():
-                        if level and level.strip():  # Only include languages with a non-empty level
-                            lang_list.append(f"{lang}: {level}")
-                    if lang_list:
-                        response += f"• Languages: {', '.join(lang_list)}\n"
-            if prog.get('frameworks') and isinstance(prog['frameworks'], list) and prog['frameworks']:
-                response += f"• Frameworks: {', '.join(prog['frameworks'])}\n"
-            if prog.get('projectDescription'):
-                response += f"• Project Experience: {prog['projectDescription']}\n"
-            if prog.get('ides') and isinstance(prog['ides'], list) and prog['ides']:
-                response += f"• IDEs: {', '.join(prog['ides'])}\n"
-            if 'hasOpenSource' in prog:
-                response += f"• Open Source Contribution: {'Yes' if prog['hasOpenSource'] else 'No'}\n"
-            response += "\n"
-
-        # Format database section
-        if 'database' in sections_data:
-            response += "🗄️ Database Skills\n"
-            db = sections_data['database']
-            if db.get('databaseSystems') and isinstance(db['databaseSystems'], list) and db['databaseSystems']:
-                response += f"• Database Systems: {', '.join(db['databaseSystems'])}\n"
-            if db.get('apiTechnologies'):
-                response += f"• API Technologies: {db['apiTechnologies']}\n"
-            if db.get('otherDatabases'):
-                response += f"• Other Databases: {db['otherDatabases']}\n"
-            if 'hasBackendExperience' in db:
-                response += f"• Backend Experience: {'Yes' if db['hasBackendExperience'] else 'No'}\n"
-            response += "\n"
-
-        # Format AI section
-        if 'ai' in sections_data:
-            response += "🤖 AI & Emerging Tech\n"
-            ai = sections_data['ai']
-            if ai.get('aiExperience'):
-                response += f"• AI Experience Level: {ai['aiExperience']}\n"
-            if ai.get('tools') and isinstance(ai['tools'], list) and ai['tools']:
-                response += f"• AI Tools: {', '.join(ai['tools'])}\n"
-            if ai.get('otherTools'):
-                response += f"• Other AI Tools: {ai['otherTools']}\n"
-            if 'hasML' in ai:
-                response += f"• Machine Learning: {'Yes' if ai['hasML'] else 'No'}\n"
-            if 'hasAIModels' in ai:
-                response += f"• AI Model Development: {'Yes' if ai['hasAIModels'] else 'No'}\n"
-            response += "\n"
-
-        # Format collaboration section
-        if 'collaboration' in sections_data:
-            response += "👥 Collaboration\n"
-            collab = sections_data['collaboration']
-            if collab.get('collaborationRole'):
-                response += f"• Role: {collab['collaborationRole']}\n"
-            if collab.get('competitionExperience'):
-                response += f"• Competition Experience: {collab['competitionExperience']}\n"
-            if 'hasCompetitions' in collab:
-                response += f"• Competitions: {'Yes' if collab['hasCompetitions'] else 'No'}\n"
-            if collab.get('additionalInfo'):
-                response += f"• Additional Info: {collab['additionalInfo']}\n"
-            response += "\n"
-
-        return response.strip()
+        return user_profiles.cache.put(lookup, user, sections_rows).text
             
-    except Error as e:
+    except mysql_connector.Error as e:
         print(f"Error querying user information: {e}")
         return "Sorry, there was an error retrieving the user information."
     finally:
         if connection.is_connected():
-            cursor.close()
             connection.close()
 
-def chat_with_grok(user_input, lesson_id=None, chat_history=None):
+def answer_user_info(context):
+    """Router tier: user lookups straight from the database"""
+    return get_user_info(context.message)
+
+# Question words dropped from "which lesson covered X?" before searching for X
+_SEARCH_FILLER = {
+    "lesson", "lessons", "class", "classes", "unit", "units", "cover", "covers", "covered", "covering",
+    "learn", "learned", "learnt", "taught", "teach", "discuss", "discussed", "mention", "mentioned",
+    "talk", "talked", "explain", "explained", "find", "search", "topic", "topics", "did", "does",
+}
+
+def lesson_search_query(message):
+    """The topic part of a "which lesson covered X?" question, quoted phrases kept intact"""
+    phrases = re.findall(r'"[^"]+"', message)
+    rest = re.sub(r'"[^"]+"', ' ', message)
+    words = [
+        word for word in re.findall(r"[a-zA-Z0-9][\w\-']*\*?", rest)
+        if word.lower().rstrip('*') not in text_analysis.STOPWORDS and word.lower() not in _SEARCH_FILLER
+    ]
+    return " ".join(phrases + words)
+
+def answer_lesson_search(context):
+    """Router tier: "which lesson covered X?" answered from the full-text index"""
+    query = lesson_search_query(context.message)
+    if not query:
+        return None
+    results = search_index.index.search(query, limit=3, pages_per_lesson=1)['results']
+    if not results:
+        return None
+
+    response = f"🔎 Lessons covering \"{query}\"\n\n"
+    for i, result in enumerate(results):
+        page = result['pages'][0]
+        response += f"{i+1}. {result['title']} (page {page['page']})\n"
+        response += f"   {page['snippet']}\n"
+    return response.strip()
+
+def answer_summary(context):
+    """Router tier: the lesson's precomputed summary and key points"""
+    lesson = context.lesson
+    if not lesson or lesson.get('error') or not lesson.get('summary'):
+        return None
+
+    response = f"📘 Summary of {lesson.get('title', f'Lesson {context.lesson_id}')}\n\n"
+    response += lesson['summary'].replace('#', '').strip() + "\n"
+    if lesson.get('key_points'):
+        response += "\n🔑 Key Points\n"
+        for point in lesson['key_points']:
+            response += f"• {point.replace('#', '').strip()}\n"
+    return response.strip()
+
+def answer_qa(context):
+    """Router tier: a matching question from the lesson's QA pairs"""
+    lesson = context.lesson
+    if not lesson or lesson.get('error'):
+        return None
+    qa_pair = match_qa_pair(context.message, lesson.get('qaPairs') or lesson.get('qa_pairs') or [])
+    if not qa_pair:
+        return None
+    answer = qa_pair['answer'].replace('#', '').strip()
+    return '\n'.join(line.strip() for line in answer.split('\n') if line.strip())
+
+# Leading bullet glyphs (including PDF symbol-font ones in the private-use area), "o" sub-bullets and numbering
+_CONCEPT_BULLET = re.compile(r"^\s*(?:(?:[•\-\*\u25aa\u25cf\ue000-\uf8ff]|o(?=\s)|\d+[\.\)])\s*)+")
+
+def lesson_concepts(value):
+    """Key concepts as a list of phrases with real text, whether extracted as a list or as one block"""
+    lines = value if isinstance(value, list) else str(value or '').split('\n')
+    concepts = []
+    for line in lines:
+        cleaned = _CONCEPT_BULLET.sub('', str(line)).strip()
+        if re.search(r"\w", cleaned):
+            concepts.append(cleaned)
+    return concepts
+
+def answer_lesson_section(context):
+    """Router tier: objective and key concepts pulled from the lesson's extracted sections"""
+    lesson = context.lesson
+    if not lesson or lesson.get('error'):
+        return None
+    sections = lesson.get('sections') or {}
+    title = lesson.get('title', f'Lesson {context.lesson_id}')
+
+    if 'objective' in context.intents and sections.get('objective'):
+        return f"🎯 Objective of {title}\n\n{sections['objective']}"
+    concepts = lesson_concepts(sections.get('key_concepts')) if 'key_concepts' in context.intents else []
+    if concepts:
+        response = f"🔑 Key Concepts in {title}\n\n"
+        for i, concept in enumerate(concepts):
+            response += f"{i+1}. {concept}\n"
+        return response.strip()
+    return None
+
+def fallback_answer(lesson_id, lesson_data):
+    """What to say when Grok is down or timed out: whatever the lesson itself can tell the student"""
+    notice = "⚠️ The AI assistant is temporarily unavailable. Please try again in a moment."
+    if not lesson_data or lesson_data.get('error'):
+        return notice
+
+    title = lesson_data.get('title', f'Lesson {lesson_id}')
+    response = f"{notice}\n\nMeanwhile, here is what {title} covers:\n\n"
+    sections = lesson_data.get('sections') or {}
+    if lesson_data.get('summary'):
+        response += lesson_data['summary'].replace('#', '').strip() + "\n"
+    elif sections.get('objective'):
+        response += f"🎯 {sections['objective']}\n"
+    else:
+        response += (lesson_data.get('full_text') or '')[:600].strip() + "\n"
+    concepts = lesson_concepts(sections.get('key_concepts'))
+    if concepts:
+        response += "\n🔑 Key Concepts\n"
+        for concept in concepts:
+            response += f"• {concept}\n"
+    return response.strip()
+
+# Grok client with timeouts, retries and a circuit breaker
+grok = GrokClient()
+
+# Local answer tiers in front of Grok, cheapest first
+answer_router = AnswerRouter()
+answer_router.add_intent('user_info', r"^(?=.*\b(?:what|who|find|get|show))(?=.*\b(?:email|info|details|contact))")
+answer_router.add_intent('lesson_search', r"\bwhich\s+(?:lessons?|class(?:es)?|units?)\b|\bwhere\s+(?:did|do|can|was|were)\b(?=.*\b(?:learn|learned|learnt|cover(?:ed)?|taught|discuss(?:ed)?|mention(?:ed)?)\b)|\b(?:find|search)\b(?=.*\blessons?\b)")
+# Summary and objective only when asked about the lesson itself; "the goal of an agent" is a question for Grok
+_THIS_LESSON = r"(?:(?:this|the|today'?s|current)\s+)?(?:lesson|class|lecture)"
+answer_router.add_intent('summary', rf"\b(?:summary|overview|recap)\s+(?:of|for|in)\s+{_THIS_LESSON}\b|\b(?:summari[sz]e|recap)\s+{_THIS_LESSON}\b|\b(?:lesson|class|lecture)(?:'s)?\s+(?:summary|overview|recap)\b")
+answer_router.add_intent('objective', rf"\b(?:objectives?|goals?)\s+(?:of|for|in)\s+{_THIS_LESSON}\b|\b(?:lesson|class|lecture)(?:'s)?\s+(?:objectives?|goals?)\b")
+answer_router.add_intent('key_concepts', r"\bkey\s+(?:concepts?|points?|ideas?)\b|\bmain\s+topics?\b")
+answer_router.add_tier('user_info', answer_user_info, intents=['user_info'])
+answer_router.add_tier('lesson_search', answer_lesson_search, intents=['lesson_search'])
+answer_router.add_tier('summary', answer_summary, intents=['summary'])
+answer_router.add_tier('qa', answer_qa)
+answer_router.add_tier('lesson_section', answer_lesson_section, intents=['objective', 'key_concepts'])
+
+def chat_with_grok(user_input, lesson_id=None, chat_history=None, lesson_data=None):
     """Send a request to the Grok API and return the response"""
     try:
-        # Check if this is a user information query
-        user_info_keywords = ['email', 'information', 'info', 'details', 'contact']
-        is_user_query = any(keyword in user_input.lower() for keyword in user_info_keywords) and (
-            'what' in user_input.lower() or 
-            'who' in user_input.lower() or
-            'find' in user_input.lower() or
-            'get' in user_input.lower() or
-            'show' in user_input.lower()
-        )
-        
-        if is_user_query:
-            return get_user_info(user_input)
-            
         # Get X.AI API key
         api_key = os.getenv("XAI_API_KEY")
         if not api_key:
@@ -348,8 +352,9 @@ def chat_with_grok(user_input, lesson_id=None, chat_history=None):
         lesson_context = ""
         if lesson_id:
             try:
-                print(f"Getting content for lesson ID: {lesson_id}")
-                lesson_data = pdf_processor.getLessonContent(lesson_id)
+                if lesson_data is None:
+                    print(f"Getting content for lesson ID: {lesson_id}")
+                    lesson_data = pdf_processor.getLessonContent(lesson_id)
                 if lesson_data and lesson_data.get('content'):
                     lesson_context = f"""
 You are discussing lesson content about: {lesson_data.get('title', f'Lesson {lesson_id}')}
@@ -367,16 +372,9 @@ Please answer based on this lesson content.
             except Exception as e:
                 print(f"Error getting lesson content: {str(e)}")
                 
-        # API endpoint and headers
-        url = "https://api.x.ai/v1/chat/completions"
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        }
-        
         # Request payload with chat history
         data = {
-            "model": "grok-beta",
+            "model": Config.GROK_MODEL,
             "messages": messages,
             "max_tokens": 1000
         }
@@ -384,50 +382,310 @@ Please answer based on this lesson content.
         print("✅ Making request to Grok API...")
         print(f"Messages being sent: {json.dumps(messages, indent=2)}")
         
-        # Make the API call
-        response = requests.post(url, headers=headers, json=data)
-        
-        if response.status_code == 200:
+        try:
+            response = grok.complete(data, api_key)
             print("✅ Received response from Grok API")
-            response_data = response.json()
-            if response_data and "choices" in response_data and response_data["choices"]:
-                return response_data["choices"][0]["message"]["content"]
-        
-        error_msg = f"API Error: {response.status_code}"
-        if response.text:
-            try:
-                error_data = response.json()
-                if "error" in error_data:
-                    error_msg = f"API Error: {error_data['error'].get('message', 'Unknown error')}"
-            except:
-                error_msg = f"API Error: {response.text[:100]}"
-        
-        print(f"❌ {error_msg}")
-        return f"I apologize, but I encountered an error: {error_msg}"
+            return response
+        except CircuitOpenError:
+            print("⚠️ Grok circuit is open, answering from the lesson instead")
+            return fallback_answer(lesson_id, lesson_data)
+        except UpstreamError as e:
+            print(f"❌ {str(e)}")
+            if e.retryable:
+                return fallback_answer(lesson_id, lesson_data)
+            return f"I apologize, but I encountered an error: {str(e)}"
             
     except Exception as e:
         print(f"❌ Error in chat: {str(e)}")
         return f"I apologize, but I encountered an error: {str(e)}"
 
 # WebSocket connection manager
+class ClientConnection:
+    """State for one open websocket: a bounded outbound queue drained by its own sender task"""
+
+    def __init__(self, client_id: str, websocket: WebSocket, max_queue: int):
+        self.client_id = client_id
+        self.websocket = websocket
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.sender_task = None
+        self.connected_at = time.monotonic()
+        self.last_seen = self.connected_at
+        self.dropped = 0
+        self.closed = False
+
+    def touch(self):
+        self.last_seen = time.monotonic()
+
+
 class ConnectionManager:
-    def __init__(self):
+    def __init__(self, max_queue: int = None, overflow_policy: str = None,
+                 send_timeout: float = None, idle_timeout: float = None):
         self.active_connections = {}
+        self._by_socket = {}  # id(websocket) -> ClientConnection, so sends don't scan every client
+        self.max_queue = max_queue or Config.WS_SEND_QUEUE_SIZE
+        self.overflow_policy = overflow_policy or Config.WS_OVERFLOW_POLICY
+        self.send_timeout = send_timeout or Config.WS_SEND_TIMEOUT
+        self.idle_timeout = idle_timeout or Config.WS_IDLE_TIMEOUT
+        self._reaper_task = None
 
-    async def connect(self, websocket: WebSocket, client_id: str = None):
+    async def connect(self, websocket: WebSocket, client_id: str = None) -> ClientConnection:
+        """Accept the socket, register it and start its sender task"""
         await websocket.accept()
-        if client_id:
-            self.active_connections[client_id] = websocket
+        client_id = client_id or uuid.uuid4().hex
+        connection = ClientConnection(client_id, websocket, self.max_queue)
+        connection.sender_task = asyncio.create_task(self._sender(connection))
+        # A reconnect under the same id replaces the stale connection, which is closed
+        # so its handler stops reading; its cleanup then leaves the new one registered
+        stale = self.active_connections.get(client_id)
+        self.active_connections[client_id] = connection
+        self._by_socket[id(websocket)] = connection
+        if stale is not None:
+            print(f"Client {client_id} reconnected, closing its previous connection")
+            await self._close(stale, code=1000)
+        return connection
 
-    def disconnect(self, client_id: str = None):
-        if client_id and client_id in self.active_connections:
-            del self.active_connections[client_id]
+    def disconnect(self, connection: ClientConnection):
+        """Unregister a connection and stop its sender task. Safe to call more than once."""
+        if self.active_connections.get(connection.client_id) is connection:
+            del self.active_connections[connection.client_id]
+        if self._by_socket.get(id(connection.websocket)) is connection:
+            del self._by_socket[id(connection.websocket)]
+        connection.closed = True
+        if connection.sender_task and connection.sender_task is not asyncio.current_task():
+            connection.sender_task.cancel()
 
     async def send_message(self, message: str, websocket: WebSocket):
-        await websocket.send_text(message)
+        """Queue a message for delivery without waiting on the client"""
+        connection = self._find(websocket)
+        if connection is None:
+            # Not registered (e.g. already cleaned up), fall back to a direct send
+            await websocket.send_text(message)
+            return
+
+        try:
+            connection.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            connection.dropped += 1
+            if self.overflow_policy == "close":
+                print(f"❌ Client {connection.client_id} is not keeping up, closing connection")
+                await self._close(connection, code=1013)
+            else:
+                print(f"⚠️ Dropping message for slow client {connection.client_id} ({connection.dropped} dropped)")
+
+    async def start(self):
+        """Start the background task that evicts idle connections"""
+        if self._reaper_task is None:
+            self._reaper_task = asyncio.create_task(self._reap_idle())
+
+    async def stop(self):
+        if self._reaper_task:
+            self._reaper_task.cancel()
+            self._reaper_task = None
+        for connection in list(self.active_connections.values()):
+            await self._close(connection, code=1001)
+
+    def stats(self):
+        return {
+            "active_connections": len(self.active_connections),
+            "queued_messages": sum(c.queue.qsize() for c in self.active_connections.values()),
+            "dropped_messages": sum(c.dropped for c in self.active_connections.values()),
+        }
+
+    def _find(self, websocket: WebSocket):
+        return self._by_socket.get(id(websocket))
+
+    async def _sender(self, connection: ClientConnection):
+        try:
+            while True:
+                message = await connection.queue.get()
+                await asyncio.wait_for(connection.websocket.send_text(message), self.send_timeout)
+        except asyncio.CancelledError:
+            pass
+        except asyncio.TimeoutError:
+            print(f"❌ Send to client {connection.client_id} timed out, closing connection")
+            await self._close(connection, code=1013)
+        except Exception as e:
+            print(f"Error sending to client {connection.client_id}: {str(e)}")
+            self.disconnect(connection)
+
+    async def _close(self, connection: ClientConnection, code: int = 1000):
+        self.disconnect(connection)
+        try:
+            await connection.websocket.close(code=code)
+        except Exception:
+            pass
+
+    async def _reap_idle(self):
+        interval = max(1.0, min(self.idle_timeout / 4, Config.WS_PING_INTERVAL))
+        while True:
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            for connection in list(self.active_connections.values()):
+                if now - connection.last_seen > self.idle_timeout:
+                    print(f"Closing idle client {connection.client_id}")
+                    await self._close(connection, code=1001)
 
 manager = ConnectionManager()
 
+# Admission control for Grok-bound traffic: live chat first, then batch jobs
+llm_admission = AdmissionController(
+    max_concurrent=Config.LLM_MAX_CONCURRENCY,
+    max_queue=Config.LLM_MAX_QUEUE,
+    queue_timeout=Config.LLM_QUEUE_TIMEOUT,
+    classes=[
+        PriorityClass("interactive", weight=Config.LLM_INTERACTIVE_WEIGHT),
+        PriorityClass(
+            "background",
+            weight=Config.LLM_BACKGROUND_WEIGHT,
+            max_concurrent=Config.LLM_BACKGROUND_MAX_CONCURRENCY,
+            queue_timeout=Config.LLM_BACKGROUND_QUEUE_TIMEOUT,
+            preemptible=True
+        ),
+    ]
+)
+connection_rate_limiter = RateLimiter(Config.RATE_LIMIT_CONNECTION_RATE, Config.RATE_LIMIT_CONNECTION_BURST)
+user_rate_limiter = RateLimiter(Config.RATE_LIMIT_USER_RATE, Config.RATE_LIMIT_USER_BURST)
+
+def busy_message(retry_after):
+    """Error payload telling the client when it may try again"""
+    seconds = max(1, int(round(retry_after)))
+    return json.dumps({
+        "error": f"The assistant is busy right now, please retry in {seconds} s",
+        "busy": True,
+        "retryAfter": seconds
+    })
+
+@app.on_event("startup")
+async def start_connection_manager():
+    await manager.start()
+
+@app.on_event("startup")
+async def report_startup_time():
+    startup.mark("listening")
+    startup.print_report(Config.STARTUP_TARGET_SECONDS)
+
+@app.on_event("shutdown")
+async def stop_connection_manager():
+    await manager.stop()
+
+@app.on_event("shutdown")
+async def stop_executors():
+    executors.shutdown()
+
+async def run_chat_history_compaction():
+    """Periodically move old chat history into the archive table"""
+    while True:
+        try:
+            await executors.io.run(compact_chat_history)
+        except Exception as e:
+            print(f"Error in chat history compaction: {str(e)}")
+        await asyncio.sleep(Config.CHAT_HISTORY_COMPACTION_INTERVAL)
+
+# The event loop only keeps weak references to tasks; fire-and-forget ones are held here until done
+background_tasks = set()
+
+def spawn(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+# Course-wide topic and full-text indexes, kept current as lessons are extracted
+def index_lesson_topics(lesson):
+    # Only real lessons: a fallback PDF would file another lesson's text under this id
+    if not pdf_processor.is_recorded_lesson(lesson):
+        return
+    topic_index.index.add(lesson.id, lesson.title, lesson.full_text)
+    lesson.related_topics = topic_index.index.top_terms(lesson.id)
+
+def index_lesson_text(lesson):
+    if not pdf_processor.is_recorded_lesson(lesson):
+        return
+    search_index.index.add(lesson.id, lesson.title, lesson.full_text, lesson.page_offsets)
+
+pdf_processor.add_lesson_listener(index_lesson_topics)
+pdf_processor.add_lesson_listener(index_lesson_text)
+
+def index_all_lessons():
+    """Batch-index every lesson PDF; extraction results mostly come straight from the lesson store"""
+    documents = []
+    for entry in pdf_processor.get_lesson_files(Config.LESSON_INDEX_MAX_LESSONS):
+        lesson = process_pdf.extract_structured_content(entry['path'], entry['id'])
+        if not lesson.get('error') and lesson.full_text:
+            documents.append((lesson.id, lesson.title, lesson.full_text))
+            index_lesson_text(lesson)
+    added = topic_index.index.add_many(documents)
+    # Topics depend on the whole corpus, so refresh lessons that were cached before the batch
+    for lesson in pdf_processor.cached_lessons():
+        if lesson.id in topic_index.index:
+            lesson.related_topics = topic_index.index.top_terms(lesson.id)
+    print(f"Indexed {added} lessons for related-lesson lookups and search")
+
+def extract_upload(path, lesson_id):
+    """Extract an uploaded PDF and hand it to the lesson listeners (which index recorded lessons only)"""
+    lesson = process_pdf.extract_structured_content(path, lesson_id)
+    pdf_processor.notify_lesson_loaded(lesson)
+    return lesson
+
+warmup = Warmup(concurrency=Config.WARMUP_CONCURRENCY, timeout=Config.WARMUP_TIMEOUT)
+
+def warm_username_index():
+    connection = get_db_connection()
+    if connection is None:
+        raise RuntimeError("No database connection")
+    try:
+        user_search.get_username_trie(connection)
+    finally:
+        connection.close()
+
+def plan_warmup():
+    """Today's lessons, the username index, recent chat history and the lesson indexes"""
+    steps = [
+        ("username_index", warm_username_index),
+        ("chat_history", lambda: get_chat_history_page(limit=Config.WARMUP_HISTORY_ROWS)),
+    ]
+    for lesson_id in pdf_processor.get_scheduled_lesson_ids(Config.WARMUP_MAX_LESSONS):
+        steps.append((f"lesson:{lesson_id}", lambda lesson_id=lesson_id: pdf_processor.getLessonContent(lesson_id)))
+    if Config.LESSON_INDEX_ON_STARTUP:
+        steps.append(("lesson_indexes", index_all_lessons))
+    return steps
+
+def live_traffic_busy():
+    """True while chat requests are queueing for Grok or blocking work is queueing for threads"""
+    return llm_admission.waiting > 0 or executors.io.stats()["queued"] > 0
+
+prefetcher = LessonPrefetcher(
+    load=pdf_processor.getLessonContent,
+    neighbours=pdf_processor.get_adjacent_lesson_ids,
+    is_cached=pdf_processor.is_lesson_cached,
+    busy=live_traffic_busy,
+    concurrency=Config.PREFETCH_CONCURRENCY,
+    adjacent=Config.PREFETCH_ADJACENT,
+    max_delay=Config.PREFETCH_MAX_DELAY
+)
+
+def prune_lesson_store():
+    """Drop extraction results left behind by older extractor versions"""
+    try:
+        removed = lesson_store.prune_versions("document", process_pdf.EXTRACTOR_VERSION)
+        removed += lesson_store.prune_page_versions(process_pdf.EXTRACTOR_VERSION)
+        removed += lesson_store.prune_versions("summary", text_analysis.SUMMARIZER_VERSION)
+        if removed:
+            print(f"Removed {removed} outdated extraction results from the lesson store")
+    except Exception as e:
+        print(f"Error pruning lesson store: {str(e)}")
+
+@app.on_event("startup")
+async def start_warmup():
+    spawn(warmup.run(plan_warmup))
+    # In the background: it is the first thing to import process_pdf, which needn't delay listening
+    spawn(executors.io.run(prune_lesson_store))
+
+@app.on_event("startup")
+async def start_chat_history_compaction():
+    if Config.CHAT_HISTORY_RETENTION_DAYS > 0:
+        spawn(run_chat_history_compaction())
+
 # Database configuration
 DB_CONFIG = {
     'host': 'localhost',
@@ -452,7 +710,7 @@ def get_db_connection():
             'password': '***'  # Hide password in logs
         })
         
-        connection = mysql.connector.connect(**db_config)
+        connection = mysql_connector.connect(**db_config)
         
         if connection.is_connected():
             db_info = connection.get_server_info()
@@ -464,48 +722,26 @@ def get_db_connection():
             database_name = cursor.fetchone()[0]
             print(f"Connected to database: {database_name}")
             
-            # Test the chat_history table
-            try:
-                cursor.execute("SHOW TABLES LIKE 'chat_history'")
-                if cursor.fetchone():
-                    print("chat_history table exists")
-                    cursor.execute("DESCRIBE chat_history")
-                    columns = cursor.fetchall()
-                    print("chat_history table structure:")
-                    for column in columns:
-                        print(f"- {column[0]}: {column[1]}")
-                else:
-                    print("chat_history table does not exist!")
-                    # Create the table if it doesn't exist
-                    cursor.execute("""
-                        CREATE TABLE IF NOT EXISTS chat_history (
-                            id INT AUTO_INCREMENT PRIMARY KEY,
-                            message TEXT NOT NULL,
-                            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                        )
-                    """)
-                    connection.commit()
-                    print("Created chat_history table")
-            except Error as e:
-                print(f"Error checking chat_history table: {e}")
-            
             cursor.close()
+
+            # Create chat_history, its archive and indexes on first use
+            chat_history.ensure_schema(connection)
             return connection
         else:
             print("Failed to establish database connection")
             return None
             
-    except Error as e:
+    except mysql_connector.Error as e:
         print(f"Error connecting to MySQL database: {e}")
         if 'connection' in locals() and connection.is_connected():
             connection.close()
         return None
 
-def save_chat_message(message):
-    """Save a chat message without user ID"""
+def save_chat_message(message, session_id=None, user_id=None, lesson_id=None):
+    """Save a chat message to its conversation session. Returns the new row's id, or None."""
     if not message or not message.strip():
         print("Empty message provided, cannot save")
-        return False
+        return None
     
     print(f"Attempting to save message")
     print(f"Message content (first 100 chars): {message[:100]}")
@@ -513,82 +749,104 @@ def save_chat_message(message):
     connection = get_db_connection()
     if connection is None:
         print("Failed to establish database connection in save_chat_message")
-        return False
+        return None
     
-    cursor = None
     try:
-        cursor = connection.cursor()
-            
-        # Insert the message
+        # Insert the message; a committed insert with an id is confirmation enough
         print(f"Inserting message into chat_history")
-        cursor.execute(
-            """
-            INSERT INTO chat_history (message) 
-            VALUES (%s)
-            """,
-            (message,)
-        )
-        connection.commit()
-        
-        # Verify the insertion
-        last_id = cursor.lastrowid
-        print(f"Message saved successfully. Message ID: {last_id}, Affected rows: {cursor.rowcount}")
-        
-        # Double check the insertion
-        cursor.execute("""
-            SELECT * FROM chat_history
-            WHERE id = %s
-        """, (last_id,))
-        saved_message = cursor.fetchone()
-        if saved_message:
-            print("Message verified in database")
-            return True
-        else:
-            print("Warning: Message not found after insertion")
-            return False
+        last_id = chat_history.save_message(connection, message, session_id, user_id, lesson_id)
+        print(f"Message saved successfully. Message ID: {last_id}")
+        return last_id or None
             
-    except Error as e:
+    except mysql_connector.Error as e:
         print(f"Error saving chat message: {e}")
         if connection.is_connected():
             print("Rolling back transaction")
             connection.rollback()
-        return False
+        return None
     except Exception as e:
         print(f"Unexpected error in save_chat_message: {e}")
         if connection.is_connected():
             print("Rolling back transaction")
             connection.rollback()
-        return False
+        return None
     finally:
-        if cursor:
-            cursor.close()
         if connection.is_connected():
             connection.close()
             print("Database connection closed in save_chat_message")
 
+async def persist_reply(websocket, turn_id, response, session_id, user_id, lesson_id, confirm=False):
+    """Save an AI reply after it was sent; with `confirm`, tell the client whether it was stored"""
+    print("\n=== Saving AI response ===")
+    try:
+        saved = bool(await executors.io.run(save_chat_message, f"AI: {response}", session_id, user_id, lesson_id))
+    except Exception as e:
+        print(f"Error saving AI response: {str(e)}")
+        saved = False
+    if not saved:
+        print("Warning: Failed to save AI response")
+    if confirm:
+        try:
+            await manager.send_message(
+                json.dumps({"type": "saved", "turnId": turn_id, "sessionId": session_id, "savedToHistory": saved}),
+                websocket
+            )
+        except Exception:
+            print("Client left before the save confirmation")
+    return saved
+
 # WebSocket endpoint for chat
 @app.websocket("/grok")
 async def chat_endpoint(websocket: WebSocket):
     print("\n=== New WebSocket connection attempt ===")
-    await manager.connect(websocket)
-    print("WebSocket connection established")
+    connection = await manager.connect(websocket, websocket.query_params.get('clientId'))
+    client_id = connection.client_id
+    print(f"WebSocket connection established for client {client_id}")
+    pending_save = None
+    # Only a verified login token names the user; a bare userId in a message is never trusted
+    authenticated_user = auth.token_user_id(websocket.query_params.get('token'))
+    # Warm the lesson (and its neighbours) before the first question; no-op for lessons seen recently
+    if Config.PREFETCH_ENABLED:
+        prefetcher.schedule(websocket.query_params.get('lessonId'))
     
     try:
         while True:
             try:
                 # Receive message
                 data = await websocket.receive_text()
+                connection.touch()
                 print("\n=== New message received ===")
                 print(f"Raw WebSocket data received: {data}")
                 
                 # Parse the JSON data
                 try:
                     json_data = json.loads(data)
+
+                    # Application-level heartbeat for clients that can't rely on protocol pings
+                    if json_data.get('type') == 'ping':
+                        await manager.send_message(json.dumps({"type": "pong"}), websocket)
+                        continue
+                    if json_data.get('type') == 'pong':
+                        continue
+
                     lesson_id = json_data.get('lessonId')
                     user_input = json_data.get('message')
+                    if Config.PREFETCH_ENABLED:
+                        # This message loads the lesson itself; only its neighbours are prefetched
+                        prefetcher.schedule(lesson_id, include_current=False)
+                    if 'token' in json_data:
+                        authenticated_user = auth.token_user_id(json_data.get('token'))
+                    user_id = authenticated_user
+                    if json_data.get('userId') is not None and str(json_data['userId']) != str(user_id):
+                        print(f"⚠️ Ignoring unverified userId {json_data['userId']} from client {client_id}")
+                    session_id = chat_history.session_key(
+                        json_data.get('sessionId') or websocket.query_params.get('sessionId'),
+                        user_id, lesson_id, client_id
+                    )
                     
                     print("\nParsed message data:")
                     print(f"- Lesson ID: {lesson_id}")
+                    print(f"- Session ID: {session_id}")
                     print(f"- Message: {user_input}")
                     
                     if not user_input:
@@ -609,42 +867,77 @@ async def chat_endpoint(websocket: WebSocket):
                     )
                     continue
                 
-                # Save user message and get chat history
+                # Per-connection and per-user rate limits
+                retry_after = max(
+                    connection_rate_limiter.check(client_id),
+                    user_rate_limiter.check(str(user_id) if user_id else None)
+                )
+                if retry_after:
+                    print(f"Rate limited client {client_id}, retry in {retry_after:.1f}s")
+                    await manager.send_message(busy_message(retry_after), websocket)
+                    continue
+
+                # Independent stages run concurrently: saving the question, reading history
+                # and routing, which loads the lesson
                 print("\n=== Processing message ===")
-                
-                print("Saving user message...")
-                save_success = save_chat_message(user_input)
-                if not save_success:
+                if pending_save is not None:
+                    # Keep the stored conversation in order: the previous reply lands before this question
+                    await pending_save
+                saved_id, history, route = await asyncio.gather(
+                    executors.io.run(save_chat_message, user_input, session_id, user_id, lesson_id),
+                    executors.io.run(get_chat_history, session_id),
+                    executors.io.run(answer_router.resolve, user_input, lesson_id, pdf_processor.getLessonContent)
+                )
+                if not saved_id:
                     print("Warning: Failed to save user message")
-                
-                print("Retrieving chat history...")
-                chat_history = get_chat_history()
-                history_count = len(chat_history) if chat_history else 0
-                print(f"Retrieved {history_count} messages from chat history")
+                # The read may or may not see the question saved alongside it; chat_with_grok adds it itself.
+                # Only that row is dropped: an earlier identical question is real history
+                if saved_id:
+                    history = [msg for msg in history if msg.get('id') != saved_id]
                 
                 print("\n=== Getting AI response ===")
-                print("Calling Grok API...")
-                response = chat_with_grok(user_input, lesson_id, chat_history)
-                print(f"Grok API response received (first 100 chars): {response[:100]}...")
-                
-                # Save AI response
-                print("\n=== Saving AI response ===")
-                ai_save_success = save_chat_message(f"AI: {response}")
-                if not ai_save_success:
-                    print("Warning: Failed to save AI response")
+                if route.answered:
+                    print(f"Answered locally by the '{route.tier}' tier")
+                    response = route.answer
+                else:
+                    lesson_data = route.context.lesson if route.context.lesson_loaded else None
+                    try:
+                        async with llm_admission.admit("interactive"):
+                            print("Calling Grok API...")
+                            started = time.perf_counter()
+                            response = await executors.llm.run(
+                                chat_with_grok, user_input, lesson_id, history, lesson_data
+                            )
+                            answer_router.record_llm(time.perf_counter() - started)
+                    except AdmissionRejected as e:
+                        print(f"Rejected Grok call ({e.reason}), retry in {e.retry_after}s")
+                        await manager.send_message(busy_message(e.retry_after), websocket)
+                        continue
+                print(f"Response ready from {route.tier} (first 100 chars): {response[:100]}...")
                 
-                # Send response back to client
+                # Send response back to client first; the reply is saved off the critical path
                 print("\n=== Sending response to client ===")
+                turn_id = uuid.uuid4().hex
                 await manager.send_message(
                     json.dumps({
                         "response": response,
                         "lessonId": lesson_id,
-                        "savedToHistory": ai_save_success
+                        "sessionId": session_id,
+                        "source": route.tier,
+                        "turnId": turn_id,
+                        "savedToHistory": None
                     }),
                     websocket
                 )
                 print("Response sent successfully")
                 
+                pending_save = spawn(persist_reply(
+                    websocket, turn_id, response, session_id, user_id, lesson_id,
+                    confirm=bool(json_data.get('confirmSave'))
+                ))
+                
+            except WebSocketDisconnect:
+                raise
             except json.JSONDecodeError as e:
                 print(f"\n=== JSON Error ===")
                 print(f"JSON decode error in main loop: {str(e)}")
@@ -662,7 +955,6 @@ async def chat_endpoint(websocket: WebSocket):
                 
     except WebSocketDisconnect:
         print("\n=== WebSocket Disconnected ===")
-        manager.disconnect()
     except Exception as e:
         print(f"\n=== WebSocket Error ===")
         print(f"WebSocket error: {str(e)}")
@@ -673,6 +965,10 @@ async def chat_endpoint(websocket: WebSocket):
             )
         except:
             print("Failed to send error message to client")
+    finally:
+        manager.disconnect(connection)
+        if client_id not in manager.active_connections:
+            connection_rate_limiter.forget(client_id)
 
 # Add a health check endpoint
 @app.get("/health")
@@ -680,11 +976,163 @@ async def health_check():
     """Health check endpoint"""
     return {"status": "healthy"}
 
+# Background extraction of uploaded PDFs
+pdf_jobs = pdf_uploads.ExtractionJobs()
+
+@app.post("/api/pdf/extract")
+async def upload_pdf(request: Request, lessonId: str = None):
+    """
+    Upload a PDF and extract it in the background.
+    Send the PDF as the raw request body (streamed straight to disk) or as a multipart `file` field.
+    """
+    content_type = request.headers.get('content-type', '')
+    try:
+        if content_type.startswith('multipart/form-data'):
+            chunks = pdf_uploads.multipart_file_chunks(request.stream(), content_type)
+        else:
+            chunks = request.stream()
+        saved = await pdf_uploads.save_stream(chunks)
+    except pdf_uploads.UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+    pdf_id = saved['pdf_id']
+    print(f"✅ Stored uploaded PDF {pdf_id} ({saved['size']} bytes)")
+    job = pdf_jobs.schedule(pdf_id, saved['path'], extract_upload, lessonId)
+    return JSONResponse(
+        status_code=202,
+        content={
+            "pdf_id": pdf_id,
+            "size": saved['size'],
+            "status": job['status'],
+            "content_url": f"/api/pdf/content/{pdf_id}"
+        }
+    )
+
+@app.get("/api/pdf/content/{pdf_id}")
+async def get_pdf_content(pdf_id: str):
+    """Extracted content of an uploaded PDF, or 202 while extraction is still running"""
+    if not pdf_uploads.is_valid_pdf_id(pdf_id):
+        raise HTTPException(status_code=404, detail="PDF not found")
+
+    job = pdf_jobs.get(pdf_id)
+    if job is None:
+        # Known file but no job in memory (e.g. after a restart): extract it again
+        path = pdf_uploads.pdf_path_for(pdf_id)
+        if not os.path.exists(path):
+            raise HTTPException(status_code=404, detail="PDF not found")
+        job = pdf_jobs.schedule(pdf_id, path, extract_upload)
+
+    if job['status'] == 'ready':
+        return {"pdf_id": pdf_id, "status": "ready", "content": job['result'].to_dict(include_content=True)}
+    if job['status'] == 'error':
+        return JSONResponse(status_code=422, content={"pdf_id": pdf_id, "status": "error", "error": job.get('error')})
+    return JSONResponse(
+        status_code=202,
+        content={"pdf_id": pdf_id, "status": job['status']},
+        headers={"Retry-After": "2"}
+    )
+
+@app.get("/api/lessons/{lesson_id}/related")
+async def related_lessons(lesson_id: str, limit: int = 5):
+    """Lessons with the most similar content (TF-IDF cosine similarity across the course)"""
+    limit = max(1, min(limit, 20))
+    if lesson_id not in topic_index.index:
+        if not await executors.io.run(pdf_processor.get_recorded_pdf_path, lesson_id):
+            raise HTTPException(status_code=404, detail="Lesson not found")
+        lesson = await executors.io.run(pdf_processor.getLessonContent, lesson_id)
+        if lesson.get('error'):
+            raise HTTPException(status_code=404, detail="Lesson has no extracted content")
+        if lesson_id not in topic_index.index:
+            await executors.io.run(index_lesson_topics, lesson)
+        if lesson_id not in topic_index.index:
+            raise HTTPException(status_code=404, detail="Lesson has no extracted content")
+
+    related = await executors.io.run(topic_index.index.related, lesson_id, limit)
+    return {
+        "lesson_id": lesson_id,
+        "topics": topic_index.index.top_terms(lesson_id),
+        "related": related
+    }
+
+@app.api_route("/api/lessons/{lesson_id}/pdf", methods=["GET", "HEAD"])
+async def lesson_pdf(lesson_id: str, request: Request):
+    """The lesson's PDF, with Range support so viewers can render page one before the rest arrives"""
+    path = await executors.io.run(pdf_processor.get_recorded_pdf_path, lesson_id)
+    if not path:
+        raise HTTPException(status_code=404, detail="Lesson PDF not found")
+    try:
+        return await pdf_serving.serve_pdf(request, path)
+    except FileNotFoundError:
+        pdf_processor.invalidate_lesson_cache(lesson_id)
+        raise HTTPException(status_code=404, detail="Lesson PDF not found")
+
+@app.get("/api/search")
+async def search_lessons(q: str, limit: int = 10):
+    """Full-text search across every indexed lesson: words, "exact phrases" and prefix* terms"""
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="Query must not be empty")
+    limit = max(1, min(limit, 50))
+    return await executors.io.run(search_index.index.search, q, limit)
+
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe: OK only once startup warmup has finished"""
+    if warmup.ready:
+        return {"status": "ready", "warmup": warmup.stats()}
+    return JSONResponse(status_code=503, content={"status": "warming", "warmup": warmup.stats()})
+
+@app.get("/chat-history")
+async def read_chat_history(request: Request, session_id: str, before: int = None, limit: int = None):
+    """
+    Page through one of the caller's chat sessions, newest first. Pass next_before back as
+    `before` for older messages. Only messages saved under the token's user are returned,
+    whatever session id is asked for.
+    """
+    user_id = auth.require_user_id(request)
+    limit = min(limit or Config.CHAT_HISTORY_PAGE_SIZE, 100)
+    messages, next_before = await executors.io.run(get_chat_history_page, before, limit, session_id, user_id)
+    return {
+        "messages": [
+            {**msg, "timestamp": str(msg['timestamp']) if msg.get('timestamp') else None}
+            for msg in messages
+        ],
+        "next_before": next_before
+    }
+
+@app.get("/metrics")
+async def metrics():
+    """Runtime counters for capacity planning"""
+    return {
+        "connections": manager.stats(),
+        "llm_admission": llm_admission.stats(),
+        "llm_upstream": grok.stats(),
+        "executors": executors.get_stats(),
+        "topic_index": topic_index.index.get_stats(),
+        "search_index": search_index.index.get_stats(),
+        "answer_router": answer_router.stats(),
+        "pdf_extraction": pdf_jobs.stats(),
+        "lesson_store": lesson_store.get_stats(),
+        "lesson_cache": pdf_processor.lesson_cache_stats(),
+        "profile_cache": user_profiles.cache.stats(),
+        "warmup": warmup.stats(),
+        "prefetch": prefetcher.stats(),
+        "startup": startup.report(Config.STARTUP_TARGET_SECONDS),
+        "rate_limits": {
+            "connection": connection_rate_limiter.stats(),
+            "user": user_rate_limiter.stats()
+        }
+    }
+
 @app.get("/lesson-check/{lesson_id}")
-async def check_lesson_pdf(lesson_id: str):
+async def check_lesson_pdf(lesson_id: str, request: Request):
     """
     Diagnostic endpoint to check if a specific lesson has a valid PDF in the database
     """
+    report = await executors.io.run(lesson_check_report, lesson_id)
+    return http_caching.cached_json(request, report)
+
+def lesson_check_report(lesson_id: str):
+    """Database record and file details for one lesson's PDF (blocking; runs in the io pool)"""
     try:
         import pdf_processor
         import pymysql
@@ -764,7 +1212,9 @@ if __name__ == "__main__":
     import uvicorn
     
     # Validate configuration before starting the server
-    if not Config.validate_config():
+    with startup.step("validate config"):
+        config_valid = Config.validate_config()
+    if not config_valid:
         print("Error: Invalid configuration. Please check your environment variables.")
         exit(1)
     
@@ -777,5 +1227,7 @@ if __name__ == "__main__":
         app,
         host="0.0.0.0",
         port=port,
-        log_level="info"
+        log_level="info",
+        ws_ping_interval=Config.WS_PING_INTERVAL,
+        ws_ping_timeout=Config.WS_PING_TIMEOUT
     ) 
\ No newline at end of file
@@ -1,19 +1,31 @@
 import os
 import json
 import glob
+import time
 import string
+import threading
+from collections import OrderedDict
+import importlib.util
 from typing import Dict, Any, List, Optional
-import fitz  # PyMuPDF
 import re
-import pymysql
 from config import Config
+import startup
+import executors
+from lesson_model import Lesson
 
-# Try to import our new module - if it fails, we'll use the basic extraction
-try:
-    import process_pdf as pdf_extractor
-    HAS_ADVANCED_EXTRACTOR = True
-except ImportError:
-    HAS_ADVANCED_EXTRACTOR = False
+fitz = startup.lazy_import("fitz")  # PyMuPDF
+pymysql = startup.lazy_import("pymysql")
+
+# Use our advanced extractor if it is available - otherwise we'll use the basic extraction.
+# It is only imported on first use.
+HAS_ADVANCED_EXTRACTOR = importlib.util.find_spec("process_pdf") is not None
+pdf_extractor = startup.lazy_import("process_pdf")
+
+# In-memory LRU of processed lessons: lesson_id -> (expires_at, lesson_data)
+_lesson_cache = OrderedDict()
+_lesson_cache_lock = threading.Lock()
+# lesson_id -> (expires_at, path) of the PDF recorded in the lessons table
+_pdf_path_cache: Dict[str, Any] = {}
 
 def get_db_connection():
     """
@@ -32,10 +44,28 @@ def get_db_connection():
         print(f"Error connecting to database: {str(e)}")
         return None
 
-def get_lesson_pdf_path(lesson_id: str) -> Optional[str]:
+def resolve_file_path(file_path: str) -> str:
+    """Turn a lessons.file_path value (absolute, 'downloads/x.pdf' or a bare filename) into a full path"""
+    if os.path.isabs(file_path):
+        return file_path
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    # Check if the path already starts with 'downloads/'
+    if file_path.startswith('downloads/'):
+        return os.path.join(base_dir, file_path)
+    # If not, add the downloads directory
+    return os.path.join(base_dir, 'downloads', file_path)
+
+def get_recorded_pdf_path(lesson_id: str) -> Optional[str]:
     """
-    Get the PDF file path for a lesson from the database or downloads directory
+    The PDF the lessons table records for a lesson, if it exists on disk. Remembered for
+    LESSON_CACHE_TTL seconds, since PDF viewers ask once per byte range.
     """
+    lesson_id = str(lesson_id)
+    with _lesson_cache_lock:
+        cached = _pdf_path_cache.get(lesson_id)
+    if cached and cached[0] > time.monotonic() and os.path.exists(cached[1]):
+        return cached[1]
+
     connection = get_db_connection()
     if not connection:
         return None
@@ -46,62 +76,224 @@ def get_lesson_pdf_path(lesson_id: str) -> Optional[str]:
             sql = "SELECT file_path FROM lessons WHERE id = %s"
             cursor.execute(sql, (lesson_id,))
             result = cursor.fetchone()
-            
-            # Get the downloads directory path
-            downloads_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'downloads')
-            
-            if result and result.get('file_path'):
-                file_path = result.get('file_path')
-                print(f"Found file_path in database for lesson {lesson_id}: {file_path}")
-                
-                # If file_path is just a filename or relative path, convert to full path
-                if not os.path.isabs(file_path):
-                    # Check if the path already starts with 'downloads/'
-                    if file_path.startswith('downloads/'):
-                        # Just join with the base directory
-                        absolute_file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), file_path)
-                    else:
-                        # If not, add the downloads directory
-                        absolute_file_path = os.path.join(downloads_dir, file_path)
-                    
-                    file_path = absolute_file_path
-                    print(f"Resolved to absolute path: {file_path}")
-                
-                # Verify the file exists
-                if os.path.exists(file_path):
-                    print(f"✅ PDF file found at path: {file_path}")
-                    return file_path
-                else:
-                    print(f"❌ PDF file NOT found at path: {file_path}")
-            
-            # If no file found in database or file doesn't exist, try to find it in downloads
-            print(f"Searching for PDF in downloads directory: {downloads_dir}")
-            
-            # Get all PDF files in the downloads directory
-            pdf_files = glob.glob(os.path.join(downloads_dir, '*.pdf'))
-            
-            if not pdf_files:
-                print("❌ No PDF files found in downloads directory")
-                return None
-            
-            # Try to find the most recent PDF file
-            latest_pdf = max(pdf_files, key=os.path.getctime)
-            print(f"✅ Found latest PDF file: {latest_pdf}")
-            return latest_pdf
-            
     except Exception as e:
         print(f"❌ Database error: {str(e)}")
         return None
     finally:
         connection.close()
 
-def getLessonContent(lesson_id: str) -> Dict[str, Any]:
+    if not result or not result.get('file_path'):
+        return None
+    print(f"Found file_path in database for lesson {lesson_id}: {result['file_path']}")
+    file_path = resolve_file_path(result['file_path'])
+    
+    # Verify the file exists
+    if not os.path.exists(file_path):
+        print(f"❌ PDF file NOT found at path: {file_path}")
+        return None
+    print(f"✅ PDF file found at path: {file_path}")
+    with _lesson_cache_lock:
+        _pdf_path_cache[lesson_id] = (time.monotonic() + Config.LESSON_CACHE_TTL, file_path)
+    return file_path
+
+def is_recorded_lesson(lesson: Lesson) -> bool:
+    """
+    True if a lesson was extracted from the PDF its lessons row records, rather than
+    from a downloads-directory guess or an upload under an arbitrary id
+    """
+    if not lesson.pdf_path:
+        return False
+    recorded = get_recorded_pdf_path(lesson.id)
+    return bool(recorded) and os.path.abspath(recorded) == os.path.abspath(lesson.pdf_path)
+
+def get_lesson_pdf_path(lesson_id: str) -> Optional[str]:
+    """
+    Get the PDF file path for a lesson from the database or downloads directory
+    """
+    file_path = get_recorded_pdf_path(lesson_id)
+    if file_path:
+        return file_path
+    
+    # If no file found in database or file doesn't exist, try to find it in downloads
+    downloads_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'downloads')
+    print(f"Searching for PDF in downloads directory: {downloads_dir}")
+    
+    # Get all PDF files in the downloads directory
+    pdf_files = glob.glob(os.path.join(downloads_dir, '*.pdf'))
+    
+    if not pdf_files:
+        print("❌ No PDF files found in downloads directory")
+        return None
+    
+    # Try to find the most recent PDF file
+    latest_pdf = max(pdf_files, key=os.path.getctime)
+    print(f"✅ Found latest PDF file: {latest_pdf}")
+    return latest_pdf
+
+def get_scheduled_lesson_ids(limit: int = 20) -> List[str]:
+    """
+    Lessons scheduled for today: anything with a lesson_time today, plus untimed lessons on
+    today's weekday (day_id) in their course's current week. Weeks carry no dates, so a
+    course's current week is the one its timed lessons place in this calendar week; courses
+    with no timed lesson this week contribute only their timed lessons.
+    """
+    connection = get_db_connection()
+    if not connection:
+        return []
+
+    try:
+        with connection.cursor() as cursor:
+            sql = """
+                SELECT l.id
+                FROM lessons l
+                LEFT JOIN days d ON d.id = l.day_id
+                WHERE (l.lesson_time >= CURDATE() AND l.lesson_time < CURDATE() + INTERVAL 1 DAY)
+                   OR (l.lesson_time IS NULL AND d.day_name = DAYNAME(CURDATE())
+                       AND (l.course_id, l.week_id) IN (
+                           SELECT DISTINCT course_id, week_id
+                           FROM lessons
+                           WHERE lesson_time >= CURDATE() - INTERVAL WEEKDAY(CURDATE()) DAY
+                             AND lesson_time < CURDATE() - INTERVAL WEEKDAY(CURDATE()) DAY + INTERVAL 7 DAY
+                       ))
+                ORDER BY l.lesson_time IS NULL, l.lesson_time, l.week_id, l.id
+                LIMIT %s
+            """
+            cursor.execute(sql, (limit,))
+            return [str(row['id']) for row in cursor.fetchall()]
+    except Exception as e:
+        print(f"❌ Error loading today's lessons: {str(e)}")
+        return []
+    finally:
+        connection.close()
+
+def get_adjacent_lesson_ids(lesson_id: str, count: int = 1) -> List[str]:
     """
-    Get lesson content for a given lesson ID
+    The lessons just before and after this one in its course's schedule (week, day, time),
+    nearest first, next before previous
     """
-    return process_pdf(lesson_id)
+    connection = get_db_connection()
+    if not connection:
+        return []
 
-def process_pdf(lesson_id: str) -> Dict[str, Any]:
+    try:
+        with connection.cursor() as cursor:
+            sql = """
+                SELECT l.id
+                FROM lessons l
+                JOIN lessons current ON current.course_id = l.course_id
+                WHERE current.id = %s
+                ORDER BY l.week_id, l.day_id, l.lesson_time IS NULL, l.lesson_time, l.id
+            """
+            cursor.execute(sql, (lesson_id,))
+            ids = [str(row['id']) for row in cursor.fetchall()]
+    except Exception as e:
+        print(f"❌ Error loading lessons around {lesson_id}: {str(e)}")
+        return []
+    finally:
+        connection.close()
+
+    if str(lesson_id) not in ids:
+        return []
+    position = ids.index(str(lesson_id))
+    adjacent = []
+    for distance in range(1, count + 1):
+        if position + distance < len(ids):
+            adjacent.append(ids[position + distance])
+        if position - distance >= 0:
+            adjacent.append(ids[position - distance])
+    return adjacent
+
+def get_lesson_files(limit: int = 1000) -> List[Dict[str, str]]:
+    """Every lesson whose file_path points at an existing PDF, without the downloads-directory guesswork"""
+    connection = get_db_connection()
+    if not connection:
+        return []
+
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT id, lesson_name, file_path FROM lessons WHERE file_path <> '' ORDER BY id LIMIT %s",
+                (limit,)
+            )
+            lessons = []
+            for row in cursor.fetchall():
+                path = resolve_file_path(row['file_path'])
+                if os.path.exists(path):
+                    lessons.append({"id": str(row['id']), "name": row['lesson_name'], "path": path})
+            return lessons
+    except Exception as e:
+        print(f"❌ Error listing lesson files: {str(e)}")
+        return []
+    finally:
+        connection.close()
+
+# Called with every freshly processed lesson, e.g. to keep search and topic indexes current
+_lesson_listeners = []
+
+def add_lesson_listener(listener):
+    _lesson_listeners.append(listener)
+
+def notify_lesson_loaded(lesson: Lesson):
+    if not lesson or lesson.get('error') or not lesson.get('full_text'):
+        return
+    for listener in _lesson_listeners:
+        try:
+            listener(lesson)
+        except Exception as e:
+            print(f"⚠️ Lesson listener failed for lesson {lesson.id}: {str(e)}")
+
+def is_lesson_cached(lesson_id: str) -> bool:
+    with _lesson_cache_lock:
+        cached = _lesson_cache.get(str(lesson_id))
+        return bool(cached) and cached[0] > time.monotonic()
+
+def cached_lessons() -> List[Lesson]:
+    with _lesson_cache_lock:
+        return [entry[1] for entry in _lesson_cache.values()]
+
+def getLessonContent(lesson_id: str) -> Lesson:
+    """
+    Get lesson content for a given lesson ID, served from the lesson cache when possible
+    """
+    lesson_id = str(lesson_id)
+    with _lesson_cache_lock:
+        cached = _lesson_cache.get(lesson_id)
+        if cached and cached[0] > time.monotonic():
+            _lesson_cache.move_to_end(lesson_id)
+            return cached[1]
+
+    lesson_data = process_pdf(lesson_id)
+    notify_lesson_loaded(lesson_data)
+
+    # Only successful extractions are cached so a missing PDF is picked up once uploaded
+    if lesson_data.get('has_pdf') and not lesson_data.get('error'):
+        with _lesson_cache_lock:
+            _lesson_cache[lesson_id] = (time.monotonic() + Config.LESSON_CACHE_TTL, lesson_data)
+            _lesson_cache.move_to_end(lesson_id)
+            while len(_lesson_cache) > Config.LESSON_CACHE_SIZE:
+                _lesson_cache.popitem(last=False)
+    return lesson_data
+
+def lesson_cache_stats() -> Dict[str, Any]:
+    """How many lessons are cached and roughly how much memory they hold"""
+    with _lesson_cache_lock:
+        lessons = [entry[1] for entry in _lesson_cache.values()]
+    return {
+        "lessons": len(lessons),
+        "approx_bytes": sum(lesson.approx_size() for lesson in lessons)
+    }
+
+def invalidate_lesson_cache(lesson_id: Optional[str] = None):
+    """Drop one lesson (or every lesson) from the lesson cache"""
+    with _lesson_cache_lock:
+        if lesson_id is None:
+            _lesson_cache.clear()
+            _pdf_path_cache.clear()
+        else:
+            _lesson_cache.pop(str(lesson_id), None)
+            _pdf_path_cache.pop(str(lesson_id), None)
+
+def process_pdf(lesson_id: str) -> Lesson:
     """
     Process a PDF file and return its content
     First attempts to get the file path from the database
@@ -156,7 +348,7 @@ def process_pdf(lesson_id: str) -> Dict[str, Any]:
                 # Fall back to basic extraction
         
         # Basic extraction as fallback
-        pdf_content = extract_text_from_pdf(pdf_path)
+        pdf_content = executors.parse_pdf(extract_text_from_pdf, pdf_path)
         
         # Extract filename from path for better title
         file_name = os.path.basename(pdf_path)
@@ -176,17 +368,15 @@ def process_pdf(lesson_id: str) -> Dict[str, Any]:
         
         # If we have PDF content, use it to create a lesson entry
         if pdf_content:
-            # Try to structure the content a bit
-            structured_content = structure_basic_content(pdf_content, lesson_id, title)
-            
-            return {
-                'id': lesson_id,
-                'title': title,
-                'content': structured_content,
-                'raw_content': pdf_content,
-                'pdf_path': pdf_path,
-                'has_pdf': True
-            }
+            # Try to structure the content a bit; the formatted view is derived from these sections
+            return Lesson(
+                id=lesson_id,
+                title=title,
+                full_text=pdf_content,
+                pdf_path=pdf_path,
+                sections=extract_basic_sections(pdf_content),
+                word_count=len(pdf_content.split())
+            )
     
     # If no PDF was found or content couldn't be extracted
     print(f"❌ No valid PDF content found for lesson ID: {lesson_id}")
@@ -209,41 +399,32 @@ def process_pdf(lesson_id: str) -> Dict[str, Any]:
             
     error_message += "\nPlease upload a PDF for this lesson or check the database configuration."
     
-    return {
-        'id': lesson_id,
-        'title': f'Lesson {lesson_id}',
-        'summary': 'No content available for this lesson.',
-        'content': error_message,
-        'qa_pairs': [],
-        'qaPairs': [],
-        'has_pdf': False,
-        'error': 'PDF not found'
-    }
+    return Lesson(
+        id=lesson_id,
+        title=f'Lesson {lesson_id}',
+        has_pdf=False,
+        summary='No content available for this lesson.',
+        error='PDF not found',
+        message=error_message
+    )
 
-def structure_basic_content(text: str, lesson_id: str, title: str) -> str:
+def extract_basic_sections(text: str) -> Dict[str, str]:
     """
-    Apply basic structure to extracted PDF text to make it more readable
+    Find common sections in extracted PDF text to make it more readable
     """
-    # Try to identify common sections using regex
-    structured_text = f"TITLE: {title}\n\n"
+    sections = {}
     
     # Look for Objective section
     objective_match = re.search(r"(?:Objective|Goal)s?:?\s*(.+?)(?:\n\n|\n[A-Z]|\n\d\.)", text, re.DOTALL | re.IGNORECASE)
     if objective_match:
-        objective = objective_match.group(1).strip()
-        structured_text += f"OBJECTIVE:\n{objective}\n\n"
+        sections['objective'] = objective_match.group(1).strip()
     
     # Look for Key Concepts section
     key_concepts_match = re.search(r"(?:Key\s+Concepts|Main\s+Topics|Key\s+Points):?\s*(.+?)(?:\n\n|\n[A-Z]|\nApplication:)", text, re.DOTALL | re.IGNORECASE)
     if key_concepts_match:
-        key_concepts = key_concepts_match.group(1).strip()
-        structured_text += f"KEY CONCEPTS:\n{key_concepts}\n\n"
-    
-    # If we couldn't find any sections, just use the full text
-    if len(structured_text) < len(title) + 20:
-        structured_text += "CONTENT:\n" + text
+        sections['key_concepts'] = key_concepts_match.group(1).strip()
     
-    return structured_text
+    return sections
 
 def extract_text_from_pdf(pdf_path: str) -> str:
     """
@@ -0,0 +1,147 @@
+import os
+from email.utils import formatdate
+from urllib.parse import quote
+from typing import Dict, Optional, Tuple
+from fastapi import Request
+from fastapi.responses import Response
+import executors
+import lesson_store
+import http_caching
+from config import Config
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def file_validators(path: str) -> Tuple[int, str, str]:
+    """Size, strong ETag (the stored content hash) and Last-Modified of a file. Blocking."""
+    stat = os.stat(path)
+    content_hash = lesson_store.content_hash_for(path)
+    return stat.st_size, f'"{content_hash[:32]}"', formatdate(stat.st_mtime, usegmt=True)
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    First and last byte of a single `bytes=` range, or None to send the whole file
+    (no header, another unit, a malformed value such as `bytes=5-2`, or several ranges at once).
+    Only a well-formed range that misses the file raises RangeNotSatisfiable.
+    """
+    if not header or not header.startswith("bytes="):
+        return None
+    specs = header[len("bytes="):].split(",")
+    if len(specs) != 1:
+        return None
+    first, _, last = specs[0].strip().partition("-")
+    try:
+        if first == "":
+            # Suffix range: the final `last` bytes
+            length = int(last)
+            if length <= 0:
+                raise RangeNotSatisfiable()
+            start, end = max(0, size - length), size - 1
+        else:
+            start = int(first)
+            if last and int(last) < start:
+                return None
+            end = min(int(last), size - 1) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable()
+    return start, end
+
+
+class FileRangeResponse(Response):
+    """
+    Sends bytes start..end of a file. Uses the ASGI zero-copy extensions when the server
+    offers them (zerocopysend for any range, pathsend for whole files), otherwise reads
+    `chunk_size` blocks in the io pool so the event loop never waits on the disk.
+    """
+
+    chunk_size = 256 * 1024
+
+    def __init__(self, path: str, start: int, end: int, status_code: int, headers: Dict[str, str],
+                 send_body: bool = True, size: Optional[int] = None):
+        super().__init__(status_code=status_code, headers=headers, media_type="application/pdf")
+        self.path = path
+        self.start = start
+        self.end = end
+        self.size = size
+        self.send_body = send_body
+        self.headers["Content-Length"] = str(max(0, end - start + 1))
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        count = self.end - self.start + 1
+        if not self.send_body or count <= 0:
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        extensions = scope.get("extensions") or {}
+        if "http.response.pathsend" in extensions and self.start == 0:
+            size = self.size if self.size is not None else await executors.io.run(os.path.getsize, self.path)
+            if count == size:
+                await send({"type": "http.response.pathsend", "path": self.path})
+                return
+
+        # Opening, seeking and closing touch the disk too, so they run in the io pool like the reads
+        f = await executors.io.run(open, self.path, "rb")
+        try:
+            if "http.response.zerocopysend" in extensions:
+                await send({"type": "http.response.zerocopysend", "file": f, "offset": self.start, "count": count})
+                return
+
+            await executors.io.run(f.seek, self.start)
+            remaining = count
+            while remaining > 0:
+                chunk = await executors.io.run(f.read, min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                # The file shrank underneath us; end the response rather than hang the client
+                await send({"type": "http.response.body", "body": b""})
+        finally:
+            await executors.io.run(f.close)
+
+
+def content_disposition(path: str) -> str:
+    """inline, with an ASCII fallback name and the exact name as RFC 5987 `filename*`"""
+    name = os.path.basename(path)
+    fallback = "".join(c if " " <= c < "\x7f" and c not in '"\\' else "_" for c in name)
+    return f'inline; filename="{fallback}"; filename*=UTF-8\'\'{quote(name)}'
+
+
+def pdf_response(request: Request, path: str, size: int, etag: str, last_modified: str) -> Response:
+    """200, 206, 304 or 416 for a PDF, depending on the conditional and Range headers"""
+    headers = {
+        "ETag": etag,
+        "Last-Modified": last_modified,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": Config.HTTP_CACHE_CONTROL,
+        "Content-Disposition": content_disposition(path),
+    }
+    if http_caching.etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    send_body = request.method != "HEAD"
+    # If-Range: only honour the range if the client's copy is still this exact version
+    if_range = request.headers.get("if-range")
+    range_header = request.headers.get("range") if if_range in (None, etag, last_modified) else None
+    try:
+        byte_range = parse_range(range_header, size)
+    except RangeNotSatisfiable:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+
+    if byte_range is None:
+        return FileRangeResponse(path, 0, size - 1, 200, headers, send_body, size)
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return FileRangeResponse(path, start, end, 206, headers, send_body, size)
+
+
+async def serve_pdf(request: Request, path: str) -> Response:
+    size, etag, last_modified = await executors.io.run(file_validators, path)
+    return pdf_response(request, path, size, etag, last_modified)
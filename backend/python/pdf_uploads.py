@@ -0,0 +1,203 @@
+import os
+import time
+import uuid
+import asyncio
+import hashlib
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, AsyncIterator
+from multipart.multipart import MultipartParser, parse_options_header
+from config import Config
+import executors
+
+# Kept apart from downloads/, which the lesson PDF fallback scans for the newest file
+UPLOADS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
+PDF_MAGIC = b"%PDF-"
+# Room for the multipart boundaries, part headers and small form fields around the file
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+class UploadError(Exception):
+    """Raised for uploads that are rejected; carries the HTTP status to return"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def pdf_path_for(pdf_id: str) -> str:
+    return os.path.join(UPLOADS_DIR, f"{pdf_id}.pdf")
+
+
+def is_valid_pdf_id(pdf_id: str) -> bool:
+    return len(pdf_id) == 64 and all(c in "0123456789abcdef" for c in pdf_id)
+
+
+async def save_stream(chunks: AsyncIterator[bytes], max_bytes: int = None) -> Dict[str, Any]:
+    """
+    Write an upload to disk chunk by chunk, hashing it on the way.
+    The file is named after its SHA-256, so the same PDF uploaded twice is stored once.
+    """
+    max_bytes = max_bytes or Config.PDF_UPLOAD_MAX_BYTES
+    os.makedirs(UPLOADS_DIR, exist_ok=True)
+    temp_path = os.path.join(UPLOADS_DIR, f".upload-{uuid.uuid4().hex}.part")
+    digest = hashlib.sha256()
+    size = 0
+    header = b""
+
+    try:
+        with open(temp_path, "wb") as f:
+            async for chunk in chunks:
+                if not chunk:
+                    continue
+                if len(header) < len(PDF_MAGIC):
+                    header += chunk[:len(PDF_MAGIC) - len(header)]
+                    if len(header) >= len(PDF_MAGIC) and header != PDF_MAGIC:
+                        raise UploadError(415, "Uploaded file is not a PDF")
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadError(413, f"PDF exceeds the {max_bytes // (1024 * 1024)} MB upload limit")
+                digest.update(chunk)
+                await executors.io.run(f.write, chunk)
+
+        if size == 0:
+            raise UploadError(400, "Empty upload")
+        if header != PDF_MAGIC:
+            raise UploadError(415, "Uploaded file is not a PDF")
+
+        pdf_id = digest.hexdigest()
+        final_path = pdf_path_for(pdf_id)
+        if os.path.exists(final_path):
+            os.remove(temp_path)
+        else:
+            os.replace(temp_path, final_path)
+        return {"pdf_id": pdf_id, "path": final_path, "size": size}
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+async def multipart_file_chunks(body: AsyncIterator[bytes], content_type: str, field: str = "file",
+                                max_bytes: int = None) -> AsyncIterator[bytes]:
+    """
+    The bytes of one file field of a multipart/form-data body, parsed as the body arrives
+    instead of spooling the whole form first. The raw body is capped at `max_bytes` plus
+    room for the multipart framing, so oversized requests stop early.
+    """
+    max_bytes = (max_bytes or Config.PDF_UPLOAD_MAX_BYTES) + MULTIPART_OVERHEAD
+    _, params = parse_options_header(content_type)
+    boundary = params.get(b"boundary")
+    if not boundary:
+        raise UploadError(400, "Missing multipart boundary")
+
+    state = {"header_field": b"", "header_value": b"", "headers": {}, "in_file": False, "found": False}
+    pending: List[bytes] = []
+
+    def on_part_begin():
+        state["headers"] = {}
+
+    def on_header_field(data, start, end):
+        state["header_field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        state["header_value"] += data[start:end]
+
+    def on_header_end():
+        state["headers"][state["header_field"].lower()] = state["header_value"]
+        state["header_field"] = state["header_value"] = b""
+
+    def on_headers_finished():
+        _, options = parse_options_header(state["headers"].get(b"content-disposition", b""))
+        state["in_file"] = (
+            not state["found"] and options.get(b"name") == field.encode() and b"filename" in options
+        )
+        state["found"] = state["found"] or state["in_file"]
+
+    def on_part_data(data, start, end):
+        if state["in_file"]:
+            pending.append(bytes(data[start:end]))
+
+    def on_part_end():
+        state["in_file"] = False
+
+    parser = MultipartParser(boundary, {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+
+    received = 0
+    async for chunk in body:
+        received += len(chunk)
+        if received > max_bytes:
+            raise UploadError(413, f"PDF exceeds the {Config.PDF_UPLOAD_MAX_BYTES // (1024 * 1024)} MB upload limit")
+        parser.write(chunk)
+        if pending:
+            yield b"".join(pending)
+            pending.clear()
+    parser.finalize()
+    if pending:
+        yield b"".join(pending)
+    if not state["found"]:
+        raise UploadError(400, "Missing 'file' field")
+
+
+class ExtractionJobs:
+    """Tracks background extraction of uploaded PDFs, keyed by content hash"""
+
+    def __init__(self, max_results: int = None, concurrency: int = None):
+        self.jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.max_results = max_results or Config.PDF_JOB_RESULTS
+        self._semaphore = asyncio.Semaphore(concurrency or Config.PDF_EXTRACTION_CONCURRENCY)
+        self._tasks = set()
+
+    def get(self, pdf_id: str) -> Optional[Dict[str, Any]]:
+        return self.jobs.get(pdf_id)
+
+    def schedule(self, pdf_id: str, path: str, extract, lesson_id: Optional[str] = None) -> Dict[str, Any]:
+        """Queue extraction unless this PDF is already done or in progress"""
+        job = self.jobs.get(pdf_id)
+        if job and job["status"] != "error":
+            return job
+
+        job = {"status": "pending", "path": path, "lesson_id": lesson_id, "queued_at": time.time()}
+        self.jobs[pdf_id] = job
+        self._prune()
+        task = asyncio.create_task(self._run(pdf_id, job, extract))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    async def _run(self, pdf_id: str, job: Dict[str, Any], extract):
+        async with self._semaphore:
+            job["status"] = "processing"
+            started = time.perf_counter()
+            try:
+                result = await executors.io.run(extract, job["path"], job["lesson_id"] or pdf_id[:12])
+                if result.get("error"):
+                    job.update(status="error", error=result["error"])
+                else:
+                    job.update(status="ready", result=result)
+            except Exception as e:
+                print(f"❌ Error extracting uploaded PDF {pdf_id}: {str(e)}")
+                job.update(status="error", error=str(e))
+            job["extraction_time"] = time.perf_counter() - started
+
+    def _prune(self):
+        # Forget the oldest finished jobs; the PDFs themselves stay on disk
+        while len(self.jobs) > self.max_results:
+            oldest_id, oldest = next(iter(self.jobs.items()))
+            if oldest["status"] in ("pending", "processing"):
+                break
+            self.jobs.pop(oldest_id)
+
+    def stats(self) -> Dict[str, Any]:
+        counts: Dict[str, int] = {}
+        for job in self.jobs.values():
+            counts[job["status"]] = counts.get(job["status"], 0) + 1
+        return {"tracked": len(self.jobs), "by_status": counts}
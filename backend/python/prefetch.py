@@ -0,0 +1,105 @@
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Dict, Any, List, Callable, Optional, Tuple
+import executors
+
+
+class LessonPrefetcher:
+    """
+    Loads the lessons a freshly connected student is about to ask about (their current lesson,
+    then its neighbours in the schedule) in the io pool before the first question arrives.
+
+    Prefetching is strictly best-effort: at most `concurrency` loads run at once, each waits
+    while `busy()` reports live traffic queueing, and gives up after `max_delay` seconds.
+    """
+
+    def __init__(self, load: Callable[[str], Any], neighbours: Callable[[str, int], List[str]],
+                 is_cached: Callable[[str], bool], busy: Callable[[], bool],
+                 concurrency: int = 2, adjacent: int = 1, max_delay: float = 30.0, ttl: float = 300.0,
+                 max_recent: int = 1000):
+        self.load = load
+        self.neighbours = neighbours
+        self.is_cached = is_cached
+        self.busy = busy
+        self.adjacent = adjacent
+        self.max_delay = max_delay
+        self.ttl = ttl
+        self.max_recent = max_recent
+        self._semaphore = asyncio.Semaphore(max(1, concurrency))
+        # ("lesson" | "around", lesson_id) -> last scheduled, oldest first
+        self._recent: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._tasks = set()
+        self.stats_counters = {"scheduled": 0, "loaded": 0, "already_cached": 0, "deferred": 0, "dropped": 0, "failed": 0}
+
+    def _claim(self, kind: str, lesson_id: str) -> bool:
+        """
+        True if this lesson ("lesson") or the lessons around it ("around") weren't scheduled
+        within the last `ttl` seconds. Lesson ids come from clients, so only the `max_recent`
+        latest claims are remembered; forgetting one early at worst prefetches it again.
+        """
+        now = time.monotonic()
+        key = (kind, lesson_id)
+        if now - self._recent.get(key, float("-inf")) < self.ttl:
+            return False
+        self._recent[key] = now
+        self._recent.move_to_end(key)
+        while len(self._recent) > self.max_recent:
+            self._recent.popitem(last=False)
+        return True
+
+    def schedule(self, lesson_id: Optional[str], include_current: bool = True):
+        """
+        Fire and forget: warm `lesson_id` and the lessons around it. Pass include_current=False
+        when the caller is about to load the lesson itself; the lesson then stays unclaimed,
+        so a later connect for it still warms it.
+        """
+        if not lesson_id:
+            return
+        lesson_id = str(lesson_id)
+        warm_current = include_current and self._claim("lesson", lesson_id)
+        expand = self.adjacent > 0 and self._claim("around", lesson_id)
+        if not warm_current and not expand:
+            return
+        task = asyncio.create_task(self._prefetch(lesson_id, warm_current, expand))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _prefetch(self, lesson_id: str, warm_current: bool, expand: bool):
+        # The current lesson first: it's the one the first question will be about
+        if warm_current:
+            await self._warm(lesson_id)
+        if not expand:
+            return
+        try:
+            neighbours = await executors.io.run(self.neighbours, lesson_id, self.adjacent)
+        except Exception as e:
+            print(f"⚠️ Prefetch could not list lessons around {lesson_id}: {str(e)}")
+            return
+        await asyncio.gather(*(self._warm(neighbour) for neighbour in neighbours if self._claim("lesson", neighbour)))
+
+    async def _warm(self, lesson_id: str):
+        self.stats_counters["scheduled"] += 1
+        async with self._semaphore:
+            deadline = time.monotonic() + self.max_delay
+            delay = 0.05
+            while self.busy():
+                if time.monotonic() + delay > deadline:
+                    self.stats_counters["dropped"] += 1
+                    return
+                self.stats_counters["deferred"] += 1
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 1.0)
+
+            if self.is_cached(lesson_id):
+                self.stats_counters["already_cached"] += 1
+                return
+            try:
+                await executors.io.run(self.load, lesson_id)
+                self.stats_counters["loaded"] += 1
+            except Exception as e:
+                print(f"⚠️ Prefetch of lesson {lesson_id} failed: {str(e)}")
+                self.stats_counters["failed"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.stats_counters, "in_progress": len(self._tasks)}
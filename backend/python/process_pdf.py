@@ -1,159 +1,266 @@
-import fitz  # PyMuPDF
 import os
 import re
+import hashlib
 from typing import Dict, Any, List, Optional
+import lesson_store
+import executors
+import text_analysis
+import topic_index
+import startup
+from lesson_model import Lesson
 
-def extract_structured_content(pdf_path: str, lesson_id: str) -> Dict[str, Any]:
+fitz = startup.lazy_import("fitz")  # PyMuPDF, only needed when a PDF is actually parsed
+
+# Bump whenever extract_document's output changes so stored results are rebuilt
+# (3: page fingerprints cover fonts and form XObjects)
+EXTRACTOR_VERSION = 3
+
+def _font_digest(doc, xref: int, memo: Dict[int, bytes]) -> bytes:
+    """What decides how a font's glyphs read as text: its encoding, ToUnicode map and program"""
+    if xref not in memo:
+        digest = hashlib.sha256()
+        for key in ("Encoding", "ToUnicode"):
+            kind, value = doc.xref_get_key(xref, key)
+            if kind == "xref":
+                target = int(value.split()[0])
+                digest.update(doc.xref_stream(target) or doc.xref_object(target, compressed=True).encode())
+            else:
+                digest.update(f"{kind}:{value}".encode())
+        digest.update(doc.extract_font(xref)[3] or b"")
+        memo[xref] = digest.digest()
+    return memo[xref]
+
+def page_fingerprint(page, memo: Optional[Dict[int, bytes]] = None) -> str:
     """
-    Extract structured content from a PDF file, attempting to identify sections like objectives, key concepts, etc.
+    Hash of everything a page's text is built from: its decoded content streams and geometry,
+    the fonts it draws with and the form XObjects it places. Unlike the page object it survives
+    the PDF being re-saved (object numbers and compression change), but changes with the text.
+    `memo` shares font and XObject digests between the pages of one document.
     """
-    if not os.path.exists(pdf_path):
-        return {"error": f"PDF file not found at {pdf_path}"}
+    doc = page.parent
+    memo = {} if memo is None else memo
+    digest = hashlib.sha256()
+    digest.update(f"{tuple(page.rect)}|{page.rotation}".encode())
+    for xref in page.get_contents():
+        digest.update(doc.xref_stream(xref) or b"")
+    # Content streams refer to resources by name, so hash each name with what it resolves to
+    for xref, _, _, basefont, name, _, _ in sorted(page.get_fonts(full=True), key=lambda font: font[4]):
+        digest.update(f"|font|{name}|{basefont}|".encode())
+        digest.update(_font_digest(doc, xref, memo))
+    for xref, name, _, _ in sorted(page.get_xobjects(), key=lambda xobject: xobject[1]):
+        if xref not in memo:
+            memo[xref] = hashlib.sha256(doc.xref_stream(xref) or b"").digest()
+        digest.update(f"|form|{name}|".encode())
+        digest.update(memo[xref])
+    return digest.hexdigest()
+
+def extract_document(pdf_path: str) -> Dict[str, Any]:
+    """
+    Parse a PDF into lesson-independent data: text, TOC, detected title and sections.
+    This is the only step that needs fitz; its output is what the lesson store persists.
+    Page text is stored per page fingerprint, so when a lesson's PDF is replaced with an
+    edited copy only the changed pages are extracted again.
+    """
+    toc = []
+    page_texts = []
+    extracted = {}
     
-    try:
-        # Extract full text first
-        full_text = ""
-        toc = []
-        
-        with fitz.open(pdf_path) as doc:
-            # Try to extract table of contents if available
-            try:
-                toc = doc.get_toc()
-            except:
-                pass
-                
-            # Extract text from each page
-            for page in doc:
-                full_text += page.get_text()
-        
-        # Create filename-based title
-        filename = os.path.basename(pdf_path)
-        title = f"Lesson {lesson_id}"
-        if filename:
-            title = f"{title}: {filename}"
-        
-        # Try to extract lesson title from content
-        title_match = re.search(r"Lesson\s+\d+:?\s*(.+?)(?:\n|$)", full_text)
-        if title_match:
-            extracted_title = title_match.group(1).strip()
-            if extracted_title:
-                title = f"Lesson {lesson_id}: {extracted_title}"
-        
-        # Try to identify sections
-        sections = {}
-        
-        # Look for objective section
-        objective_match = re.search(r"(?:Objective|Goal)s?:?\s*(.+?)(?:\n\n|\n[A-Z]|\n\d\.)", full_text, re.DOTALL | re.IGNORECASE)
-        if objective_match:
-            sections["objective"] = objective_match.group(1).strip()
-        
-        # Look for key concepts section
-        key_concepts_match = re.search(r"(?:Key\s+Concepts|Main\s+Topics|Key\s+Points):?\s*(.+?)(?:\n\n|\n[A-Z]|\nApplication:)", full_text, re.DOTALL | re.IGNORECASE)
-        if key_concepts_match:
-            concepts_text = key_concepts_match.group(1).strip()
-            # Extract bullet points
-            concepts = []
-            for line in concepts_text.split('\n'):
-                cleaned = re.sub(r'^\s*[•\-\*o\d]+[\.\)]\s*', '', line).strip()
-                if cleaned and not cleaned.isspace():
-                    concepts.append(cleaned)
+    with fitz.open(pdf_path) as doc:
+        # Try to extract table of contents if available
+        try:
+            toc = doc.get_toc()
+        except:
+            pass
             
-            if concepts:
-                sections["key_concepts"] = concepts
-        
-        # Look for application or examples section
-        application_match = re.search(r"(?:Application|Examples?|Implementation):?\s*(.+?)(?:\n\n\S|$)", full_text, re.DOTALL | re.IGNORECASE)
-        if application_match:
-            sections["application"] = application_match.group(1).strip()
-        
-        # For a discussion section
-        discussion_match = re.search(r"(?:Discussion|Additional\s+Notes):?\s*(.+?)(?:\n\n\S|$)", full_text, re.DOTALL | re.IGNORECASE)
-        if discussion_match:
-            sections["discussion"] = discussion_match.group(1).strip()
-        
-        # Return structured content
-        result = {
-            "id": lesson_id,
-            "title": title,
-            "full_text": full_text,
-            "pdf_path": pdf_path,
-            "has_pdf": True,
-            "word_count": len(full_text.split()),
-            "sections": sections,
-            "toc": toc
-        }
-        
-        # Format sections into a more readable content
-        formatted_content = f"TITLE: {title}\n\n"
+        page_count = doc.page_count
+        memo = {}
+        fingerprints = [page_fingerprint(page, memo) for page in doc]
+        known = lesson_store.get_pages(fingerprints, EXTRACTOR_VERSION)
         
-        if "objective" in sections:
-            formatted_content += f"OBJECTIVE:\n{sections['objective']}\n\n"
-            
-        if "key_concepts" in sections:
-            formatted_content += "KEY CONCEPTS:\n"
-            for i, concept in enumerate(sections['key_concepts']):
-                formatted_content += f"{i+1}. {concept}\n"
-            formatted_content += "\n"
-            
-        if "application" in sections:
-            formatted_content += f"APPLICATION:\n{sections['application']}\n\n"
-            
-        if "discussion" in sections:
-            formatted_content += f"DISCUSSION:\n{sections['discussion']}\n\n"
+        # Extract text only from pages not seen before
+        for page, fingerprint in zip(doc, fingerprints):
+            text = known.get(fingerprint)
+            if text is None:
+                text = extracted.get(fingerprint)
+            if text is None:
+                text = extracted[fingerprint] = page.get_text()
+            page_texts.append(text)
+    
+    pages_stored = lesson_store.put_pages(extracted, EXTRACTOR_VERSION)
+    if known:
+        print(f"Reused {page_count - len(extracted)} of {page_count} pages from {os.path.basename(pdf_path)}")
+    
+    # Character offset where each page starts in full_text
+    page_offsets = []
+    offset = 0
+    for text in page_texts:
+        page_offsets.append(offset)
+        offset += len(text)
+    full_text = "".join(page_texts)
+    
+    # Try to extract lesson title from content
+    extracted_title = None
+    title_match = re.search(r"Lesson\s+\d+:?\s*(.+?)(?:\n|$)", full_text)
+    if title_match:
+        extracted_title = title_match.group(1).strip() or None
+    
+    # Try to identify sections
+    sections = {}
+    
+    # Look for objective section
+    objective_match = re.search(r"(?:Objective|Goal)s?:?\s*(.+?)(?:\n\n|\n[A-Z]|\n\d\.)", full_text, re.DOTALL | re.IGNORECASE)
+    if objective_match:
+        sections["objective"] = objective_match.group(1).strip()
+    
+    # Look for key concepts section
+    key_concepts_match = re.search(r"(?:Key\s+Concepts|Main\s+Topics|Key\s+Points):?\s*(.+?)(?:\n\n|\n[A-Z]|\nApplication:)", full_text, re.DOTALL | re.IGNORECASE)
+    if key_concepts_match:
+        concepts_text = key_concepts_match.group(1).strip()
+        # Extract bullet points
+        concepts = []
+        for line in concepts_text.split('\n'):
+            cleaned = re.sub(r'^\s*[•\-\*o\d]+[\.\)]\s*', '', line).strip()
+            if cleaned and not cleaned.isspace():
+                concepts.append(cleaned)
         
-        # If no sections were found, just include the full text
-        if not sections:
-            formatted_content += f"CONTENT:\n{full_text}\n"
-            
-        result["content"] = formatted_content
-            
-        return result
+        if concepts:
+            sections["key_concepts"] = concepts
+    
+    # Look for application or examples section
+    application_match = re.search(r"(?:Application|Examples?|Implementation):?\s*(.+?)(?:\n\n\S|$)", full_text, re.DOTALL | re.IGNORECASE)
+    if application_match:
+        sections["application"] = application_match.group(1).strip()
+    
+    # For a discussion section
+    discussion_match = re.search(r"(?:Discussion|Additional\s+Notes):?\s*(.+?)(?:\n\n\S|$)", full_text, re.DOTALL | re.IGNORECASE)
+    if discussion_match:
+        sections["discussion"] = discussion_match.group(1).strip()
     
+    return {
+        "full_text": full_text,
+        "extracted_title": extracted_title,
+        "word_count": len(full_text.split()),
+        "page_count": page_count,
+        "sections": sections,
+        "toc": toc,
+        "page_fingerprints": fingerprints,
+        "page_offsets": page_offsets,
+        "pages_extracted": len(extracted),
+        "pages_reused": sum(fingerprint in known for fingerprint in fingerprints),
+        "pages_stored": pages_stored
+    }
+
+def extract_in_pool(pdf_path: str) -> Dict[str, Any]:
+    """extract_document in the pdf process pool, with its page reuse counted in this process"""
+    document = executors.parse_pdf(extract_document, pdf_path)
+    lesson_store.record_pages(document.get("pages_reused", 0), document.get("pages_stored", 0))
+    return document
+
+def build_lesson(document: Dict[str, Any], pdf_path: str, lesson_id: str,
+                 digest: Optional[Dict[str, Any]] = None) -> Lesson:
+    """Turn extracted document data (and its stored summary, if any) into the lesson served to chat"""
+    digest = digest or {}
+    # Create filename-based title
+    filename = os.path.basename(pdf_path)
+    title = f"Lesson {lesson_id}"
+    if filename:
+        title = f"{title}: {filename}"
+    if document.get("extracted_title"):
+        title = f"Lesson {lesson_id}: {document['extracted_title']}"
+    
+    # The text is kept once; Lesson.content formats the sections on demand
+    return Lesson(
+        id=lesson_id,
+        title=title,
+        full_text=document["full_text"],
+        pdf_path=pdf_path,
+        sections=document["sections"],
+        toc=document["toc"],
+        word_count=document["word_count"],
+        page_count=document.get("page_count", 0),
+        page_offsets=document.get("page_offsets", []),
+        summary=digest.get("summary", ""),
+        key_points=digest.get("key_points", [])
+    )
+
+def summarize_document(pdf_path: str, document: Dict[str, Any]) -> Dict[str, Any]:
+    """Extractive summary and key points, computed once per PDF and summarizer version"""
+    try:
+        return lesson_store.get_or_create(
+            pdf_path, "summary", text_analysis.SUMMARIZER_VERSION,
+            lambda: executors.parse_pdf(text_analysis.summarize, document["full_text"])
+        )
     except Exception as e:
-        return {
-            "id": lesson_id,
-            "title": f"Lesson {lesson_id}",
-            "content": f"Error processing PDF: {str(e)}",
-            "pdf_path": pdf_path,
-            "has_pdf": True,
-            "error": str(e)
-        }
+        # A lesson without a summary still works; the LLM answers summary questions instead
+        print(f"⚠️ Could not summarize {os.path.basename(pdf_path)}: {str(e)}")
+        return {}
+
+def extract_structured_content(pdf_path: str, lesson_id: str) -> Lesson:
+    """
+    Extract structured content from a PDF file, attempting to identify sections like objectives, key concepts, etc.
+    Extraction results are persisted by content hash, so a PDF is only parsed once per extractor version.
+    """
+    if not os.path.exists(pdf_path):
+        return Lesson(
+            id=lesson_id,
+            title=f"Lesson {lesson_id}",
+            pdf_path=pdf_path,
+            has_pdf=False,
+            error=f"PDF file not found at {pdf_path}"
+        )
+    
+    try:
+        document = lesson_store.get_or_create(
+            pdf_path, "document", EXTRACTOR_VERSION, lambda: extract_in_pool(pdf_path)
+        )
+        return build_lesson(document, pdf_path, lesson_id, summarize_document(pdf_path, document))
+    
+    except Exception as e:
+        return Lesson(
+            id=lesson_id,
+            title=f"Lesson {lesson_id}",
+            pdf_path=pdf_path,
+            error=str(e),
+            message=f"Error processing PDF: {str(e)}"
+        )
+
+def preview_text(pdf_path: str, length: int = 100) -> str:
+    """The start of a PDF's first page, for file listings"""
+    try:
+        with fitz.open(pdf_path) as doc:
+            if doc.page_count == 0:
+                return "Empty document"
+            text = doc[0].get_text(sort=True)
+            return text[:length] + "..." if len(text) > length else text
+    except Exception as e:
+        return f"Error: {str(e)}"
 
 def analyze_pdf_topic(pdf_path: str) -> Dict[str, Any]:
     """
     Analyze a PDF to determine its main topic and keywords.
-    Useful for categorizing PDFs.
+    Useful for categorizing PDFs. Keywords come from the whole document, weighted by the
+    course-wide topic index so terms every lesson shares don't crowd out the distinctive ones.
     """
     if not os.path.exists(pdf_path):
         return {"error": "PDF not found"}
     
     try:
-        # Extract first page text
-        with fitz.open(pdf_path) as doc:
-            if doc.page_count > 0:
-                first_page_text = doc[0].get_text()
-                
-                # Look for a lesson title
-                title_match = re.search(r"(?:Lesson|Unit|Module)\s+\d+:?\s*(.+?)(?:\n|$)", first_page_text)
-                lesson_title = title_match.group(1).strip() if title_match else "Unknown lesson"
-                
-                # Extract keywords from the first page
-                common_words = {"the", "a", "an", "and", "or", "but", "in", "on", "at", "to", "for", "with", "by", "as", "from"}
-                words = [word.strip(string.punctuation).lower() for word in first_page_text.split()]
-                word_freq = {}
-                for word in words:
-                    if word and len(word) > 3 and word not in common_words:
-                        word_freq[word] = word_freq.get(word, 0) + 1
-                
-                top_keywords = sorted(word_freq.items(), key=lambda x: x[1], reverse=True)[:10]
-                
-                return {
-                    "filename": os.path.basename(pdf_path),
-                    "title": lesson_title,
-                    "keywords": [kw[0] for kw in top_keywords],
-                    "preview": first_page_text[:200] + "..."
-                }
-            else:
-                return {"error": "PDF has no pages"}
+        document = lesson_store.get_or_create(
+            pdf_path, "document", EXTRACTOR_VERSION, lambda: extract_in_pool(pdf_path)
+        )
+        if not document.get("page_count"):
+            return {"error": "PDF has no pages"}
+        
+        # Look for a lesson title on the first page
+        first_page_text = document["full_text"][:document["page_offsets"][1]] if document["page_count"] > 1 else document["full_text"]
+        title_match = re.search(r"(?:Lesson|Unit|Module)\s+\d+:?\s*(.+?)(?:\n|$)", first_page_text)
+        lesson_title = title_match.group(1).strip() if title_match else "Unknown lesson"
+        
+        return {
+            "filename": os.path.basename(pdf_path),
+            "title": lesson_title,
+            "keywords": topic_index.index.keywords(document["full_text"], 10),
+            "preview": first_page_text[:200] + "..."
+        }
     except Exception as e:
-        return {"error": str(e)} 
\ No newline at end of file
+        return {"error": str(e)}
@@ -0,0 +1,274 @@
+import time
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, Any, List, Optional
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request can't be admitted; retry_after is a hint in seconds"""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def _percentile(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _check_bucket(rate: float, capacity: float):
+    # A bucket that never refills (or can't hold one message) would throttle forever
+    if rate <= 0:
+        raise ValueError(f"Token bucket rate must be positive, got {rate}")
+    if capacity < 1:
+        raise ValueError(f"Token bucket capacity must be at least 1, got {capacity}")
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, up to `capacity` stored"""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        _check_bucket(rate, capacity)
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, tokens: float = 1) -> float:
+        """Take tokens if available. Returns 0 on success, otherwise seconds until they would be."""
+        now = time.monotonic()
+        self._refill(now)
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return 0.0
+        return (tokens - self.tokens) / self.rate
+
+    def is_full(self) -> bool:
+        self._refill(time.monotonic())
+        return self.tokens >= self.capacity
+
+
+class RateLimiter:
+    """A token bucket per key (connection id, user id, ...)"""
+
+    def __init__(self, rate: float, capacity: float, max_keys: int = 10000):
+        _check_bucket(rate, capacity)  # Buckets are created per key later; fail at startup instead
+        self.rate = rate
+        self.capacity = capacity
+        self.max_keys = max_keys
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.allowed = 0
+        self.limited = 0
+
+    def check(self, key: Optional[str]) -> float:
+        """Returns 0 if the key may proceed, otherwise the suggested retry delay in seconds"""
+        if key is None:
+            return 0.0
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            if len(self.buckets) >= self.max_keys:
+                self._prune()
+            bucket = self.buckets[key] = TokenBucket(self.rate, self.capacity)
+        retry_after = bucket.take()
+        if retry_after:
+            self.limited += 1
+        else:
+            self.allowed += 1
+        return retry_after
+
+    def forget(self, key: Optional[str]):
+        self.buckets.pop(key, None)
+
+    def _prune(self):
+        # A full bucket carries no state worth keeping
+        for key in [k for k, b in self.buckets.items() if b.is_full()]:
+            del self.buckets[key]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "tracked_keys": len(self.buckets),
+            "allowed": self.allowed,
+            "limited": self.limited,
+        }
+
+
+class PriorityClass:
+    """One class of upstream work: its share of dispatches, concurrency cap and queue limits"""
+
+    def __init__(self, name: str, weight: float = 1.0, max_concurrent: Optional[int] = None,
+                 max_queue: Optional[int] = None, queue_timeout: Optional[float] = None,
+                 preemptible: bool = False):
+        self.name = name
+        self.weight = weight
+        self.max_concurrent = max_concurrent  # None: limited only by the shared slots
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.preemptible = preemptible  # Queued requests may be evicted for higher-weight classes
+        self.waiters: deque = deque()
+        self.in_flight = 0
+        self.admitted = 0
+        self.rejected: Dict[str, int] = {"queue_full": 0, "queue_timeout": 0, "preempted": 0}
+        self.pass_value = 0.0
+        self._waits = deque(maxlen=1000)
+
+    def has_capacity(self) -> bool:
+        return self.max_concurrent is None or self.in_flight < self.max_concurrent
+
+    def stats(self) -> Dict[str, Any]:
+        waits = list(self._waits)
+        return {
+            "weight": self.weight,
+            "max_concurrent": self.max_concurrent,
+            "in_flight": self.in_flight,
+            "waiting": len(self.waiters),
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+            "queue_wait_p95": _percentile(waits, 95),
+        }
+
+
+class AdmissionController:
+    """
+    Global concurrency limit with a bounded wait queue, shared by priority classes.
+
+    Requests beyond `max_concurrent` wait in line; once `max_queue` are waiting, new ones are
+    rejected immediately instead of piling up. Freed slots go to the waiting class with the
+    lowest pass (stride scheduling: each dispatch advances a class by 1/weight), so classes
+    share slots in proportion to their weights, FIFO within a class. A class may also be
+    capped below `max_concurrent`. When the queue is full, the newest request of a lower-weight
+    preemptible class is evicted to make room rather than rejecting the newcomer.
+    """
+
+    def __init__(self, max_concurrent: int, max_queue: int, queue_timeout: float,
+                 classes: Optional[List[PriorityClass]] = None, default_class: Optional[str] = None):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        classes = classes or [PriorityClass("default")]
+        self.classes: Dict[str, PriorityClass] = {cls.name: cls for cls in classes}
+        self.default_class = default_class or classes[0].name
+        self.in_flight = 0
+        self.admitted = 0
+        self.rejected: Dict[str, int] = {"queue_full": 0, "queue_timeout": 0, "preempted": 0}
+        self._waits = deque(maxlen=1000)
+        self._service_time = 2.0  # EWMA of call duration, seeds the retry hint
+        self._virtual_time = 0.0
+
+    @property
+    def waiting(self) -> int:
+        return sum(len(cls.waiters) for cls in self.classes.values())
+
+    def retry_after(self, cls: Optional[PriorityClass] = None) -> float:
+        """Rough estimate of when a slot frees up, given the current line"""
+        ahead = len(cls.waiters) if cls is not None else self.waiting
+        estimate = self._service_time * (ahead + 1) / self.max_concurrent
+        return max(1.0, round(estimate, 1))
+
+    def _reject(self, cls: PriorityClass, reason: str) -> AdmissionRejected:
+        cls.rejected[reason] += 1
+        self.rejected[reason] += 1
+        return AdmissionRejected(reason, self.retry_after(cls))
+
+    def _start(self, cls: PriorityClass):
+        self._virtual_time = cls.pass_value
+        cls.pass_value += 1.0 / cls.weight
+        cls.in_flight += 1
+        cls.admitted += 1
+        self.in_flight += 1
+        self.admitted += 1
+
+    def _dispatch(self):
+        """Hand free slots to waiters, lowest pass first, skipping classes at their cap"""
+        while self.in_flight < self.max_concurrent:
+            ready = [cls for cls in self.classes.values() if cls.waiters and cls.has_capacity()]
+            if not ready:
+                return
+            cls = min(ready, key=lambda c: c.pass_value)
+            waiter = cls.waiters.popleft()
+            self._start(cls)
+            waiter.set_result(None)
+
+    def _preempt(self, cls: PriorityClass) -> bool:
+        """Evict the newest queued request of the lightest preemptible class below `cls`"""
+        victims = [
+            other for other in self.classes.values()
+            if other.preemptible and other.waiters and other.weight < cls.weight
+        ]
+        if not victims:
+            return False
+        victim = min(victims, key=lambda c: c.weight)
+        victim.waiters.pop().set_exception(self._reject(victim, "preempted"))
+        return True
+
+    def _release(self, cls: PriorityClass):
+        cls.in_flight -= 1
+        self.in_flight -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def admit(self, priority: Optional[str] = None):
+        cls = self.classes[priority or self.default_class]
+        queued_at = time.monotonic()
+
+        if not cls.waiters and cls.has_capacity() and self.in_flight < self.max_concurrent:
+            self._start(cls)
+        else:
+            if cls.max_queue is not None and len(cls.waiters) >= cls.max_queue:
+                raise self._reject(cls, "queue_full")
+            if self.waiting >= self.max_queue and not self._preempt(cls):
+                raise self._reject(cls, "queue_full")
+            if not cls.waiters:
+                # A class returning from idle doesn't get to spend credit it built up while away
+                cls.pass_value = max(cls.pass_value, self._virtual_time)
+            waiter = asyncio.get_running_loop().create_future()
+            cls.waiters.append(waiter)
+            timeout = cls.queue_timeout if cls.queue_timeout is not None else self.queue_timeout
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter), timeout)
+            except asyncio.TimeoutError:
+                if not waiter.done():
+                    cls.waiters.remove(waiter)
+                    raise self._reject(cls, "queue_timeout")
+                waiter.result()  # Granted (or preempted) just as the timeout fired
+            except asyncio.CancelledError:
+                if not waiter.done():
+                    cls.waiters.remove(waiter)
+                elif waiter.exception() is None:
+                    self._release(cls)
+                raise
+
+        started = time.monotonic()
+        self._waits.append(started - queued_at)
+        cls._waits.append(started - queued_at)
+        try:
+            yield
+        finally:
+            self._service_time = 0.8 * self._service_time + 0.2 * (time.monotonic() - started)
+            self._release(cls)
+
+    def stats(self) -> Dict[str, Any]:
+        waits = list(self._waits)
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+            "queue_wait_avg": sum(waits) / len(waits) if waits else 0.0,
+            "queue_wait_p95": _percentile(waits, 95),
+            "service_time_ewma": self._service_time,
+            "classes": {name: cls.stats() for name, cls in self.classes.items()},
+        }
@@ -4,7 +4,7 @@ import mysql.connector
 from mysql.connector import Error
 import json
 from pydantic import BaseModel
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional
 import os
 from dotenv import load_dotenv
 
@@ -41,31 +41,34 @@ class PersonalInfoRequest(BaseModel):
     data: Dict[str, Any]
     user_id: int
 
+class PersonalInfoItem(BaseModel):
+    section: str
+    data: Dict[str, Any]
+    user_id: Optional[int] = None
+
+class BulkPersonalInfoRequest(BaseModel):
+    user_id: Optional[int] = None  # Default for items that don't name their own user
+    items: List[PersonalInfoItem]
+
+# Relies on the unique (user_id, section_name) key so one statement covers insert and update
+UPSERT_PERSONAL_INFO_SQL = """
+    INSERT INTO personal_information (user_id, section_name, section_data)
+    VALUES (%s, %s, %s)
+    ON DUPLICATE KEY UPDATE section_data = VALUES(section_data)
+"""
+
+MAX_BULK_ITEMS = 1000
+
 @app.post("/personal-info")
 async def save_personal_info(request: PersonalInfoRequest):
     try:
         connection = get_db_connection()
         cursor = connection.cursor()
 
-        # Check if section exists for user
         cursor.execute(
-            "SELECT id FROM personal_information WHERE user_id = %s AND section_name = %s",
-            (request.user_id, request.section)
+            UPSERT_PERSONAL_INFO_SQL,
+            (request.user_id, request.section, json.dumps(request.data))
         )
-        existing_record = cursor.fetchone()
-
-        if existing_record:
-            # Update existing record
-            cursor.execute(
-                "UPDATE personal_information SET section_data = %s WHERE user_id = %s AND section_name = %s",
-                (json.dumps(request.data), request.user_id, request.section)
-            )
-        else:
-            # Insert new record
-            cursor.execute(
-                "INSERT INTO personal_information (user_id, section_name, section_data) VALUES (%s, %s, %s)",
-                (request.user_id, request.section, json.dumps(request.data))
-            )
 
         connection.commit()
         cursor.close()
@@ -80,6 +83,70 @@ async def save_personal_info(request: PersonalInfoRequest):
         print(f"Error saving personal information: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/personal-info/bulk")
+async def save_personal_info_bulk(request: BulkPersonalInfoRequest):
+    """
+    Save many sections, for one student or many, in a single transaction.
+    Invalid items are reported and skipped; everything else is written together.
+    """
+    if len(request.items) > MAX_BULK_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BULK_ITEMS} items per request")
+
+    results = []
+    rows = []
+    for index, item in enumerate(request.items):
+        user_id = item.user_id if item.user_id is not None else request.user_id
+        if user_id is None:
+            results.append({"index": index, "section": item.section, "status": "error", "error": "Missing user_id"})
+            continue
+        results.append({"index": index, "user_id": user_id, "section": item.section, "status": "pending"})
+        rows.append((user_id, item.section, json.dumps(item.data)))
+
+    if not rows:
+        return {"message": "No valid items to save", "saved": 0, "failed": len(results), "results": results}
+
+    connection = get_db_connection()
+    cursor = connection.cursor()
+    try:
+        connection.start_transaction()
+        # Rows for users that don't exist fail the foreign key, so check them up front
+        user_ids = sorted({row[0] for row in rows})
+        cursor.execute(
+            f"SELECT id FROM users WHERE id IN ({', '.join(['%s'] * len(user_ids))})",
+            tuple(user_ids)
+        )
+        known_users = {row[0] for row in cursor.fetchall()}
+
+        for result in results:
+            if result["status"] != "pending":
+                continue
+            if result["user_id"] in known_users:
+                result["status"] = "saved"
+            else:
+                result["status"] = "error"
+                result["error"] = "Unknown user"
+        valid_rows = [row for row in rows if row[0] in known_users]
+
+        # mysql.connector batches this into a single multi-row INSERT
+        if valid_rows:
+            cursor.executemany(UPSERT_PERSONAL_INFO_SQL, valid_rows)
+        connection.commit()
+    except Error as e:
+        connection.rollback()
+        print(f"Database error in bulk save, rolled back: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        cursor.close()
+        connection.close()
+
+    saved = sum(1 for result in results if result["status"] == "saved")
+    return {
+        "message": "Personal information saved successfully" if saved == len(results) else "Personal information partially saved",
+        "saved": saved,
+        "failed": len(results) - saved,
+        "results": results
+    }
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
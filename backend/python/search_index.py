@@ -0,0 +1,262 @@
+import re
+import math
+import time
+import bisect
+import threading
+from array import array
+from collections import defaultdict
+from typing import Dict, Any, List, Optional, Tuple
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:['\-][a-z0-9]+)*")
+_QUERY_PART = re.compile(r'"([^"]+)"|(\S+)')
+
+# Prefix queries expand to at most this many indexed terms
+MAX_PREFIX_EXPANSIONS = 64
+
+
+def tokenize(text: str) -> List[str]:
+    """Every word, stopwords included, so phrase queries match the text exactly"""
+    return _TOKEN.findall(text.lower())
+
+
+def parse_query(query: str) -> List[Tuple[str, Any]]:
+    """Clauses: ("phrase", [words]) for "quoted text", ("prefix", "grad") for grad*, else ("term", word)"""
+    clauses = []
+    for phrase, word in _QUERY_PART.findall(query):
+        if phrase:
+            words = tokenize(phrase)
+            if len(words) == 1:
+                clauses.append(("term", words[0]))
+            elif words:
+                clauses.append(("phrase", words))
+        elif word.endswith("*") and tokenize(word):
+            clauses.append(("prefix", tokenize(word)[0]))
+        else:
+            clauses.extend(("term", token) for token in tokenize(word))
+    return clauses
+
+
+class SearchIndex:
+    """
+    Positional inverted index over lesson pages, ranked with BM25.
+
+    Each page is one document: term -> {page_id: positions}. Lessons are added and replaced
+    one at a time as they are extracted; results are grouped by lesson with page snippets.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self.postings: Dict[str, Dict[int, array]] = {}
+        self.pages: Dict[int, Tuple[str, int, int, int]] = {}  # page_id -> (lesson_id, page number, start, end)
+        self.page_lengths: Dict[int, int] = {}
+        self.lessons: Dict[str, Dict[str, Any]] = {}
+        self._next_page_id = 0
+        self._total_length = 0
+        self._sorted_terms: Optional[List[str]] = None
+        self.stats = {"lessons_indexed": 0, "lessons_replaced": 0, "pages_reused": 0, "queries": 0}
+
+    def __contains__(self, lesson_id) -> bool:
+        return str(lesson_id) in self.lessons
+
+    def _remove_page(self, page_id: int, page_text: str):
+        for term in set(tokenize(page_text)):
+            docs = self.postings.get(term)
+            if docs is None:
+                continue
+            docs.pop(page_id, None)
+            if not docs:
+                del self.postings[term]
+                self._sorted_terms = None
+        del self.pages[page_id]
+        self._total_length -= self.page_lengths.pop(page_id)
+
+    def _add_page(self, lesson_id: str, number: int, start: int, end: int, page_text: str) -> int:
+        page_id = self._next_page_id
+        self._next_page_id += 1
+        positions = defaultdict(lambda: array("I"))
+        words = tokenize(page_text)
+        for position, word in enumerate(words):
+            positions[word].append(position)
+        for word, word_positions in positions.items():
+            docs = self.postings.get(word)
+            if docs is None:
+                docs = self.postings[word] = {}
+                self._sorted_terms = None
+            docs[page_id] = word_positions
+        self.pages[page_id] = (lesson_id, number, start, end)
+        self.page_lengths[page_id] = len(words)
+        self._total_length += len(words)
+        return page_id
+
+    def add(self, lesson_id: str, title: str, text: str, page_offsets: Optional[List[int]] = None) -> bool:
+        """
+        Index (or re-index) a lesson's pages; unchanged text is a no-op. When a lesson is
+        replaced, pages whose text is unchanged keep their postings (positions are relative
+        to the page), so a one-page edit re-tokenizes one page.
+        """
+        lesson_id = str(lesson_id)
+        fingerprint = hash(text)
+        offsets = list(page_offsets or [0]) + [len(text)]
+        with self._lock:
+            previous: Dict[str, List[int]] = defaultdict(list)  # old page text -> page ids
+            existing = self.lessons.get(lesson_id)
+            if existing is not None:
+                if existing["fingerprint"] == fingerprint:
+                    existing["title"] = title
+                    return False
+                for page_id in existing["page_ids"]:
+                    _, _, start, end = self.pages[page_id]
+                    previous[existing["text"][start:end]].append(page_id)
+                self.stats["lessons_replaced"] += 1
+
+            page_ids = []
+            for number, (start, end) in enumerate(zip(offsets, offsets[1:]), start=1):
+                page_text = text[start:end]
+                reusable = previous.get(page_text)
+                if reusable:
+                    page_id = reusable.pop()
+                    self.pages[page_id] = (lesson_id, number, start, end)
+                    self.stats["pages_reused"] += 1
+                else:
+                    page_id = self._add_page(lesson_id, number, start, end, page_text)
+                page_ids.append(page_id)
+            for page_text, stale in previous.items():
+                for page_id in stale:
+                    self._remove_page(page_id, page_text)
+
+            # The text itself is shared with the lesson, not copied; it's only read for snippets
+            self.lessons[lesson_id] = {"title": title, "text": text, "fingerprint": fingerprint, "page_ids": page_ids}
+            self.stats["lessons_indexed"] += 1
+            return True
+
+    def _expand_prefix(self, prefix: str) -> List[str]:
+        if self._sorted_terms is None:
+            self._sorted_terms = sorted(self.postings)
+        start = bisect.bisect_left(self._sorted_terms, prefix)
+        expansions = []
+        for term in self._sorted_terms[start:start + MAX_PREFIX_EXPANSIONS]:
+            if not term.startswith(prefix):
+                break
+            expansions.append(term)
+        return expansions
+
+    def _match(self, clause: Tuple[str, Any]) -> Dict[int, Tuple[int, int]]:
+        """page_id -> (match count, first match position) for one clause"""
+        kind, value = clause
+        if kind == "term":
+            return {page_id: (len(positions), positions[0]) for page_id, positions in self.postings.get(value, {}).items()}
+
+        if kind == "prefix":
+            matches = {}
+            for term in self._expand_prefix(value):
+                for page_id, positions in self.postings[term].items():
+                    count, first = matches.get(page_id, (0, positions[0]))
+                    matches[page_id] = (count + len(positions), min(first, positions[0]))
+            return matches
+
+        # Phrase: pages holding every word (checked from the rarest word), then consecutive positions
+        postings = [self.postings.get(word) for word in value]
+        if not all(postings):
+            return {}
+        rarest, *others = sorted(postings, key=len)
+        matches = {}
+        for page_id in rarest:
+            if not all(page_id in docs for docs in others):
+                continue
+            starts = set(postings[0][page_id])
+            for offset, docs in enumerate(postings[1:], start=1):
+                following = set(docs[page_id])
+                starts = {start for start in starts if start + offset in following}
+                if not starts:
+                    break
+            if starts:
+                matches[page_id] = (len(starts), min(starts))
+        return matches
+
+    def _snippet(self, page_id: int, position: int, width: int = 160) -> str:
+        lesson_id, _, start, end = self.pages[page_id]
+        page_text = self.lessons[lesson_id]["text"][start:end]
+        for index, match in enumerate(_TOKEN.finditer(page_text.lower())):
+            if index == position:
+                begin = max(0, match.start() - width // 2)
+                snippet = " ".join(page_text[begin:begin + width].split())
+                return ("…" if begin > 0 else "") + snippet + ("…" if begin + width < len(page_text) else "")
+        return " ".join(page_text[:width].split())
+
+    def search(self, query: str, limit: int = 10, pages_per_lesson: int = 3) -> Dict[str, Any]:
+        """Lessons matching every clause (or, failing that, any of them), best first"""
+        started = time.perf_counter()
+        clauses = parse_query(query)
+        results = []
+        with self._lock:
+            self.stats["queries"] += 1
+            page_count = len(self.pages)
+            if clauses and page_count:
+                matched = [self._match(clause) for clause in clauses]
+                rarest = min(matched, key=len)
+                candidates = {page_id for page_id in rarest if all(page_id in m for m in matched)}
+                if not candidates and len(clauses) > 1:
+                    candidates = set().union(*matched)
+
+                average_length = self._total_length / page_count
+                page_scores = {}
+                for page_id in candidates:
+                    length_norm = self.k1 * (1 - self.b + self.b * self.page_lengths[page_id] / average_length)
+                    score = 0.0
+                    for clause_matches in matched:
+                        if page_id not in clause_matches:
+                            continue
+                        frequency = clause_matches[page_id][0]
+                        df = len(clause_matches)
+                        idf = math.log(1 + (page_count - df + 0.5) / (df + 0.5))
+                        score += idf * frequency * (self.k1 + 1) / (frequency + length_norm)
+                    page_scores[page_id] = score
+
+                by_lesson = defaultdict(list)
+                for page_id, score in page_scores.items():
+                    by_lesson[self.pages[page_id][0]].append((score, page_id))
+
+                ranked = []
+                for lesson_id, pages in by_lesson.items():
+                    pages.sort(reverse=True)
+                    # The best page decides; further matching pages add a little
+                    score = pages[0][0] + 0.1 * sum(score for score, _ in pages[1:])
+                    ranked.append((score, lesson_id, pages))
+                ranked.sort(reverse=True)
+
+                for score, lesson_id, pages in ranked[:limit]:
+                    results.append({
+                        "lesson_id": lesson_id,
+                        "title": self.lessons[lesson_id]["title"],
+                        "score": round(score, 4),
+                        "matching_pages": len(pages),
+                        "pages": [
+                            {
+                                "page": self.pages[page_id][1],
+                                "score": round(page_score, 4),
+                                "snippet": self._snippet(page_id, min(
+                                    m[page_id][1] for m in matched if page_id in m
+                                ))
+                            }
+                            for page_score, page_id in pages[:pages_per_lesson]
+                        ]
+                    })
+        return {
+            "query": query,
+            "results": results,
+            "took_ms": round((time.perf_counter() - started) * 1000, 2)
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "lessons": len(self.lessons),
+            "pages": len(self.pages),
+            "terms": len(self.postings),
+        }
+
+
+# Process-wide index, fed as lessons are extracted
+index = SearchIndex()
@@ -0,0 +1,105 @@
+import time
+import importlib
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, List
+
+# Taken as early as possible: main imports this module before anything else
+PROCESS_START = time.perf_counter()
+
+_timings: List[Dict[str, Any]] = []
+_milestones: Dict[str, float] = {}
+_import_lock = threading.Lock()
+
+
+def record(kind: str, name: str, seconds: float):
+    _timings.append({"kind": kind, "name": name, "seconds": round(seconds, 4)})
+
+
+@contextmanager
+def step(name: str, kind: str = "init"):
+    """Time one startup step for the report"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(kind, name, time.perf_counter() - started)
+
+
+class LazyModule:
+    """Stands in for a module and imports it on first attribute access"""
+
+    def __init__(self, name: str):
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+
+    def _load(self):
+        module = self.__dict__["_module"]
+        if module is None:
+            with _import_lock:
+                module = self.__dict__["_module"]
+                if module is None:
+                    started = time.perf_counter()
+                    module = importlib.import_module(self.__dict__["_name"])
+                    record("lazy import", self.__dict__["_name"], time.perf_counter() - started)
+                    self.__dict__["_module"] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __repr__(self):
+        state = "loaded" if self.__dict__["_module"] is not None else "not loaded"
+        return f"<lazy module '{self.__dict__['_name']}' ({state})>"
+
+
+def lazy_import(name: str) -> LazyModule:
+    return LazyModule(name)
+
+
+def mark(milestone: str):
+    """Record the first time a milestone (e.g. 'listening', 'first_request') is reached"""
+    if milestone not in _milestones:
+        _milestones[milestone] = time.perf_counter() - PROCESS_START
+
+
+class FirstRequestMiddleware:
+    """Pure ASGI: marks 'first_request' on the first HTTP or WebSocket request, then only passes through"""
+
+    def __init__(self, app):
+        self.app = app
+        self.seen = False
+
+    async def __call__(self, scope, receive, send):
+        if not self.seen and scope["type"] in ("http", "websocket"):
+            self.seen = True
+            mark("first_request")
+        await self.app(scope, receive, send)
+
+
+def report(target: float = None) -> Dict[str, Any]:
+    """Startup breakdown by import and init step, plus time-to-first-request against the target"""
+    result = {
+        "milestones": {name: round(seconds, 4) for name, seconds in _milestones.items()},
+        "steps": sorted(_timings, key=lambda t: t["seconds"], reverse=True),
+    }
+    if target is not None:
+        listening = _milestones.get("listening")
+        result["target_seconds"] = target
+        result["meets_target"] = listening is not None and listening <= target
+    return result
+
+
+def print_report(target: float = None):
+    data = report(target)
+    print("=== Startup time report ===")
+    for name, seconds in data["milestones"].items():
+        print(f"{name}: {seconds:.3f}s")
+    for entry in data["steps"]:
+        print(f"- {entry['kind']:<12} {entry['name']:<32} {entry['seconds'] * 1000:8.1f} ms")
+    if target is not None:
+        verdict = "✅ within" if data["meets_target"] else "❌ over"
+        print(f"{verdict} the {target:.2f}s time-to-listen target")
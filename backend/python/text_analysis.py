@@ -0,0 +1,173 @@
+import re
+from collections import Counter
+from typing import Dict, Any, List
+import startup
+
+np = startup.lazy_import("numpy")
+
+# Bump when summarize's output changes so stored summaries are rebuilt
+SUMMARIZER_VERSION = 2
+
+STOPWORDS = {
+    "a", "about", "above", "after", "again", "all", "also", "am", "an", "and", "any", "are", "as", "at",
+    "be", "because", "been", "before", "being", "below", "between", "both", "but", "by", "can", "could",
+    "did", "do", "does", "doing", "down", "during", "each", "either", "etc", "every", "few", "for", "from",
+    "further", "get", "gets", "had", "has", "have", "having", "he", "her", "here", "hers", "him", "his",
+    "how", "however", "i", "if", "in", "into", "is", "it", "its", "itself", "just", "let", "like", "lesson",
+    "may", "me", "might", "more", "most", "much", "must", "my", "no", "nor", "not", "now", "of", "off", "on",
+    "once", "one", "only", "or", "other", "our", "ours", "out", "over", "own", "same", "see", "she", "should",
+    "so", "some", "such", "than", "that", "the", "their", "them", "then", "there", "these", "they", "this",
+    "those", "through", "to", "too", "two", "under", "until", "up", "us", "use", "used", "using", "very",
+    "was", "we", "well", "were", "what", "when", "where", "which", "while", "who", "whom", "why", "will",
+    "with", "within", "without", "would", "yes", "yet", "you", "your", "yours",
+}
+
+_WORD = re.compile(r"[a-z][a-z0-9\-']*[a-z0-9]|[a-z]")
+# Sentence ends, blank lines, bullets (inline ones too), and line breaks before a capital (slide titles and headings)
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9\"'(])|\n\s*\n|\n(?=\s*[\-\*]\s)|\s*•\s*|\n(?=[A-Z])")
+_PHRASE_BREAK = re.compile(r"[.,;:!?()\[\]{}\"\n•]")
+# Bullet glyphs as PDFs extract them: symbol-font characters land in the private-use area
+_BULLET_GLYPH = re.compile(r"[\ue000-\uf8ff\u2023\u2043\u25a0\u25a1\u25aa\u25ab\u25cf\u25e6\u27a2]")
+# A lone "o" is a sub-bullet ("Multiple Data Sources: o Databases")
+_SUB_BULLET = re.compile(r"(?<!\S)o(?!\S)")
+# Slide headings that carry no content of their own
+_HEADING = r"(?:key\s+(?:concepts?|points?|ideas?|takeaways?)|main\s+(?:topics?|ideas?)|(?:learning\s+)?objectives?|goals?|applications?|examples?|implementation|summary|overview|introduction|conclusions?|references|agenda)"
+_HEADING_LINE = re.compile(rf"^[ \t•]*{_HEADING}[ \t]*:?[ \t]*$", re.IGNORECASE | re.MULTILINE)
+_HEADING_PHRASE = re.compile(_HEADING, re.IGNORECASE)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased content words, without stopwords or very short tokens"""
+    return [word for word in _WORD.findall(text.lower()) if len(word) > 2 and word not in STOPWORDS]
+
+
+def normalize_slide_text(text: str) -> str:
+    """Every bullet glyph and "o" sub-bullet as •, heading-only lines dropped"""
+    text = _SUB_BULLET.sub("•", _BULLET_GLYPH.sub("•", text))
+    return _HEADING_LINE.sub("", text)
+
+
+def split_sentences(text: str, min_words: int = 5, max_words: int = 60) -> List[str]:
+    """Sentences worth quoting in a summary; slide fragments and page separators are skipped"""
+    sentences = []
+    seen = set()
+    for raw in _SENTENCE_END.split(text):
+        sentence = " ".join(raw.replace("---", " ").split()).lstrip("•-* ")
+        word_count = len(sentence.split())
+        # Slides repeat headers and footers on every page; quote each sentence once
+        key = sentence.lower()
+        # A line ending in a colon only introduces the bullets that follow it
+        if sentence.endswith(":"):
+            continue
+        if min_words <= word_count <= max_words and re.search(r"[a-zA-Z]{3}", sentence) and key not in seen:
+            seen.add(key)
+            sentences.append(sentence)
+    return sentences
+
+
+def _pagerank(weights, damping: float = 0.85, iterations: int = 50, tolerance: float = 1e-6):
+    """Scores for the nodes of a weighted, undirected graph given as a dense adjacency matrix"""
+    n = weights.shape[0]
+    out_degree = weights.sum(axis=1, keepdims=True)
+    # Dangling nodes link to everyone so rows still sum to one
+    transition = np.where(out_degree > 0, weights / np.where(out_degree > 0, out_degree, 1), 1.0 / n)
+    scores = np.full(n, 1.0 / n)
+    for _ in range(iterations):
+        updated = (1 - damping) / n + damping * (transition.T @ scores)
+        if np.abs(updated - scores).sum() < tolerance:
+            return updated
+        scores = updated
+    return scores
+
+
+def _tfidf_rows(token_lists: List[List[str]]):
+    """L2-normalised TF-IDF matrix (rows = token lists) and its vocabulary"""
+    vocabulary = {}
+    for tokens in token_lists:
+        for token in tokens:
+            vocabulary.setdefault(token, len(vocabulary))
+    matrix = np.zeros((len(token_lists), len(vocabulary)))
+    for row, tokens in enumerate(token_lists):
+        for token, count in Counter(tokens).items():
+            matrix[row, vocabulary[token]] = count
+    document_frequency = (matrix > 0).sum(axis=0)
+    matrix *= np.log((1 + len(token_lists)) / (1 + document_frequency)) + 1
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms > 0, norms, 1), vocabulary
+
+
+def summarize_sentences(text: str, max_sentences: int = 5, max_candidates: int = 400) -> List[str]:
+    """TextRank: rank sentences by centrality in their cosine-similarity graph, keep document order"""
+    sentences = split_sentences(text)[:max_candidates]
+    if len(sentences) <= 2:
+        return sentences
+    token_lists = [tokenize(sentence) for sentence in sentences]
+    matrix, vocabulary = _tfidf_rows(token_lists)
+    if not vocabulary:
+        return sentences[:max_sentences]
+
+    similarity = matrix @ matrix.T
+    np.fill_diagonal(similarity, 0.0)
+    scores = _pagerank(similarity)
+
+    count = min(max_sentences, max(2, len(sentences) // 10))
+    chosen = np.argsort(-scores, kind="stable")[:count]
+    return [sentences[i] for i in sorted(chosen)]
+
+
+def key_phrases(text: str, max_phrases: int = 8, max_vocabulary: int = 500, window: int = 3) -> List[str]:
+    """
+    TextRank over the word co-occurrence graph, then adjacent top-ranked words are merged
+    into phrases ("gradient descent") scored by the sum of their words and how often they recur.
+    """
+    words = tokenize(text)
+    if not words:
+        return []
+    vocabulary = {word: i for i, (word, _) in enumerate(Counter(words).most_common(max_vocabulary))}
+    indices = np.array([vocabulary.get(word, -1) for word in words])
+
+    # Co-occurrence within `window` positions, ignoring words outside the vocabulary
+    weights = np.zeros((len(vocabulary), len(vocabulary)))
+    for offset in range(1, window):
+        left, right = indices[:-offset], indices[offset:]
+        keep = (left >= 0) & (right >= 0) & (left != right)
+        np.add.at(weights, (left[keep], right[keep]), 1.0)
+    weights += weights.T
+    scores = _pagerank(weights)
+    ranked = set(np.argsort(-scores)[:max(10, len(vocabulary) // 3)].tolist())
+
+    # Candidate phrases: runs of ranked words between stopwords and punctuation
+    phrase_scores: Dict[str, float] = {}
+    phrase_counts: Counter = Counter()
+    for fragment in _PHRASE_BREAK.split(text.lower()):
+        run = []
+        for token in _WORD.findall(fragment) + [""]:
+            index = vocabulary.get(token, -1) if token not in STOPWORDS and len(token) > 2 else -1
+            if index in ranked and len(run) < 3:
+                run.append((token, index))
+                continue
+            if run:
+                phrase = " ".join(word for word, _ in run)
+                phrase_scores[phrase] = float(sum(scores[i] for _, i in run))
+                phrase_counts[phrase] += 1
+            run = [(token, index)] if index in ranked else []
+
+    phrases = []
+    ranking = {phrase: score * np.sqrt(phrase_counts[phrase]) for phrase, score in phrase_scores.items()}
+    for phrase, _ in sorted(ranking.items(), key=lambda item: item[1], reverse=True):
+        # Skip phrases already covered by a higher-ranked one ("descent" after "gradient descent")
+        if any(phrase in kept or kept in phrase for kept in phrases) or _HEADING_PHRASE.fullmatch(phrase):
+            continue
+        phrases.append(phrase)
+        if len(phrases) == max_phrases:
+            break
+    return phrases
+
+
+def summarize(text: str) -> Dict[str, Any]:
+    """Extractive summary and key phrases for one lesson, computed once at ingest"""
+    text = normalize_slide_text(text)
+    return {
+        "summary": " ".join(summarize_sentences(text)),
+        "key_points": [phrase[:1].upper() + phrase[1:] for phrase in key_phrases(text)],
+    }
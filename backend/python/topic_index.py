@@ -0,0 +1,249 @@
+import math
+import threading
+from collections import Counter
+from typing import Dict, Any, List, Iterable, Tuple
+import startup
+from text_analysis import tokenize
+
+np = startup.lazy_import("numpy")
+
+
+def topic_terms(text: str) -> Counter:
+    """Unigram counts plus adjacent bigrams that recur (one-off pairs are mostly noise)"""
+    tokens = tokenize(text)
+    counts = Counter(tokens)
+    bigrams = Counter(f"{a} {b}" for a, b in zip(tokens, tokens[1:]) if a != b)
+    counts.update({bigram: count for bigram, count in bigrams.items() if count > 1})
+    return counts
+
+
+class TopicIndex:
+    """
+    Sparse TF-IDF index over every lesson, for related-lesson queries and per-lesson topics.
+
+    Postings are kept as COO triples (lesson, term, sublinear tf) that only grow as lessons
+    arrive; IDF and row norms are recomputed from them in one vectorized pass when needed,
+    so adding a lesson never rebuilds the whole matrix. A replaced lesson leaves its old
+    postings behind as tombstones until they make up a quarter of the index.
+    """
+
+    def __init__(self, min_document_frequency: int = 1, max_terms_per_lesson: int = 2000):
+        self.min_document_frequency = min_document_frequency
+        self.max_terms_per_lesson = max_terms_per_lesson
+        self._lock = threading.RLock()
+        self.terms: Dict[str, int] = {}
+        self.term_names: List[str] = []
+        self.lessons: Dict[str, int] = {}  # lesson_id -> live row
+        self.rows: List[Dict[str, Any]] = []  # row -> {"lesson_id", "title", "fingerprint", "live"}
+        self._row_ids: List[int] = []
+        self._term_ids: List[int] = []
+        self._weights: List[float] = []
+        self._matrix = None
+        self.stats = {"lessons_added": 0, "lessons_replaced": 0, "rebuilds": 0, "compactions": 0, "queries": 0}
+
+    def __len__(self) -> int:
+        return len(self.lessons)
+
+    def __contains__(self, lesson_id) -> bool:
+        return str(lesson_id) in self.lessons
+
+    def _add(self, lesson_id: str, title: str, text: str) -> bool:
+        fingerprint = hash(text)
+        row = self.lessons.get(lesson_id)
+        if row is not None:
+            if self.rows[row]["fingerprint"] == fingerprint:
+                self.rows[row]["title"] = title
+                return False
+            self.rows[row]["live"] = False
+            self.stats["lessons_replaced"] += 1
+
+        counts = topic_terms(text).most_common(self.max_terms_per_lesson)
+        row = len(self.rows)
+        self.rows.append({"lesson_id": lesson_id, "title": title, "fingerprint": fingerprint, "live": True})
+        self.lessons[lesson_id] = row
+        for term, count in counts:
+            term_id = self.terms.get(term)
+            if term_id is None:
+                term_id = self.terms[term] = len(self.term_names)
+                self.term_names.append(term)
+            self._row_ids.append(row)
+            self._term_ids.append(term_id)
+            self._weights.append(1.0 + math.log(count))
+        self.stats["lessons_added"] += 1
+        return True
+
+    def add(self, lesson_id: str, title: str, text: str) -> bool:
+        """Index (or re-index) one lesson; unchanged text is a no-op"""
+        with self._lock:
+            changed = self._add(str(lesson_id), title, text)
+            if changed:
+                self._matrix = None
+            return changed
+
+    def add_many(self, lessons: Iterable[Tuple[str, str, str]]) -> int:
+        """Batch build: (lesson_id, title, text) tuples, with a single matrix rebuild afterwards"""
+        with self._lock:
+            added = sum(self._add(str(lesson_id), title, text) for lesson_id, title, text in lessons)
+            if added:
+                self._matrix = None
+            return added
+
+    def _compact(self):
+        live = np.array([row["live"] for row in self.rows])
+        row_ids = np.array(self._row_ids, dtype=np.int64)
+        keep = live[row_ids]
+        new_row = np.cumsum(live) - 1
+        self._row_ids = new_row[row_ids[keep]].tolist()
+        self._term_ids = np.array(self._term_ids, dtype=np.int64)[keep].tolist()
+        self._weights = np.array(self._weights)[keep].tolist()
+        self.rows = [row for row in self.rows if row["live"]]
+        self.lessons = {row["lesson_id"]: i for i, row in enumerate(self.rows)}
+        self.stats["compactions"] += 1
+
+    def _build(self):
+        """Term-major (CSC) arrays with TF-IDF weights and unit-length rows"""
+        if self._matrix is not None:
+            return self._matrix
+        dead = sum(not row["live"] for row in self.rows)
+        if dead and dead * 4 >= len(self.rows):
+            self._compact()
+
+        live = np.array([row["live"] for row in self.rows], dtype=bool)
+        row_ids = np.array(self._row_ids, dtype=np.int64)
+        term_ids = np.array(self._term_ids, dtype=np.int64)
+        weights = np.array(self._weights)
+        keep = live[row_ids] if len(row_ids) else np.zeros(0, dtype=bool)
+        row_ids, term_ids, weights = row_ids[keep], term_ids[keep], weights[keep]
+
+        document_count = max(1, int(live.sum()))
+        document_frequency = np.bincount(term_ids, minlength=len(self.term_names))
+        idf = np.log((1 + document_count) / (1 + document_frequency)) + 1.0
+        idf[document_frequency < self.min_document_frequency] = 0.0
+        weights = weights * idf[term_ids]
+        norms = np.sqrt(np.bincount(row_ids, weights=weights ** 2, minlength=len(self.rows)))
+        weights = weights / np.where(norms[row_ids] > 0, norms[row_ids], 1.0)
+
+        order = np.argsort(term_ids, kind="stable")
+        term_sorted = term_ids[order]
+        self._matrix = {
+            "idf": idf,
+            "row_ids": row_ids[order],
+            "weights": weights[order],
+            "term_starts": np.searchsorted(term_sorted, np.arange(len(self.term_names))),
+            "term_ends": np.searchsorted(term_sorted, np.arange(len(self.term_names)), side="right"),
+            # Postings are appended lesson by lesson, so they are already row-major (CSR)
+            "by_row": (term_ids, weights),
+            "row_starts": np.searchsorted(row_ids, np.arange(len(self.rows))),
+            "row_ends": np.searchsorted(row_ids, np.arange(len(self.rows)), side="right"),
+        }
+        self.stats["rebuilds"] += 1
+        return self._matrix
+
+    def _lesson_vector(self, matrix, row: int):
+        term_ids, weights = matrix["by_row"]
+        start, end = matrix["row_starts"][row], matrix["row_ends"][row]
+        return term_ids[start:end], weights[start:end]
+
+    def _scores(self, matrix, term_ids, weights):
+        """Cosine scores against every lesson via the postings of the query's terms"""
+        starts, ends = matrix["term_starts"][term_ids], matrix["term_ends"][term_ids]
+        lengths = ends - starts
+        if lengths.sum() == 0:
+            return np.zeros(len(self.rows))
+        positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        contributions = matrix["weights"][positions] * np.repeat(weights, lengths)
+        return np.bincount(matrix["row_ids"][positions], weights=contributions, minlength=len(self.rows))
+
+    def related(self, lesson_id: str, limit: int = 5) -> List[Dict[str, Any]]:
+        """Most similar other lessons, with the strongest shared terms"""
+        with self._lock:
+            row = self.lessons.get(str(lesson_id))
+            if row is None:
+                return []
+            matrix = self._build()
+            row = self.lessons[str(lesson_id)]
+            term_ids, weights = self._lesson_vector(matrix, row)
+            scores = self._scores(matrix, term_ids, weights)
+            scores[row] = 0.0
+            rows = list(self.rows)
+            self.stats["queries"] += 1
+
+            results = []
+            for other in np.argsort(-scores)[:limit]:
+                if scores[other] <= 0:
+                    break
+                other_terms, other_weights = self._lesson_vector(matrix, int(other))
+                shared = dict(zip(other_terms.tolist(), other_weights.tolist()))
+                overlap = sorted(
+                    ((weight * shared[term], term) for term, weight in zip(term_ids.tolist(), weights.tolist()) if term in shared),
+                    reverse=True
+                )[:5]
+                results.append({
+                    "lesson_id": rows[other]["lesson_id"],
+                    "title": rows[other]["title"],
+                    "score": round(float(scores[other]), 4),
+                    "shared_terms": [self.term_names[term] for _, term in overlap],
+                })
+            return results
+
+    def top_terms(self, lesson_id: str, limit: int = 8) -> List[str]:
+        """The terms that set a lesson apart from the rest of the course (highest TF-IDF)"""
+        with self._lock:
+            if str(lesson_id) not in self.lessons:
+                return []
+            matrix = self._build()
+            term_ids, weights = self._lesson_vector(matrix, self.lessons[str(lesson_id)])
+            return self._pick_terms(term_ids, weights, limit)
+
+    def keywords(self, text: str, limit: int = 10) -> List[str]:
+        """TF-IDF keywords for arbitrary text, weighted by the corpus' document frequencies"""
+        counts = topic_terms(text)
+        with self._lock:
+            matrix = self._build() if self.rows else None
+            unseen_idf = math.log(1 + len(self.lessons)) + 1.0
+
+            def idf(term):
+                term_id = self.terms.get(term)
+                return unseen_idf if matrix is None or term_id is None else float(matrix["idf"][term_id])
+
+            scored = sorted(((1.0 + math.log(count)) * idf(term), term) for term, count in counts.items())
+        return self._dedupe([term for _, term in reversed(scored)], limit)
+
+    def _pick_terms(self, term_ids, weights, limit: int) -> List[str]:
+        order = np.argsort(-weights)
+        return self._dedupe([self.term_names[int(term_ids[i])] for i in order[:limit * 4]], limit)
+
+    @staticmethod
+    def _dedupe(terms: List[str], limit: int) -> List[str]:
+        """Drop overlapping terms, letting "gradient descent" stand in for "gradient" and "descent" """
+        picked = []
+        for term in terms:
+            words = term.split()
+            if any(set(words) & set(kept.split()) for kept in picked if " " in kept):
+                continue
+            if len(words) == 1:
+                if term not in picked:
+                    picked.append(term)
+            else:
+                covered = [i for i, kept in enumerate(picked) if kept in words]
+                if covered:
+                    picked[covered[0]] = term
+                    picked = [kept for kept in picked if kept not in words]
+                else:
+                    picked.append(term)
+            if len(picked) == limit:
+                break
+        return picked
+
+    def get_stats(self) -> Dict[str, Any]:
+        # No lock: /metrics shouldn't wait behind a rebuild, and approximate counts are fine
+        return {
+            **self.stats,
+            "lessons": len(self.lessons),
+            "terms": len(self.term_names),
+            "postings": len(self._row_ids),
+        }
+
+
+# Process-wide index, fed as lessons are extracted
+index = TopicIndex()
@@ -0,0 +1,226 @@
+import json
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+from config import Config
+
+
+def parse_sections(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """personal_information rows -> {section_name: data}, skipping empty and malformed sections"""
+    sections_data = {}
+    for row in rows:
+        if row['section_data'] and row['section_name']:
+            try:
+                if isinstance(row['section_data'], str):
+                    section_data = json.loads(row['section_data'])
+                else:
+                    section_data = row['section_data']
+                sections_data[row['section_name']] = section_data
+            except json.JSONDecodeError:
+                continue
+    return sections_data
+
+
+def render_profile(user: Dict[str, Any], sections_data: Dict[str, Any]) -> str:
+    """The student information text returned for admin lookups"""
+    status = "active" if user['active'] else "inactive"
+    lines = [
+        f"📋 Student Information for {user['username']}",
+        "",
+        f"📧 Email: {user['email']}",
+        f"🎭 Role: {user['role']}",
+        f"📊 Status: {status}",
+        "",
+    ]
+
+    # Format profile section
+    if 'profile' in sections_data:
+        lines.append("👤 Profile")
+        profile = sections_data['profile']
+        if profile.get('phone'):
+            lines.append(f"📱 Phone: {profile['phone']}")
+        if profile.get('institution'):
+            lines.append(f"🏫 Institution: {profile['institution']}")
+        if profile.get('fullName'):
+            lines.append(f"👤 Full Name: {profile['fullName']}")
+        if profile.get('age'):
+            lines.append(f"🎂 Age: {profile['age']}")
+        if profile.get('fieldOfStudy'):
+            lines.append(f"📚 Field of Study: {profile['fieldOfStudy']}")
+        if profile.get('yearOfStudy'):
+            lines.append(f"📅 Year of Study: {profile['yearOfStudy']}")
+        if profile.get('linkedIn'):
+            lines.append(f"💼 LinkedIn: {profile['linkedIn']}")
+        lines.append("")
+
+    # Format technical section
+    if 'technical' in sections_data:
+        lines.append("💻 Technical Skills")
+        tech = sections_data['technical']
+        if tech.get('technicalProficiency'):
+            lines.append(f"• Technical Proficiency: {tech['technicalProficiency']}")
+        if 'cloudExperience' in tech:
+            lines.append(f"• Cloud Experience: {'Yes' if tech['cloudExperience'] else 'No'}")
+        if 'vmExperience' in tech:
+            lines.append(f"• VM Experience: {'Yes' if tech['vmExperience'] else 'No'}")
+        if tech.get('otherTechnicalSkills'):
+            lines.append(f"• Other Skills: {tech['otherTechnicalSkills']}")
+        lines.append("")
+
+    # Format programming section
+    if 'programming' in sections_data:
+        lines.append("🚀 Programming")
+        prog = sections_data['programming']
+        if prog.get('languages'):
+            langs = prog['languages']
+            if isinstance(langs, dict):
+                # Only include languages with a non-empty level
+                lang_list = [f"{lang}: {level}" for lang, level in langs.items() if level and level.strip()]
+                if lang_list:
+                    lines.append(f"• Languages: {', '.join(lang_list)}")
+        if prog.get('frameworks') and isinstance(prog['frameworks'], list) and prog['frameworks']:
+            lines.append(f"• Frameworks: {', '.join(prog['frameworks'])}")
+        if prog.get('projectDescription'):
+            lines.append(f"• Project Experience: {prog['projectDescription']}")
+        if prog.get('ides') and isinstance(prog['ides'], list) and prog['ides']:
+            lines.append(f"• IDEs: {', '.join(prog['ides'])}")
+        if 'hasOpenSource' in prog:
+            lines.append(f"• Open Source Contribution: {'Yes' if prog['hasOpenSource'] else 'No'}")
+        lines.append("")
+
+    # Format database section
+    if 'database' in sections_data:
+        lines.append("🗄️ Database Skills")
+        db = sections_data['database']
+        if db.get('databaseSystems') and isinstance(db['databaseSystems'], list) and db['databaseSystems']:
+            lines.append(f"• Database Systems: {', '.join(db['databaseSystems'])}")
+        if db.get('apiTechnologies'):
+            lines.append(f"• API Technologies: {db['apiTechnologies']}")
+        if db.get('otherDatabases'):
+            lines.append(f"• Other Databases: {db['otherDatabases']}")
+        if 'hasBackendExperience' in db:
+            lines.append(f"• Backend Experience: {'Yes' if db['hasBackendExperience'] else 'No'}")
+        lines.append("")
+
+    # Format AI section
+    if 'ai' in sections_data:
+        lines.append("🤖 AI & Emerging Tech")
+        ai = sections_data['ai']
+        if ai.get('aiExperience'):
+            lines.append(f"• AI Experience Level: {ai['aiExperience']}")
+        if ai.get('tools') and isinstance(ai['tools'], list) and ai['tools']:
+            lines.append(f"• AI Tools: {', '.join(ai['tools'])}")
+        if ai.get('otherTools'):
+            lines.append(f"• Other AI Tools: {ai['otherTools']}")
+        if 'hasML' in ai:
+            lines.append(f"• Machine Learning: {'Yes' if ai['hasML'] else 'No'}")
+        if 'hasAIModels' in ai:
+            lines.append(f"• AI Model Development: {'Yes' if ai['hasAIModels'] else 'No'}")
+        lines.append("")
+
+    # Format collaboration section
+    if 'collaboration' in sections_data:
+        lines.append("👥 Collaboration")
+        collab = sections_data['collaboration']
+        if collab.get('collaborationRole'):
+            lines.append(f"• Role: {collab['collaborationRole']}")
+        if collab.get('competitionExperience'):
+            lines.append(f"• Competition Experience: {collab['competitionExperience']}")
+        if 'hasCompetitions' in collab:
+            lines.append(f"• Competitions: {'Yes' if collab['hasCompetitions'] else 'No'}")
+        if collab.get('additionalInfo'):
+            lines.append(f"• Additional Info: {collab['additionalInfo']}")
+        lines.append("")
+
+    return "\n".join(lines).strip()
+
+
+def profile_version(user: Dict[str, Any], rows: List[Dict[str, Any]]) -> Tuple:
+    """What user_search.fetch_profile_version returns while these rows are still current"""
+    return (user['username'], user['email'], user['role'], bool(user['active']),
+            len(rows), sum(int(row.get('section_crc') or 0) for row in rows))
+
+
+class ProfileView:
+    """One user's parsed profile sections and the rendered text, built once per change"""
+
+    __slots__ = ("user", "sections", "text", "version")
+
+    def __init__(self, user: Dict[str, Any], sections: Dict[str, Any], version: Optional[Tuple] = None):
+        self.user = user
+        self.sections = sections
+        self.text = render_profile(user, sections)
+        self.version = version
+
+
+class ProfileCache:
+    """
+    LRU of materialized profiles by user id, plus which user each lookup (email or names)
+    resolved to, so a repeated admin query skips the user search, JSON parsing and formatting.
+
+    Profiles are written by other processes (the Node backend, rest_api.py), so a hit is only
+    served after its `version` still matches the database (see user_search.fetch_profile_version);
+    any write, wherever it came from, invalidates the entry on its next use.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._profiles: "OrderedDict[int, Tuple[float, ProfileView]]" = OrderedDict()
+        self._lookups: "OrderedDict[Tuple, Tuple[float, int]]" = OrderedDict()
+        self.stats_counters = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    @staticmethod
+    def lookup_key(email: Optional[str], names: List[str]) -> Tuple:
+        return ("email", email.lower()) if email else ("names", tuple(names))
+
+    def _store(self, cache: OrderedDict, key, value):
+        cache[key] = (time.monotonic() + self.ttl, value)
+        cache.move_to_end(key)
+        while len(cache) > self.max_entries:
+            cache.popitem(last=False)
+
+    def _fresh(self, cache: OrderedDict, key):
+        entry = cache.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del cache[key]
+            return None
+        cache.move_to_end(key)
+        return entry[1]
+
+    def get(self, lookup: Tuple) -> Optional[ProfileView]:
+        with self._lock:
+            user_id = self._fresh(self._lookups, lookup)
+            view = self._fresh(self._profiles, user_id) if user_id is not None else None
+            self.stats_counters["hits" if view else "misses"] += 1
+            return view
+
+    def put(self, lookup: Tuple, user: Dict[str, Any], rows: List[Dict[str, Any]]) -> ProfileView:
+        """Materialize a profile freshly read from the database"""
+        view = ProfileView(user, parse_sections(rows), profile_version(user, rows))
+        with self._lock:
+            self._store(self._profiles, user['id'], view)
+            self._store(self._lookups, lookup, user['id'])
+        return view
+
+    def invalidate(self, user_id: Optional[int] = None):
+        """Drop one user's profile, or everything"""
+        with self._lock:
+            if user_id is None:
+                self._profiles.clear()
+                self._lookups.clear()
+            else:
+                self._profiles.pop(user_id, None)
+            self.stats_counters["invalidations"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.stats_counters, "profiles": len(self._profiles), "lookups": len(self._lookups)}
+
+
+# Process-wide cache of admin profile lookups
+cache = ProfileCache(Config.PROFILE_CACHE_SIZE, Config.PROFILE_CACHE_TTL)
@@ -0,0 +1,214 @@
+import re
+import time
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+from config import Config
+
+# Words that show up in admin questions but are never the name being asked about
+STOPWORDS = {
+    "what", "whats", "is", "are", "was", "the", "a", "an", "of", "for", "about", "find", "get",
+    "show", "me", "give", "tell", "who", "email", "emails", "mail", "info", "information",
+    "details", "detail", "contact", "user", "users", "student", "students", "profile", "his",
+    "her", "their", "please", "and", "address", "phone", "can", "you", "i", "need", "to", "on",
+    "with", "named", "name", "called", "does", "do", "have", "has", "know", "look", "up", "s",
+}
+
+EMAIL_PATTERN = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b')
+
+USER_COLUMNS = "id, username, email, role, active"
+
+
+def extract_lookup(query: str) -> Tuple[Optional[str], List[str]]:
+    """Pull an email address and candidate usernames out of a natural language query"""
+    email_match = EMAIL_PATTERN.search(query)
+    if email_match:
+        return email_match.group(0), []
+
+    text = re.sub(r"['’]s\b", "", query.lower())
+    names = []
+    for word in re.findall(r"\w+", text):
+        if word not in STOPWORDS and word not in names:
+            names.append(word)
+    return None, names
+
+
+class _TrieNode:
+    __slots__ = ("children", "users")
+
+    def __init__(self):
+        self.children = {}
+        self.users = None  # [(user_id, username)] for nodes that end a username
+
+
+class UsernameTrie:
+    """Lowercased usernames in a trie, for bounded edit-distance lookups"""
+
+    def __init__(self):
+        self.root = _TrieNode()
+        self.size = 0
+
+    def insert(self, username: str, user_id: int):
+        node = self.root
+        for ch in username.lower():
+            node = node.children.setdefault(ch, _TrieNode())
+        if node.users is None:
+            node.users = []
+        node.users.append((user_id, username))
+        self.size += 1
+
+    def search(self, word: str, max_distance: int) -> List[Tuple[int, int, str]]:
+        """Return (distance, user_id, username) for every username within max_distance edits"""
+        word = word.lower()
+        first_row = list(range(len(word) + 1))
+        results = []
+        stack = [(child, ch, first_row) for ch, child in self.root.children.items()]
+        while stack:
+            node, ch, previous_row = stack.pop()
+            row = [previous_row[0] + 1]
+            for i in range(1, len(word) + 1):
+                cost = 0 if word[i - 1] == ch else 1
+                row.append(min(row[i - 1] + 1, previous_row[i] + 1, previous_row[i - 1] + cost))
+            if node.users is not None and row[-1] <= max_distance:
+                for user_id, username in node.users:
+                    results.append((row[-1], user_id, username))
+            # Prune branches that can no longer come back within range
+            if min(row) <= max_distance:
+                stack.extend((child, next_ch, row) for next_ch, child in node.children.items())
+        results.sort(key=lambda r: (r[0], len(r[2])))
+        return results
+
+
+_trie = None
+_trie_built_at = 0.0
+_trie_lock = threading.Lock()
+
+
+def get_username_trie(connection) -> UsernameTrie:
+    """The username trie, rebuilt from an index-only scan once it is older than USER_INDEX_TTL"""
+    global _trie, _trie_built_at
+    if _trie is not None and time.monotonic() - _trie_built_at < Config.USER_INDEX_TTL:
+        return _trie
+
+    with _trie_lock:
+        if _trie is not None and time.monotonic() - _trie_built_at < Config.USER_INDEX_TTL:
+            return _trie
+        cursor = connection.cursor()
+        try:
+            cursor.execute("SELECT id, username FROM users")
+            trie = UsernameTrie()
+            for user_id, username in cursor.fetchall():
+                trie.insert(username, user_id)
+        finally:
+            cursor.close()
+        _trie, _trie_built_at = trie, time.monotonic()
+        print(f"Built username index with {trie.size} users")
+        return _trie
+
+
+def invalidate_username_index():
+    """Force the next fuzzy lookup to rebuild the username trie"""
+    global _trie
+    _trie = None
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _fetch_user_with_sections(cursor, where: str, params: tuple, order_by: str = "id") -> Tuple[Optional[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Find one user and all of their profile sections in a single round trip"""
+    cursor.execute(
+        f"""
+        SELECT u.id, u.username, u.email, u.role, u.active, p.section_name, p.section_data,
+               CRC32(p.section_data) AS section_crc
+        FROM (
+            SELECT {USER_COLUMNS}
+            FROM users
+            WHERE {where}
+            ORDER BY {order_by}
+            LIMIT 1
+        ) u
+        LEFT JOIN personal_information p ON p.user_id = u.id
+        """,
+        params
+    )
+    rows = cursor.fetchall()
+    if not rows:
+        return None, []
+
+    first = rows[0]
+    user = {key: first[key] for key in ("id", "username", "email", "role", "active")}
+    sections = [
+        {"section_name": row["section_name"], "section_data": row["section_data"], "section_crc": row["section_crc"]}
+        for row in rows if row["section_name"]
+    ]
+    return user, sections
+
+
+def fetch_profile_version(connection, user_id: int) -> Optional[Tuple]:
+    """
+    The fields a rendered profile depends on, with the sections reduced to a count and a
+    checksum, so a cached profile can be checked with one primary-key read. Matches
+    user_profiles.profile_version for the rows _fetch_user_with_sections returns. None if
+    the user is gone.
+    """
+    cursor = connection.cursor(dictionary=True)
+    try:
+        cursor.execute(
+            """
+            SELECT u.username, u.email, u.role, u.active,
+                   COUNT(p.id) AS sections, COALESCE(SUM(CRC32(p.section_data)), 0) AS section_crc
+            FROM users u
+            LEFT JOIN personal_information p ON p.user_id = u.id
+            WHERE u.id = %s
+            GROUP BY u.id, u.username, u.email, u.role, u.active
+            """,
+            (user_id,)
+        )
+        row = cursor.fetchone()
+    finally:
+        cursor.close()
+    if row is None:
+        return None
+    return (row["username"], row["email"], row["role"], bool(row["active"]),
+            int(row["sections"]), int(row["section_crc"]))
+
+
+def find_user_with_profile(connection, email: Optional[str], names: List[str]) -> Tuple[Optional[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Look a user up by email, exact username, username prefix and finally a fuzzy
+    trie match. Email and username lookups are range scans on their unique indexes.
+    """
+    cursor = connection.cursor(dictionary=True)
+    try:
+        if email:
+            return _fetch_user_with_sections(cursor, "email = %s", (email,))
+
+        if not names:
+            return None, []
+
+        # Exact and prefix matches in one query; exact hits sort first, then the shortest name
+        prefixes = [name for name in names if len(name) >= Config.USER_PREFIX_MIN_LENGTH] or names
+        where = " OR ".join(["username LIKE %s"] * len(prefixes))
+        exact = ", ".join(["%s"] * len(names))
+        params = tuple(f"{_escape_like(name)}%" for name in prefixes) + tuple(names) + tuple(names)
+        user, sections = _fetch_user_with_sections(
+            cursor,
+            f"({where}) OR username IN ({exact})",
+            params,
+            order_by=f"username IN ({exact}) DESC, CHAR_LENGTH(username), username"
+        )
+        if user:
+            return user, sections
+
+        # Fuzzy fallback for typos, served from memory
+        trie = get_username_trie(connection)
+        for name in names:
+            if len(name) < Config.USER_PREFIX_MIN_LENGTH:
+                continue
+            matches = trie.search(name, Config.USER_FUZZY_MAX_DISTANCE)
+            if matches:
+                return _fetch_user_with_sections(cursor, "id = %s", (matches[0][1],))
+        return None, []
+    finally:
+        cursor.close()
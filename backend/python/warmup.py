@@ -0,0 +1,66 @@
+import time
+import asyncio
+from typing import Dict, Any, List, Tuple, Callable
+import executors
+
+
+class Warmup:
+    """
+    Runs blocking warmup steps in the io executor pool with bounded concurrency and
+    remembers when it finished, so /ready can hold traffic until caches are warm.
+    """
+
+    def __init__(self, concurrency: int, timeout: float):
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.state = "pending"
+        self.started_at = None
+        self.finished_at = None
+        self.steps: Dict[str, Dict[str, Any]] = {}
+
+    @property
+    def ready(self) -> bool:
+        return self.state in ("ready", "timed_out")
+
+    async def _run_step(self, semaphore: asyncio.Semaphore, name: str, fn: Callable[[], Any]):
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await executors.io.run(fn)
+                self.steps[name] = {"status": "ok"}
+            except Exception as e:
+                print(f"⚠️ Warmup step {name} failed: {str(e)}")
+                self.steps[name] = {"status": "failed", "error": str(e)}
+            self.steps[name]["duration"] = round(time.perf_counter() - started, 3)
+
+    async def run(self, plan: Callable[[], List[Tuple[str, Callable[[], Any]]]]):
+        """
+        `plan` is called in a worker thread and returns (name, fn) steps, so it may query the database.
+        Failed steps don't block readiness; a warm-ish instance beats one that never becomes ready.
+        """
+        self.state = "running"
+        self.started_at = time.time()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        try:
+            steps = await asyncio.wait_for(executors.io.run(plan), self.timeout)
+            print(f"Warming up {len(steps)} caches...")
+            await asyncio.wait_for(
+                asyncio.gather(*(self._run_step(semaphore, name, fn) for name, fn in steps)),
+                self.timeout
+            )
+            self.state = "ready"
+        except asyncio.TimeoutError:
+            print(f"⚠️ Warmup did not finish within {self.timeout}s, serving traffic anyway")
+            self.state = "timed_out"
+        except Exception as e:
+            print(f"⚠️ Warmup planning failed: {str(e)}")
+            self.state = "ready"
+        self.finished_at = time.time()
+        print(f"✅ Warmup finished in {self.finished_at - self.started_at:.2f}s ({self.state})")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "duration": round(self.finished_at - self.started_at, 3) if self.finished_at else None,
+            "steps": self.steps,
+        }
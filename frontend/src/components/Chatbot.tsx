@@ -39,7 +39,8 @@ export function Chatbot({ lessonId }: ChatbotProps) {
         // Try to connect to multiple possible ports
         const tryConnect = (ports = [8080, 8081, 8082]) => {
             const port = ports[0];
-            const ws = new WebSocket(`ws://localhost:${port}/grok`);
+            const query = lessonId ? `?lessonId=${encodeURIComponent(lessonId)}` : '';
+            const ws = new WebSocket(`ws://localhost:${port}/grok${query}`);
 
             ws.onopen = () => {
                 console.log(`Connected to WebSocket on port ${port}`);
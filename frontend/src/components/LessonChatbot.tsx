@@ -100,7 +100,8 @@ export default function LessonChatbot({
     const tryConnect = () => {
       console.log('Connecting to WebSocket server...');
       
-      const wsUrl = `${config.wsUrl}/grok`;
+      // The lesson id lets the server load the lesson before the first question
+      const wsUrl = `${config.wsUrl}/grok?lessonId=${encodeURIComponent(lessonId)}`;
       console.log('Using WebSocket URL:', wsUrl);
       
       const ws = new WebSocket(wsUrl);
@@ -4,9 +4,11 @@ import { api } from '@/server/api';
 import { Avatar, AvatarFallback } from "@/components/ui/avatar";
 import config from '@/config';
 
-// Get the WebSocket URL based on the current environment
-const getWebSocketUrl = () => {
-  return `${config.wsUrl}/grok`;
+// Get the WebSocket URL based on the current environment; the lesson id lets the
+// server load the lesson before the first question
+const getWebSocketUrl = (lessonId) => {
+  const url = `${config.wsUrl}/grok`;
+  return lessonId ? `${url}?lessonId=${encodeURIComponent(lessonId)}` : url;
 };
 
 const ChatBot = ({ lessonId }) => {
@@ -50,7 +52,7 @@ const ChatBot = ({ lessonId }) => {
     
     try {
       setConnectionStatus('connecting');
-      const wsUrl = getWebSocketUrl();
+      const wsUrl = getWebSocketUrl(lessonId);
       console.log('Attempting to connect to WebSocket at', wsUrl);
       const ws = new WebSocket(wsUrl);
       